@@ -0,0 +1,120 @@
+"""
+Admission control for the routes that get hammered when the next day's slots go live.
+
+`AdmissionGate` caps how many requests of a route run at once. Requests over the cap
+wait in a bounded queue for at most `max_wait_seconds`; when the queue is full or the
+wait runs out they are rejected right away with 503 and `Retry-After`, instead of piling
+up on the Mongo pool and dragging the latency of every admitted request with them.
+
+`RateLimiter` is a per-key token bucket (one bucket per student), rejecting with 429
+and the time until the next token in `Retry-After`.
+"""
+
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, Optional, Tuple
+from fastapi import HTTPException, status
+from app.core.metrics import admission_rejections
+import asyncio
+import math
+import time
+
+
+def _retry_after(seconds: float) -> Dict[str, str]:
+   return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class AdmissionGate:
+   """Concurrency cap with a bounded, time-limited wait queue."""
+
+   def __init__(self, name: str, max_concurrency: int, max_queue: int, max_wait_seconds: float):
+      self.name = name
+      self.max_concurrency = max_concurrency
+      self.max_queue = max_queue
+      self.max_wait_seconds = max_wait_seconds
+      self.active = 0
+      self.waiting = 0
+      self._semaphore = asyncio.Semaphore(max_concurrency)
+
+   def _overloaded(self, reason: str) -> HTTPException:
+      admission_rejections.inc((self.name, reason))
+      return HTTPException(
+         status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+         detail={"msg": "Server is busy, retry shortly", "code": reason},
+         headers=_retry_after(self.max_wait_seconds)
+      )
+
+   async def acquire(self):
+      """Take a slot, or raise 503 if the queue is full or the wait times out."""
+      if not self._semaphore.locked():
+         await self._semaphore.acquire()
+      else:
+         if self.waiting >= self.max_queue:
+            raise self._overloaded("queue_full")
+         self.waiting += 1
+         try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait_seconds)
+         except asyncio.TimeoutError:
+            raise self._overloaded("queue_timeout")
+         finally:
+            self.waiting -= 1
+      self.active += 1
+
+   def release(self):
+      self.active -= 1
+      self._semaphore.release()
+
+   @asynccontextmanager
+   async def admit(self) -> AsyncIterator[None]:
+      await self.acquire()
+      try:
+         yield
+      finally:
+         self.release()
+
+   def stats(self) -> Dict[str, int]:
+      return {"active": self.active, "waiting": self.waiting}
+
+
+class RateLimiter:
+   """
+      Token buckets of `burst` tokens refilled at `rate` tokens per second, one per key.
+      Only the `maxsize` most recently used buckets are kept; an evicted bucket comes
+      back full, which is what an idle client would have anyway.
+   """
+
+   def __init__(self, name: str, rate: float, burst: int, maxsize: int = 10000):
+      self.name = name
+      self.rate = rate
+      self.burst = burst
+      self.maxsize = maxsize
+      self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+
+   def try_acquire(self, key: Hashable, now: Optional[float] = None) -> float:
+      """Take one token for `key`. Returns 0 on success, else the seconds until the next token."""
+      now = time.monotonic() if now is None else now
+      tokens, updated = self._buckets.get(key, (self.burst, now))
+      tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+      wait = 0.0
+      if tokens >= 1:
+         tokens -= 1
+      else:
+         wait = (1 - tokens) / self.rate
+
+      self._buckets[key] = (tokens, now)
+      self._buckets.move_to_end(key)
+      while len(self._buckets) > self.maxsize:
+         self._buckets.popitem(last=False)
+      return wait
+
+   def check(self, key: Hashable):
+      """Take one token for `key` or raise 429."""
+      wait = self.try_acquire(key)
+      if wait:
+         admission_rejections.inc((self.name, "rate_limited"))
+         raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"msg": "Too many requests, slow down", "code": "rate_limited"},
+            headers=_retry_after(wait)
+         )
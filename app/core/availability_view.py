@@ -0,0 +1,281 @@
+"""
+In-process materialized view of tomorrow's grouped teacher availability.
+
+`GET /slots/available` is served from this snapshot. It is rebuilt from MongoDB when the
+date rolls over or when it gets older than `max_age_seconds` (this bounds staleness
+across workers), and patched incrementally by the endpoints that change it:
+`set_availability` / `update_teacher_profile` refresh one teacher, `book_slot` /
+`cancel_booking` update the remaining seats of one slot. Every change of a slot's
+remaining seats is also published to `events`, which feeds `GET /slots/stream`.
+"""
+
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.etag import make_etag
+from app.core.slot_capacity import SLOT_CAPACITIES, iter_slots
+from app.core.slot_events import SlotEvents, sse_message
+import asyncio
+import logging
+import time as timer
+
+
+def available_slots_pipeline(available_date: datetime, teacher_id: Optional[str] = None):
+   """
+      Aggregation that joins the availabilities of a day with the teacher profiles
+      and groups the slots per teacher, in a single round trip.
+   """
+   match = {"available_date": available_date}
+   if teacher_id is not None:
+      match["teacher_id"] = teacher_id
+
+   return [
+      {"$match": match},
+      {"$sort": {"teacher_id": 1, "start_time": 1}},
+      {"$addFields": {
+         "teacher_oid": {"$convert": {"input": "$teacher_id", "to": "objectId", "onError": None}}
+      }},
+      {"$lookup": {
+         "from": "users",
+         "localField": "teacher_oid",
+         "foreignField": "_id",
+         "as": "teacher"
+      }},
+      {"$unwind": "$teacher"},
+      {"$match": {"teacher.role": "teacher"}},
+      {"$group": {
+         "_id": "$teacher._id",
+         "teacher": {"$first": "$teacher"},
+         "slots": {"$push": {
+            "available_date": "$available_date",
+            "start_time": "$start_time",
+            "end_time": "$end_time",
+            "max_no_of_students_each_slot": {"$ifNull": ["$max_no_of_students_each_slot", 1]}
+         }}
+      }},
+      {"$sort": {"_id": 1}},
+      {"$project": {
+         "_id": 0,
+         "teacher_id": {"$toString": "$_id"},
+         "first_name": "$teacher.first_name",
+         "last_name": "$teacher.last_name",
+         "email": "$teacher.email",
+         "phone": "$teacher.phone",
+         "subject": "$teacher.subject",
+         "years_of_exp": "$teacher.years_of_exp",
+         "slots": 1
+      }}
+   ]
+
+
+def slot_delta(key: Tuple[str, datetime], remaining: int) -> Dict[str, Any]:
+   """Compact form of one slot in the `/slots/stream` events."""
+   teacher_id, slot_start = key
+   return {"teacher_id": teacher_id, "slot": slot_start, "remaining": remaining}
+
+
+def tomorrow_date() -> datetime:
+   return datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
+
+
+class AvailabilitySnapshot:
+   """Grouped availability of tomorrow with the remaining seats of every 1-hour slot."""
+
+   def __init__(self, max_age_seconds: float = 30, events: Optional[SlotEvents] = None):
+      self.max_age_seconds = max_age_seconds
+      self.events = events or SlotEvents()
+      self.date: Optional[datetime] = None
+      self.built_at = 0.0
+      self._teachers: Dict[str, Dict[str, Any]] = {}
+      self._remaining: Dict[Tuple[str, datetime], int] = {}
+      self._payload: Optional[List[Dict[str, Any]]] = None
+      self._teacher_ids: List[str] = []
+      # Bumped on every change of the served data, the ETag is derived from it
+      self.version = 0
+      self._stream_snapshot: Optional[Tuple[int, bytes]] = None
+      self._lock = asyncio.Lock()
+
+   def is_stale(self) -> bool:
+      return (
+         self.date != tomorrow_date()
+         or timer.monotonic() - self.built_at > self.max_age_seconds
+      )
+
+   def invalidate(self):
+      """Force a full rebuild on the next read."""
+      self.built_at = 0.0
+
+   async def get(self, db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+      """Return the grouped availability, rebuilding it first if stale."""
+      if self.is_stale():
+         async with self._lock:
+            if self.is_stale():
+               await self.rebuild(db)
+
+      if self._payload is None:
+         self._payload = self._render()
+         self._teacher_ids = [teacher["teacher_id"] for teacher in self._payload]
+      return self._payload
+
+   async def page(
+      self, db: AsyncIOMotorDatabase, after_teacher_id: Optional[str], limit: int
+   ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+      """
+      Return up to `limit` teachers ordered by teacher_id, starting strictly after
+      `after_teacher_id`, and the teacher_id to resume from (None on the last page).
+      """
+      payload = await self.get(db)
+      start = bisect_right(self._teacher_ids, after_teacher_id) if after_teacher_id is not None else 0
+      items = payload[start:start + limit]
+      last = items[-1]["teacher_id"] if items and start + limit < len(payload) else None
+      return items, last
+
+   async def get_etag(self, db: AsyncIOMotorDatabase) -> str:
+      """
+      ETag of the current payload, from the snapshot version rather than a hash of the
+      rendered payload, so a booking does not cost a re-render. Workers each have their own.
+      """
+      if self.is_stale():
+         await self.get(db)
+      return make_etag(self.events.epoch, self.date, self.version)
+
+   def _changed(self):
+      self.version += 1
+      self._payload = None
+
+   async def stream_snapshot(self, db: AsyncIOMotorDatabase) -> Tuple[int, bytes]:
+      """
+      SSE `snapshot` message with the remaining seats of every slot, and the sequence
+      number of the last event it includes. Shared by the subscribers until the next event.
+      """
+      await self.get(db)
+      if self._stream_snapshot is None or self._stream_snapshot[0] != self.events.seq:
+         seq = self.events.seq
+         message = sse_message(
+            "snapshot",
+            {"date": self.date, "slots": [slot_delta(*item) for item in self._capacities().items()]},
+            self.events.event_id(seq)
+         )
+         self._stream_snapshot = (seq, message)
+      return self._stream_snapshot
+
+   async def rebuild(self, db: AsyncIOMotorDatabase):
+      date = tomorrow_date()
+      teachers, remaining = await self._load(db, date)
+      before = self._capacities() if self.date == date else None
+      teachers = {teacher["teacher_id"]: teacher for teacher in teachers}
+      changed = before is None or teachers != self._teachers or remaining != self._remaining
+
+      self._teachers = teachers
+      self._remaining = remaining
+      self.date = date
+      self.built_at = timer.monotonic()
+      if changed:
+         self._changed()
+         self._stream_snapshot = None
+
+      if before is None:
+         # New day, subscribers start over from a snapshot
+         self.events.reset()
+      else:
+         # Catches up with the changes made by other workers
+         self._publish_changes(before, self._capacities())
+      logging.info(f"Availability snapshot rebuilt for {date}: {len(self._teachers)} teachers")
+
+   async def refresh_teacher(self, db: AsyncIOMotorDatabase, teacher_id: str):
+      """Reload a single teacher after their availability or profile changed."""
+      if self.date is None or self.date != tomorrow_date():
+         return
+
+      try:
+         teachers, remaining = await self._load(db, self.date, teacher_id)
+      except Exception:
+         logging.exception(f"Could not refresh teacher {teacher_id} in the availability snapshot")
+         self.invalidate()
+         return
+
+      before = self._capacities(teacher_id)
+      self._teachers.pop(teacher_id, None)
+      for teacher in teachers:
+         self._teachers[teacher["teacher_id"]] = teacher
+      for key in [key for key in self._remaining if key[0] == teacher_id]:
+         del self._remaining[key]
+      self._remaining.update(remaining)
+      self._changed()
+      self._publish_changes(before, self._capacities(teacher_id))
+
+   def update_remaining(self, capacity: Optional[Dict[str, Any]]):
+      """Apply the capacity document returned by `reserve_seat` / `release_seat`."""
+      if not capacity or capacity.get("booking_date") != self.date:
+         return
+
+      key = (capacity["teacher_id"], capacity["start_time"])
+      if self._remaining.get(key) == capacity["remaining"]:
+         return
+      self._remaining[key] = capacity["remaining"]
+      self._changed()
+      self.events.publish("slot", slot_delta(key, capacity["remaining"]))
+
+   def _capacities(self, teacher_id: Optional[str] = None) -> Dict[Tuple[str, datetime], int]:
+      """Remaining seats of every slot (of one teacher), as served by `_render`."""
+      teacher_ids = [teacher_id] if teacher_id is not None else sorted(self._teachers)
+      capacities = {}
+      for current_id in teacher_ids:
+         teacher = self._teachers.get(current_id)
+         if teacher is None:
+            continue
+         for window in teacher["slots"]:
+            for slot_start, _ in iter_slots(window):
+               capacities[(current_id, slot_start)] = self._remaining.get(
+                  (current_id, slot_start), window["max_no_of_students_each_slot"]
+               )
+      return capacities
+
+   def _publish_changes(self, before: Dict[Tuple[str, datetime], int], after: Dict[Tuple[str, datetime], int]):
+      for key, remaining in after.items():
+         if before.get(key) != remaining:
+            self.events.publish("slot", slot_delta(key, remaining))
+      for key in before.keys() - after.keys():
+         self.events.publish("slot", slot_delta(key, 0))
+
+   async def _load(self, db: AsyncIOMotorDatabase, date: datetime, teacher_id: Optional[str] = None):
+      """Read-only: capacity documents are created where availability is written."""
+      capacity_query = {"booking_date": date}
+      if teacher_id is not None:
+         capacity_query["teacher_id"] = teacher_id
+
+      teachers = await db.teacher_availabilities.aggregate(
+         available_slots_pipeline(date, teacher_id)
+      ).to_list(length=None)
+      capacities = await db[SLOT_CAPACITIES].find(
+         capacity_query, projection={"teacher_id": 1, "start_time": 1, "remaining": 1}
+      ).to_list(length=None)
+
+      remaining = {(c["teacher_id"], c["start_time"]): c["remaining"] for c in capacities}
+      return teachers, remaining
+
+   def _render(self) -> List[Dict[str, Any]]:
+      result = []
+      for teacher_id in sorted(self._teachers):
+         teacher = self._teachers[teacher_id]
+         result.append({
+            **teacher,
+            "slots": [
+               {
+                  **window,
+                  "capacity": [
+                     {
+                        "start_time": slot_start,
+                        "end_time": slot_end,
+                        "remaining": self._remaining.get(
+                           (teacher_id, slot_start), window["max_no_of_students_each_slot"]
+                        ),
+                     }
+                     for slot_start, slot_end in iter_slots(window)
+                  ],
+               }
+               for window in teacher["slots"]
+            ],
+         })
+      return result
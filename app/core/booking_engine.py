@@ -0,0 +1,290 @@
+"""
+Single-writer booking queue for contended slots.
+
+With the plain `book_slot` path every request of a hot slot runs its own
+reserve/insert/bump sequence, so N concurrent students cost N conditional updates
+fighting over the same capacity document, N inserts and N version bumps. The engine
+routes the requests of one (teacher, slot start) pair through an asyncio queue drained
+by a single worker task, which:
+
+- collects up to `max_batch` requests (waiting `batch_window_seconds` for stragglers),
+- decides in memory how many of them fit, from the capacity it last saw,
+- takes that many seats with one conditional `$inc`, falling back to a fresh read when
+  another writer (another process, a cancellation, auto-assign) changed the slot,
+- inserts the accepted bookings with one unordered `insert_many`, gives back the seats
+  of the duplicates, bumps the ETag versions once, and resolves every caller's future.
+
+The capacity document stays the source of truth, so the engine is safe to run in
+several processes next to the regular booking paths. Seats that cannot be given back
+after a failed insert are recounted from `class_bookings`. Workers exit after
+`idle_seconds` without requests, or on `shutdown`.
+"""
+
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from app.core.etag import bump_versions, student_bookings_key, teacher_bookings_key
+from app.core.intervals import AvailabilityIndex
+from app.core.metrics import booking_engine_release_failures
+from app.core.slot_capacity import SLOT_CAPACITIES, ensure_slot_capacity, reconcile_slot_capacity
+from app.models.bookings import Booking
+import asyncio
+import logging
+
+SlotKey = Tuple[str, datetime]
+
+
+class _Request:
+   __slots__ = ("student_id", "future")
+
+   def __init__(self, student_id: str, future: asyncio.Future):
+      self.student_id = student_id
+      self.future = future
+
+
+class _SlotWorker:
+   """Queue and last known capacity document of one slot."""
+
+   def __init__(self):
+      self.queue: "asyncio.Queue[_Request]" = asyncio.Queue()
+      self.capacity: Optional[Dict[str, Any]] = None
+      self.task: Optional[asyncio.Task] = None
+
+
+class BookingEngine:
+   def __init__(
+      self,
+      snapshot=None,
+      max_batch: int = 64,
+      batch_window_seconds: float = 0.002,
+      idle_seconds: float = 5.0,
+   ):
+      self.snapshot = snapshot
+      self.max_batch = max_batch
+      self.batch_window_seconds = batch_window_seconds
+      self.idle_seconds = idle_seconds
+      self._workers: Dict[SlotKey, _SlotWorker] = {}
+
+   async def book(
+      self, db: AsyncIOMotorDatabase, teacher_id: str, slot_start: datetime, student_id: str
+   ) -> Tuple[Dict[str, Any], str]:
+      """
+      Book `slot_start` of `teacher_id` for a student through the slot's queue.
+
+      Returns:
+         The stored booking document and its id
+
+      Raises:
+         HTTPException: Same statuses as `POST /student/book` (404, 400, 409)
+      """
+      key = (teacher_id, slot_start)
+      worker = self._workers.get(key)
+      if worker is None:
+         worker = self._workers[key] = _SlotWorker()
+         worker.task = asyncio.create_task(self._run(db, key, worker))
+
+      future = asyncio.get_running_loop().create_future()
+      worker.queue.put_nowait(_Request(student_id, future))
+      return await future
+
+   @property
+   def active_slots(self) -> int:
+      return len(self._workers)
+
+   async def shutdown(self):
+      """
+      Stop every slot worker, called when the application shuts down. A batch that
+      already took its seats is committed first, requests still queued get a 503.
+      """
+      workers = list(self._workers.values())
+      self._workers.clear()
+      for worker in workers:
+         worker.task.cancel()
+      await asyncio.gather(*(worker.task for worker in workers), return_exceptions=True)
+
+   async def _run(self, db: AsyncIOMotorDatabase, key: SlotKey, worker: _SlotWorker):
+      batch: List[_Request] = []
+      try:
+         while True:
+            try:
+               first = await asyncio.wait_for(worker.queue.get(), self.idle_seconds)
+            except asyncio.TimeoutError:
+               # No await between the check and the removal, so no request can slip in
+               if worker.queue.empty():
+                  self._workers.pop(key, None)
+                  return
+               continue
+
+            batch = [first]
+            if self.batch_window_seconds and worker.queue.qsize() < self.max_batch - 1:
+               await asyncio.sleep(self.batch_window_seconds)
+            while len(batch) < self.max_batch and not worker.queue.empty():
+               batch.append(worker.queue.get_nowait())
+
+            commit = asyncio.ensure_future(self._commit(db, key, worker, batch))
+            try:
+               await asyncio.shield(commit)
+            except asyncio.CancelledError:
+               await asyncio.wait([commit])
+               raise
+            except Exception as e:
+               logging.exception(f"Booking batch failed for slot {key}")
+               for request in batch:
+                  if not request.future.done():
+                     request.future.set_exception(e)
+               # Seats may have been taken without their bookings
+               worker.capacity = await self._reconcile(db, key)
+            batch = []
+      except asyncio.CancelledError:
+         while not worker.queue.empty():
+            batch.append(worker.queue.get_nowait())
+         for request in batch:
+            _reject(request, status.HTTP_503_SERVICE_UNAVAILABLE, "Booking service is shutting down, retry shortly")
+         raise
+
+   async def _commit(self, db: AsyncIOMotorDatabase, key: SlotKey, worker: _SlotWorker, batch: List[_Request]):
+      teacher_id, slot_start = key
+
+      # The same student twice in one batch: only the first request competes for a seat
+      pending: Dict[str, _Request] = {}
+      for request in batch:
+         if request.student_id in pending:
+            _reject(request, status.HTTP_409_CONFLICT, "You have already booked this slot.")
+         else:
+            pending[request.student_id] = request
+
+      if worker.capacity is None or worker.capacity["remaining"] <= 0:
+         worker.capacity = await self._load_capacity(db, key, list(pending.values()))
+         if worker.capacity is None:
+            return
+
+      # Decide in memory, then confirm with one conditional update; a stale view only
+      # costs a re-read
+      seats, capacity = 0, worker.capacity
+      while capacity is not None and capacity["remaining"] > 0:
+         wanted = min(capacity["remaining"], len(pending))
+         taken = await db[SLOT_CAPACITIES].find_one_and_update(
+            {"teacher_id": teacher_id, "start_time": slot_start, "remaining": {"$gte": wanted}},
+            {"$inc": {"remaining": -wanted}},
+            return_document=ReturnDocument.AFTER,
+         )
+         if taken is not None:
+            seats, capacity = wanted, taken
+            break
+         capacity = await db[SLOT_CAPACITIES].find_one({"teacher_id": teacher_id, "start_time": slot_start})
+      worker.capacity = capacity
+
+      accepted = list(pending.values())[:seats]
+      for request in list(pending.values())[seats:]:
+         max_allowed = capacity["max_students"] if capacity else 1
+         _reject(request, status.HTTP_409_CONFLICT, f"Slot already full. Max {max_allowed} students allowed.")
+      if not accepted:
+         return
+
+      documents = [
+         {
+            "_id": ObjectId(),
+            **Booking(
+               student_id=request.student_id,
+               teacher_id=teacher_id,
+               subject=capacity["subject"],
+               booking_date=datetime.combine(slot_start.date(), time.min),
+               start_time=slot_start,
+               end_time=capacity.get("end_time", slot_start + timedelta(hours=1)),
+            ).model_dump(),
+         }
+         for request in accepted
+      ]
+
+      failed: Dict[int, Any] = {}
+      try:
+         await db.class_bookings.insert_many(documents, ordered=False)
+      except BulkWriteError as e:
+         failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+      except Exception:
+         await self._release(db, key, worker, len(accepted))
+         raise
+
+      if failed:
+         await self._release(db, key, worker, len(failed))
+      if self.snapshot is not None:
+         self.snapshot.update_remaining(worker.capacity)
+
+      booked_students = []
+      for index, (request, document) in enumerate(zip(accepted, documents)):
+         error = failed.get(index)
+         if error is None:
+            booked_students.append(request.student_id)
+            if not request.future.done():
+               request.future.set_result((document, str(document["_id"])))
+         elif error.get("code") == 11000:
+            _reject(request, status.HTTP_409_CONFLICT, "You have already booked this slot.")
+         else:
+            _reject(request, status.HTTP_500_INTERNAL_SERVER_ERROR, f"Error booking this slot: {error.get('errmsg')}")
+
+      if booked_students:
+         await bump_versions(
+            db, teacher_bookings_key(teacher_id), *[student_bookings_key(student_id) for student_id in booked_students]
+         )
+
+   async def _load_capacity(
+      self, db: AsyncIOMotorDatabase, key: SlotKey, requests: List[_Request]
+   ) -> Optional[Dict[str, Any]]:
+      """Capacity document of the slot, created from the teacher's availability if needed."""
+      teacher_id, slot_start = key
+      capacity = await db[SLOT_CAPACITIES].find_one({"teacher_id": teacher_id, "start_time": slot_start})
+      if capacity is not None:
+         return capacity
+
+      booking_date = datetime.combine(slot_start.date(), time.min)
+      day_index = await AvailabilityIndex.load(db, teacher_id, [booking_date])
+      if not len(day_index.day(teacher_id, booking_date)):
+         for request in requests:
+            _reject(request, status.HTTP_404_NOT_FOUND, "No availability found for this teacher.")
+         return None
+
+      availability = day_index.find(teacher_id, booking_date, slot_start)
+      if not availability:
+         for request in requests:
+            _reject(request, status.HTTP_400_BAD_REQUEST, "Time not within any of the teacher's available slots")
+         return None
+
+      await ensure_slot_capacity(db, availability, slot_start, slot_start + timedelta(hours=1))
+      return await db[SLOT_CAPACITIES].find_one({"teacher_id": teacher_id, "start_time": slot_start})
+
+   async def _release(self, db: AsyncIOMotorDatabase, key: SlotKey, worker: _SlotWorker, seats: int):
+      """Give back `seats` seats taken by the current batch, never exceeding the slot maximum."""
+      teacher_id, slot_start = key
+      released = await db[SLOT_CAPACITIES].find_one_and_update(
+         {
+            "teacher_id": teacher_id,
+            "start_time": slot_start,
+            "$expr": {"$lte": [{"$add": ["$remaining", seats]}, "$max_students"]},
+         },
+         {"$inc": {"remaining": seats}},
+         return_document=ReturnDocument.AFTER,
+      )
+      if released is None:
+         # The slot changed meanwhile (reset, released elsewhere): the counter is unreliable
+         logging.error(f"Could not give back {seats} seats of slot {key}, reconciling it from class_bookings")
+         released = await self._reconcile(db, key)
+      worker.capacity = released
+
+   async def _reconcile(self, db: AsyncIOMotorDatabase, key: SlotKey) -> Optional[Dict[str, Any]]:
+      """Recount the remaining seats of the slot; None makes the next batch reload it."""
+      try:
+         capacity = await reconcile_slot_capacity(db, *key)
+      except Exception:
+         logging.exception(f"Could not reconcile the capacity of slot {key}")
+         capacity = None
+      booking_engine_release_failures.inc(("reconciled" if capacity is not None else "unresolved",))
+      return capacity
+
+
+def _reject(request: _Request, status_code: int, detail: str):
+   if not request.future.done():
+      request.future.set_exception(HTTPException(status_code=status_code, detail=detail))
@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+   """Size-bounded LRU cache whose entries expire after a time-to-live."""
+
+   def __init__(self, maxsize: int = 1024, ttl_seconds: float = 60):
+      self.maxsize = maxsize
+      self.ttl_seconds = ttl_seconds
+      self.hits = 0
+      self.misses = 0
+      self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+   def get(self, key: Hashable) -> Optional[Any]:
+      """
+      Return the cached value for `key`, or None if it is missing or expired.
+      """
+      entry = self._entries.get(key)
+      if entry is None:
+         self.misses += 1
+         return None
+
+      value, expires_at = entry
+      if expires_at <= time.monotonic():
+         del self._entries[key]
+         self.misses += 1
+         return None
+
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return value
+
+   def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+      """
+      Store `value` under `key`, evicting the least recently used entry when full.
+
+      Args:
+         key: The cache key
+         value: The value to cache
+         ttl_seconds: Overrides the cache-wide time-to-live for this entry
+      """
+      ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+      if ttl <= 0 or self.maxsize <= 0:
+         return
+
+      self._entries[key] = (value, time.monotonic() + ttl)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+         self._entries.popitem(last=False)
+
+   def invalidate(self, key: Hashable):
+      self._entries.pop(key, None)
+
+   def clear(self):
+      self._entries.clear()
+
+   def __len__(self):
+      return len(self._entries)
+
+   def stats(self) -> Dict[str, Any]:
+      lookups = self.hits + self.misses
+      return {
+         "size": len(self._entries),
+         "maxsize": self.maxsize,
+         "hits": self.hits,
+         "misses": self.misses,
+         "hit_rate": self.hits / lookups if lookups else 0.0,
+      }
@@ -1,6 +1,13 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 from functools import lru_cache
 from app.core.security import JWTConfig, JWTUtils, AuthorizationUtils
+from app.core.cache import TTLCache
+from app.core.availability_view import AvailabilitySnapshot
+from app.core.slot_events import SlotEvents
+from app.core.token_versions import TokenVersions
+from app.core.admission import AdmissionGate, RateLimiter
+from app.core.booking_engine import BookingEngine
 
 class Settings(BaseSettings):
    MONGO_URI: str
@@ -9,6 +16,45 @@ class Settings(BaseSettings):
    ALGORITHM: str = "HS256"
    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
    REFRESH_ACCESS_TOKEN_EXPIRE_MINUTES: int = 120
+   USER_CACHE_MAX_SIZE: int = 10000
+   USER_CACHE_TTL_SECONDS: int = 60
+   TOKEN_CACHE_MAX_SIZE: int = 10000  # 0 disables the verified token cache
+   CLAIMS_AUTH_ENABLED: bool = True  # authorize role-gated endpoints from token claims
+   TOKEN_VERSION_TTL_SECONDS: int = 30
+   ADMISSION_CONTROL_ENABLED: bool = True
+   ADMISSION_MAX_WAIT_MS: int = 250  # longest a request waits for a slot before a 503
+   BOOKING_MAX_CONCURRENCY: int = 32
+   BOOKING_MAX_QUEUE: int = 128
+   SLOTS_MAX_CONCURRENCY: int = 64
+   SLOTS_MAX_QUEUE: int = 256
+   BOOKING_RATE_PER_SECOND: float = 1.0  # per student, 0 disables the rate limit
+   BOOKING_RATE_BURST: int = 5
+   SLOTS_STREAM_MAX_SUBSCRIBERS: int = 5000  # per worker
+   SLOTS_STREAM_HEARTBEAT_SECONDS: float = 15
+   SLOTS_STREAM_BACKLOG: int = 1024  # events kept for subscribers catching up
+   BOOKING_ENGINE_ENABLED: bool = False  # queue bookings per slot, see app/core/booking_engine.py
+   BOOKING_ENGINE_MAX_BATCH: int = 64
+   BOOKING_ENGINE_BATCH_WINDOW_MS: float = 2
+   BOOKING_ENGINE_IDLE_SECONDS: float = 5
+   PASSWORD_HASH_WORKERS: Optional[int] = None  # defaults to the CPU count
+   PASSWORD_HASH_MAX_QUEUE: int = 64
+   ENSURE_INDEXES_ON_STARTUP: bool = True
+   VERIFY_QUERY_PLANS_ON_STARTUP: bool = False
+   AUTO_ASSIGN_ENABLED: bool = True
+   AUTO_ASSIGN_BATCH_SIZE: int = 5000
+   SLOTS_SNAPSHOT_MAX_AGE_SECONDS: int = 30
+   AUTO_ASSIGN_STRATEGY: str = "least_loaded"  # first_fit | least_loaded | min_cost_flow
+   AUTO_ASSIGN_INTERVAL_SECONDS: int = 5 * 60 * 60  # every 5 hours
+   AUTO_ASSIGN_LEASE_SECONDS: int = 60
+   DEFAULT_PAGE_SIZE: int = 50
+   AVAILABILITY_MAX_DAYS_AHEAD: int = 14
+   BULK_AVAILABILITY_MAX_WINDOWS: int = 200
+   BATCH_BOOKING_MAX_SLOTS: int = 20
+   METRICS_ENABLED: bool = True
+   QUERY_PROFILER_ENABLED: bool = False  # debug only, counts the Mongo commands of every request
+   N_PLUS_ONE_THRESHOLD: int = 5
+   SLOW_QUERY_MS: int = 200  # 0 disables the slow-query log
+   MAX_PAGE_SIZE: int = 500
 
    class Config:
       env_file = ".env"
@@ -19,13 +65,62 @@ def get_settings():
 
 settings = get_settings()
 
-jwt_utils = JWTUtils(config=JWTConfig(
-   secret_key=settings.SECRET_KEY,
-   algorithm=settings.ALGORITHM,
-   access_token_expire_minutes=settings.REFRESH_ACCESS_TOKEN_EXPIRE_MINUTES,
-   refresh_token_expire_minutes=settings.REFRESH_ACCESS_TOKEN_EXPIRE_MINUTES
-))
-authorization_utils = AuthorizationUtils()
+# Verified JWT payloads, see `JWTUtils.decode_token`
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_MAX_SIZE)
+jwt_utils = JWTUtils(
+   config=JWTConfig(
+      secret_key=settings.SECRET_KEY,
+      algorithm=settings.ALGORITHM,
+      access_token_expire_minutes=settings.REFRESH_ACCESS_TOKEN_EXPIRE_MINUTES,
+      refresh_token_expire_minutes=settings.REFRESH_ACCESS_TOKEN_EXPIRE_MINUTES
+   ),
+   cache=token_cache if settings.TOKEN_CACHE_MAX_SIZE > 0 else None
+)
+authorization_utils = AuthorizationUtils(
+   max_workers=settings.PASSWORD_HASH_WORKERS,
+   max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
+# Resolved `User` principals keyed by user_id, see `get_current_user`
+user_cache = TTLCache(
+   maxsize=settings.USER_CACHE_MAX_SIZE,
+   ttl_seconds=settings.USER_CACHE_TTL_SECONDS
+)
+# Token versions keyed by user_id, see `get_current_claims`
+token_versions = TokenVersions(
+   maxsize=settings.USER_CACHE_MAX_SIZE,
+   ttl_seconds=settings.TOKEN_VERSION_TTL_SECONDS
+)
+# Admission control of the booking hot path, see app/middlewares/admission.py
+booking_gate = AdmissionGate(
+   "booking",
+   max_concurrency=settings.BOOKING_MAX_CONCURRENCY,
+   max_queue=settings.BOOKING_MAX_QUEUE,
+   max_wait_seconds=settings.ADMISSION_MAX_WAIT_MS / 1000
+)
+slots_gate = AdmissionGate(
+   "slots",
+   max_concurrency=settings.SLOTS_MAX_CONCURRENCY,
+   max_queue=settings.SLOTS_MAX_QUEUE,
+   max_wait_seconds=settings.ADMISSION_MAX_WAIT_MS / 1000
+)
+booking_rate_limiter = RateLimiter(
+   "booking",
+   rate=settings.BOOKING_RATE_PER_SECOND,
+   burst=settings.BOOKING_RATE_BURST,
+   maxsize=settings.USER_CACHE_MAX_SIZE
+) if settings.BOOKING_RATE_PER_SECOND > 0 else None
+# Materialized view backing GET /slots/available
+availability_snapshot = AvailabilitySnapshot(
+   max_age_seconds=settings.SLOTS_SNAPSHOT_MAX_AGE_SECONDS,
+   events=SlotEvents(backlog=settings.SLOTS_STREAM_BACKLOG)
+)
+# Per-slot single-writer booking queues, used by POST /student/book when enabled
+booking_engine = BookingEngine(
+   snapshot=availability_snapshot,
+   max_batch=settings.BOOKING_ENGINE_MAX_BATCH,
+   batch_window_seconds=settings.BOOKING_ENGINE_BATCH_WINDOW_MS / 1000,
+   idle_seconds=settings.BOOKING_ENGINE_IDLE_SECONDS
+)
 cors_origins = [
    # Lsit of frontend urls to give access to
 ]
\ No newline at end of file
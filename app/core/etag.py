@@ -0,0 +1,98 @@
+"""
+Strong ETags for the read-heavy listing endpoints.
+
+Every cacheable resource is described by a set of version keys stored in the
+`resource_versions` collection. Write paths bump the keys they affect, read paths hash
+the current versions into an ETag with a single `_id` lookup and answer 304 when it
+matches `If-None-Match`, without running the listing queries. A profile update bumps
+the booking listings that embed that profile only (`bump_profile_dependents`).
+"""
+
+from datetime import datetime, time
+from hashlib import blake2b
+from typing import Optional
+from fastapi import Request, Response, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+RESOURCE_VERSIONS = "resource_versions"
+
+# Shared key, bumped for changes that affect every user
+AUTO_ASSIGN_VERSION = "auto_assign"
+
+
+def teacher_availability_key(teacher_id: str) -> str:
+   return f"teacher_availability:{teacher_id}"
+
+
+def teacher_bookings_key(teacher_id: str) -> str:
+   return f"teacher_bookings:{teacher_id}"
+
+
+def student_bookings_key(student_id: str) -> str:
+   return f"student_bookings:{student_id}"
+
+
+async def bump_versions(db: AsyncIOMotorDatabase, *keys: str):
+   """Invalidate the ETags of every resource depending on `keys`."""
+   if not keys:
+      return
+   await db[RESOURCE_VERSIONS].bulk_write(
+      [UpdateOne({"_id": key}, {"$inc": {"version": 1}}, upsert=True) for key in set(keys)],
+      ordered=False,
+   )
+
+
+async def bump_profile_dependents(db: AsyncIOMotorDatabase, user_id: str, role: str):
+   """
+   Invalidate the booking listings showing the profile of `user_id`: the listings of the
+   students booked with a teacher, or of the teachers of a student, from today on. A
+   teacher's own listing shows their subject too.
+   """
+   today = datetime.combine(datetime.now().date(), time.min)
+   if role == "teacher":
+      student_ids = await db.class_bookings.distinct("student_id", {"teacher_id": user_id, "booking_date": {"$gte": today}})
+      keys = [teacher_bookings_key(user_id)] + [student_bookings_key(student_id) for student_id in student_ids]
+   else:
+      teacher_ids = await db.class_bookings.distinct("teacher_id", {"student_id": user_id, "booking_date": {"$gte": today}})
+      keys = [teacher_bookings_key(teacher_id) for teacher_id in teacher_ids]
+   await bump_versions(db, *keys)
+
+
+def make_etag(*parts) -> str:
+   digest = blake2b(
+      b"|".join(part if isinstance(part, bytes) else str(part).encode() for part in parts),
+      digest_size=16
+   )
+   return f'"{digest.hexdigest()}"'
+
+
+async def compute_etag(db: AsyncIOMotorDatabase, *keys: str, extra: str = "") -> str:
+   """
+   Build a strong ETag from the current versions of `keys`.
+
+   Args:
+      keys: Version keys the resource depends on
+      extra: Anything else the representation depends on (date, query parameters)
+   """
+   docs = await db[RESOURCE_VERSIONS].find({"_id": {"$in": list(keys)}}).to_list(length=None)
+   versions = {doc["_id"]: doc["version"] for doc in docs}
+   return make_etag(*(f"{key}={versions.get(key, 0)}" for key in keys), extra)
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+   """
+   Return a 304 response if the client already holds the representation tagged `etag`.
+   """
+   if_none_match = request.headers.get("if-none-match")
+   if not if_none_match:
+      return None
+
+   candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+   if "*" in candidates or etag in candidates:
+      return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+   return None
+
+
+def etag_headers(etag: str):
+   return {"ETag": etag, "Cache-Control": "private, no-cache"}
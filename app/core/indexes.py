@@ -0,0 +1,215 @@
+"""
+Declarative registry of the MongoDB indexes the application relies on.
+
+`ensure_indexes` is run from the app `lifespan` and from `scripts/ensure_indexes.py`,
+`verify_query_plans` explains every hot query and reports the ones that fall back to a COLLSCAN.
+"""
+
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.core.pagination import keyset_filter
+import logging
+
+DUPLICATE_KEY = 11000
+
+INDEXES: Dict[str, List[IndexModel]] = {
+   "users": [
+      IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+      IndexModel([("role", ASCENDING), ("is_active", ASCENDING)], name="role_is_active"),
+   ],
+   "class_bookings": [
+      IndexModel(
+         [("teacher_id", ASCENDING), ("booking_date", ASCENDING), ("start_time", ASCENDING)],
+         name="teacher_date_start",
+      ),
+      IndexModel(
+         [("student_id", ASCENDING), ("booking_date", ASCENDING), ("start_time", ASCENDING)],
+         name="student_date_start",
+      ),
+      IndexModel([("booking_date", ASCENDING), ("student_id", ASCENDING)], name="date_student"),
+      IndexModel(
+         [("student_id", ASCENDING), ("teacher_id", ASCENDING), ("start_time", ASCENDING)],
+         name="student_teacher_slot_unique",
+         unique=True,
+      ),
+   ],
+   "teacher_availabilities": [
+      IndexModel(
+         [("teacher_id", ASCENDING), ("available_date", ASCENDING), ("start_time", ASCENDING)],
+         name="teacher_date_start",
+      ),
+      IndexModel(
+         [("available_date", ASCENDING), ("teacher_id", ASCENDING), ("start_time", ASCENDING)],
+         name="date_teacher_start",
+      ),
+   ],
+   "slot_capacities": [
+      IndexModel([("teacher_id", ASCENDING), ("start_time", ASCENDING)], name="teacher_slot_unique", unique=True),
+      IndexModel([("booking_date", ASCENDING), ("teacher_id", ASCENDING), ("start_time", ASCENDING)], name="date_teacher_start"),
+   ],
+   "leases": [
+      # Cleans up the leases of crashed holders, expiry itself is checked on acquisition
+      IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+   ],
+   "auto_assign_runs": [
+      # One run per schedule tick across all workers
+      IndexModel([("tick", ASCENDING)], name="tick_unique", unique=True),
+      IndexModel([("started_at", ASCENDING)], name="started_at"),
+   ],
+}
+
+
+def hot_queries() -> List[Dict[str, Any]]:
+   """
+      Representative shapes of the queries issued on the request path.
+      Values are placeholders, only the filter/sort shape matters to the planner.
+   """
+   tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
+   teacher_id = "000000000000000000000000"
+   student_id = "000000000000000000000001"
+
+   return [
+      {
+         "name": "book_slot: seat reservation",
+         "collection": "slot_capacities",
+         "filter": {"teacher_id": teacher_id, "start_time": tomorrow, "remaining": {"$gt": 0}},
+      },
+      {
+         "name": "book_slot / set_availability: teacher day windows",
+         "collection": "teacher_availabilities",
+         "filter": {"teacher_id": teacher_id, "available_date": tomorrow},
+         "sort": [("start_time", ASCENDING)],
+      },
+      {
+         "name": "book_slot: existing slot bookings",
+         "collection": "class_bookings",
+         "filter": {"teacher_id": teacher_id, "start_time": tomorrow},
+      },
+      {
+         "name": "set_availability_bulk: teacher windows of several days",
+         "collection": "teacher_availabilities",
+         "filter": {"teacher_id": teacher_id, "available_date": {"$in": [tomorrow, tomorrow + timedelta(days=1)]}},
+         "sort": [("start_time", ASCENDING)],
+      },
+      {
+         "name": "get_available_slots: availabilities of the day",
+         "collection": "teacher_availabilities",
+         "filter": {"available_date": tomorrow},
+         "sort": [("teacher_id", ASCENDING), ("start_time", ASCENDING)],
+      },
+      {
+         "name": "view_my_student_registeration: teacher bookings page",
+         "collection": "class_bookings",
+         "filter": {
+            "teacher_id": teacher_id,
+            "booking_date": tomorrow,
+            **keyset_filter(["start_time", "_id"], [tomorrow, ObjectId("0" * 24)]),
+         },
+         "sort": [("start_time", ASCENDING), ("_id", ASCENDING)],
+      },
+      {
+         "name": "get_student_bookings: upcoming bookings page",
+         "collection": "class_bookings",
+         "filter": {"$and": [
+            {"student_id": student_id, "booking_date": {"$gte": tomorrow}},
+            keyset_filter(["booking_date", "start_time", "_id"], [tomorrow, tomorrow, ObjectId("0" * 24)]),
+         ]},
+         "sort": [("booking_date", ASCENDING), ("start_time", ASCENDING), ("_id", ASCENDING)],
+      },
+      {
+         "name": "login_user: user by email",
+         "collection": "users",
+         "filter": {"email": "someone@example.com"},
+      },
+   ]
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+   """
+      Create every registered index. Existing indexes with the same spec are left untouched.
+
+      Raises:
+         RuntimeError: A unique index cannot be built because the collection already holds
+            duplicates, naming the index (see `find_duplicates`)
+   """
+   for collection, models in INDEXES.items():
+      try:
+         names = await db[collection].create_indexes(models)
+      except OperationFailure as e:
+         if e.code != DUPLICATE_KEY:
+            raise
+         # The server rejects the whole batch, build them one by one to name the culprit
+         failed = []
+         for model in models:
+            try:
+               await db[collection].create_indexes([model])
+            except OperationFailure as model_error:
+               if model_error.code != DUPLICATE_KEY:
+                  raise
+               failed.append(model.document["name"])
+         raise RuntimeError(
+            f"Duplicate keys in '{collection}' prevent building the unique index(es) {failed}. "
+            "List them with `python -m scripts.ensure_indexes --find-duplicates` and remove them first."
+         ) from e
+      logging.info(f"Ensured indexes on {collection}: {names}")
+
+
+async def find_duplicates(db: AsyncIOMotorDatabase, sample: int = 5) -> Dict[str, Dict[str, Any]]:
+   """
+      Key values held by several documents, for every registered unique index.
+
+      Returns:
+         `{"<collection>.<index>": {"groups": n, "examples": [{"key": ..., "ids": [...]}]}}`,
+         only for the indexes that have duplicates
+   """
+   report = {}
+   for collection, models in INDEXES.items():
+      for model in models:
+         spec = model.document
+         if not spec.get("unique"):
+            continue
+         fields = list(spec["key"])
+         groups = await db[collection].aggregate([
+            {"$group": {"_id": {field: f"${field}" for field in fields}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+         ], allowDiskUse=True).to_list(length=None)
+         if groups:
+            report[f"{collection}.{spec['name']}"] = {
+               "groups": len(groups),
+               "examples": [{"key": group["_id"], "ids": group["ids"]} for group in groups[:sample]],
+            }
+   return report
+
+
+def _plan_stages(plan: Any):
+   if isinstance(plan, dict):
+      if "stage" in plan:
+         yield plan["stage"]
+      for value in plan.values():
+         yield from _plan_stages(value)
+   elif isinstance(plan, list):
+      for item in plan:
+         yield from _plan_stages(item)
+
+
+async def verify_query_plans(db: AsyncIOMotorDatabase) -> List[str]:
+   """
+      Explain each hot query and return the names of those whose winning plan is a COLLSCAN.
+   """
+   offenders = []
+   for query in hot_queries():
+      cursor = db[query["collection"]].find(query["filter"])
+      if query.get("sort"):
+         cursor = cursor.sort(query["sort"])
+
+      explain = await cursor.explain()
+      winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+      if "COLLSCAN" in set(_plan_stages(winning_plan)):
+         logging.error(f"COLLSCAN detected for query '{query['name']}' on {query['collection']}")
+         offenders.append(query["name"])
+
+   return offenders
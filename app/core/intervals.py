@@ -0,0 +1,128 @@
+"""
+Interval index over teacher availability windows.
+
+Windows of one teacher on one day never overlap, so once sorted by start their ends are
+sorted too and both "which window contains t" and "does [a, b) overlap anything" are
+answered with one bisect. `AvailabilityIndex` groups the per-day indexes by
+(teacher_id, available_date) and is shared by `set_availability`, `book_slot` and the
+auto-assignment task.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+
+class DayIntervals:
+   """Non-overlapping [start_time, end_time) windows of one teacher on one day."""
+
+   def __init__(self):
+      self._starts: List[datetime] = []
+      self._ends: List[datetime] = []
+      self._windows: List[Dict[str, Any]] = []
+
+   def __len__(self):
+      return len(self._windows)
+
+   def __iter__(self):
+      return iter(self._windows)
+
+   def overlaps(self, start: datetime, end: datetime) -> bool:
+      """Whether [start, end) intersects any window."""
+      # Last window starting before `end`, the only one that can reach past `start`
+      i = bisect_left(self._starts, end) - 1
+      return i >= 0 and self._ends[i] > start
+
+   def find(self, moment: datetime) -> Optional[Dict[str, Any]]:
+      """The window containing `moment`, if any."""
+      i = bisect_right(self._starts, moment) - 1
+      if i >= 0 and moment < self._ends[i]:
+         return self._windows[i]
+      return None
+
+   def add(self, window: Dict[str, Any]) -> bool:
+      """
+      Insert a window keeping the order.
+
+      Returns:
+         False (and leaves the index unchanged) if it overlaps an existing window
+      """
+      start, end = window["start_time"], window["end_time"]
+      if self.overlaps(start, end):
+         return False
+
+      i = bisect_left(self._starts, start)
+      self._starts.insert(i, start)
+      self._ends.insert(i, end)
+      self._windows.insert(i, window)
+      return True
+
+
+class AvailabilityIndex:
+   """`DayIntervals` per (teacher_id, available_date)."""
+
+   def __init__(self):
+      self._days: Dict[Tuple[str, datetime], DayIntervals] = {}
+      self._conflicts: Dict[Tuple[str, datetime], List[Dict[str, Any]]] = {}
+
+   @classmethod
+   def from_availabilities(cls, availabilities: Iterable[Dict[str, Any]]) -> "AvailabilityIndex":
+      """
+      Index stored availabilities. Windows overlapping an already indexed one (only
+      possible for data written before overlaps were validated) are kept aside in `conflicts`.
+      """
+      index = cls()
+      for availability in availabilities:
+         if not index.add(availability):
+            key = (str(availability["teacher_id"]), availability["available_date"])
+            index._conflicts.setdefault(key, []).append(availability)
+      return index
+
+   @classmethod
+   async def load(
+      cls, db: AsyncIOMotorDatabase, teacher_id: str, dates: Iterable[datetime]
+   ) -> "AvailabilityIndex":
+      """Index every window of a teacher on the given days with a single query."""
+      dates = list(set(dates))
+      if not dates:
+         return cls()
+
+      query = {"teacher_id": teacher_id, "available_date": dates[0] if len(dates) == 1 else {"$in": dates}}
+      return cls.from_availabilities(
+         await db.teacher_availabilities.find(query).sort("start_time", 1).to_list(length=None)
+      )
+
+   def day(self, teacher_id: str, available_date: datetime) -> DayIntervals:
+      key = (str(teacher_id), available_date)
+      if key not in self._days:
+         self._days[key] = DayIntervals()
+      return self._days[key]
+
+   def add(self, availability: Dict[str, Any]) -> bool:
+      """Index a window unless it overlaps one already indexed (or a known conflicting one)."""
+      if self.overlaps(
+         availability["teacher_id"], availability["available_date"],
+         availability["start_time"], availability["end_time"]
+      ):
+         return False
+      return self.day(availability["teacher_id"], availability["available_date"]).add(availability)
+
+   def overlaps(self, teacher_id: str, available_date: datetime, start: datetime, end: datetime) -> bool:
+      if self.day(teacher_id, available_date).overlaps(start, end):
+         return True
+      return any(
+         c["start_time"] < end and start < c["end_time"]
+         for c in self._conflicts.get((str(teacher_id), available_date), ())
+      )
+
+   def find(self, teacher_id: str, available_date: datetime, moment: datetime) -> Optional[Dict[str, Any]]:
+      return self.day(teacher_id, available_date).find(moment)
+
+   def windows(self) -> List[Dict[str, Any]]:
+      """Every indexed window, without the conflicting ones."""
+      return [window for day in self._days.values() for window in day]
+
+   @property
+   def conflicts(self) -> List[Dict[str, Any]]:
+      return [window for windows in self._conflicts.values() for window in windows]
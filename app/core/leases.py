@@ -0,0 +1,99 @@
+"""
+Lease-based leader lock stored in MongoDB, for jobs that must run in one process only.
+
+A lease is a document of the `leases` collection keyed by the job name, holding its
+owner and an `expires_at` deadline. It is taken with one conditional upsert that only
+matches when the lease is free, expired or already ours, so among concurrent candidates
+exactly one wins (the others hit the `_id` duplicate key). The holder renews it every
+`ttl_seconds / 3` from a heartbeat task, so a crashed holder loses the lease within
+`ttl_seconds` and the TTL index eventually removes its document.
+"""
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+LEASES = "leases"
+
+
+def default_owner() -> str:
+   """Identifies this process among the workers and pods competing for a lease."""
+   return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaseLock:
+   def __init__(self, db: AsyncIOMotorDatabase, name: str, ttl_seconds: float = 60, owner: Optional[str] = None):
+      self.db = db
+      self.name = name
+      self.ttl_seconds = ttl_seconds
+      self.owner = owner or default_owner()
+      # Cleared by the heartbeat when the lease could not be renewed
+      self.held = False
+
+   def _expiry(self) -> datetime:
+      return datetime.now(tz=timezone.utc) + timedelta(seconds=self.ttl_seconds)
+
+   async def acquire(self) -> bool:
+      """Take the lease if it is free, expired or already held by this owner."""
+      now = datetime.now(tz=timezone.utc)
+      try:
+         await self.db[LEASES].update_one(
+            {"_id": self.name, "$or": [{"expires_at": {"$lte": now}}, {"owner": self.owner}]},
+            {"$set": {"owner": self.owner, "acquired_at": now, "expires_at": self._expiry()}},
+            upsert=True,
+         )
+      except DuplicateKeyError:
+         # Held by another live owner
+         self.held = False
+         return False
+      self.held = True
+      return True
+
+   async def renew(self) -> bool:
+      """Push the deadline back. False means the lease expired and may have been taken over."""
+      result = await self.db[LEASES].update_one(
+         {"_id": self.name, "owner": self.owner},
+         {"$set": {"expires_at": self._expiry()}},
+      )
+      self.held = result.matched_count == 1
+      return self.held
+
+   async def release(self):
+      await self.db[LEASES].delete_one({"_id": self.name, "owner": self.owner})
+      self.held = False
+
+   async def _heartbeat(self):
+      while self.held:
+         await asyncio.sleep(self.ttl_seconds / 3)
+         try:
+            if not await self.renew():
+               logging.warning(f"Lost lease '{self.name}' held by {self.owner}")
+         except Exception:
+            logging.exception(f"Could not renew lease '{self.name}'")
+
+   @asynccontextmanager
+   async def hold(self) -> AsyncIterator[bool]:
+      """
+         Hold the lease for the duration of the block, renewing it in the background.
+         Yields whether it was acquired; check `held` to know if it was kept throughout.
+      """
+      if not await self.acquire():
+         yield False
+         return
+
+      heartbeat = asyncio.create_task(self._heartbeat())
+      try:
+         yield True
+      finally:
+         heartbeat.cancel()
+         try:
+            await self.release()
+         except Exception:
+            logging.exception(f"Could not release lease '{self.name}', it expires in {self.ttl_seconds}s")
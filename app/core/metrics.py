@@ -0,0 +1,244 @@
+"""
+In-process metrics exposed by `GET /metrics` in the Prometheus text format.
+
+Kept dependency free and cheap on the hot path: recording a sample is a dict lookup and
+a bisect, all the formatting happens when `/metrics` is scraped. Mongo command latencies
+and connection pool stats are collected through pymongo's monitoring listeners, which
+are registered on the application's Motor client.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Sequence, Tuple
+from pymongo import monitoring
+
+# Seconds, tuned for API requests and single Mongo commands
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+   return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+   pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+   if extra:
+      pairs.append(extra)
+   return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+   type = ""
+
+   def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+      self.name = name
+      self.documentation = documentation
+      self.labelnames = tuple(labelnames)
+      # Motor runs pymongo (and so the monitoring listeners) in worker threads
+      self._lock = Lock()
+
+   def header(self) -> List[str]:
+      return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+   type = "counter"
+
+   def __init__(self, *args, **kwargs):
+      super().__init__(*args, **kwargs)
+      self._values: Dict[Tuple[str, ...], float] = {}
+
+   def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+      with self._lock:
+         self._values[labels] = self._values.get(labels, 0) + amount
+
+   def render(self) -> List[str]:
+      with self._lock:
+         values = list(self._values.items())
+      return self.header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in values]
+
+
+class Gauge(Counter):
+   type = "gauge"
+
+   def dec(self, labels: Tuple[str, ...] = (), amount: float = 1):
+      self.inc(labels, -amount)
+
+   def set(self, labels: Tuple[str, ...], value: float):
+      with self._lock:
+         self._values[labels] = value
+
+
+class Histogram(_Metric):
+   type = "histogram"
+
+   def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+      super().__init__(*args, **kwargs)
+      self.buckets = tuple(sorted(buckets))
+      # labels -> [count per bucket (+Inf last), sum]
+      self._values: Dict[Tuple[str, ...], list] = {}
+
+   def observe(self, labels: Tuple[str, ...], value: float):
+      bucket = bisect_left(self.buckets, value)
+      with self._lock:
+         series = self._values.get(labels)
+         if series is None:
+            series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+         series[0][bucket] += 1
+         series[1] += value
+
+   def render(self) -> List[str]:
+      lines = self.header()
+      with self._lock:
+         series = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+      for labels, counts, total in series:
+         cumulative = 0
+         for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+         lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+         lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+      return lines
+
+
+class MetricsRegistry:
+   def __init__(self):
+      self._metrics: List[_Metric] = []
+
+   def register(self, metric: _Metric) -> _Metric:
+      self._metrics.append(metric)
+      return metric
+
+   def render(self) -> str:
+      lines = []
+      for metric in self._metrics:
+         lines.extend(metric.render())
+      return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.register(Counter(
+   "http_requests_total", "HTTP requests handled, by route and status code", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+   "http_request_duration_seconds", "HTTP request latency, by route", ("method", "route")
+))
+http_requests_in_flight = registry.register(Gauge(
+   "http_requests_in_flight", "HTTP requests currently being handled, by route", ("method", "route")
+))
+mongo_command_duration = registry.register(Histogram(
+   "mongo_command_duration_seconds", "MongoDB command latency, by collection and command", ("collection", "command")
+))
+mongo_command_failures = registry.register(Counter(
+   "mongo_command_failures_total", "MongoDB commands that failed, by collection and command", ("collection", "command")
+))
+mongo_pool_connections = registry.register(Gauge(
+   "mongo_pool_connections", "Open connections of the MongoDB connection pool", ("address",)
+))
+mongo_pool_checked_out = registry.register(Gauge(
+   "mongo_pool_checked_out_connections", "Connections currently checked out of the MongoDB pool", ("address",)
+))
+mongo_pool_checkout_failures = registry.register(Counter(
+   "mongo_pool_checkout_failures_total", "Failed connection checkouts, by reason", ("address", "reason")
+))
+admission_rejections = registry.register(Counter(
+   "admission_rejections_total", "Requests rejected by admission control, by gate and reason", ("gate", "reason")
+))
+booking_engine_release_failures = registry.register(Counter(
+   "booking_engine_release_failures_total", "Seats the booking engine could not give back, by outcome", ("outcome",)
+))
+
+# Sampled when /metrics is scraped
+user_cache_entries = registry.register(Gauge("user_cache_entries", "Entries of the authenticated user cache"))
+user_cache_hit_rate = registry.register(Gauge("user_cache_hit_rate", "Hit rate of the authenticated user cache"))
+token_cache_entries = registry.register(Gauge("token_cache_entries", "Entries of the verified JWT cache"))
+token_cache_hit_rate = registry.register(Gauge("token_cache_hit_rate", "Hit rate of the verified JWT cache"))
+password_hash_pending = registry.register(Gauge(
+   "password_hash_pending", "Password hash/verify calls running or queued in the worker pool"
+))
+slots_stream_subscribers = registry.register(Gauge(
+   "slots_stream_subscribers", "Open /slots/stream connections"
+))
+booking_engine_slots = registry.register(Gauge(
+   "booking_engine_slots", "Slots with a running booking queue worker"
+))
+admission_active = registry.register(Gauge(
+   "admission_active_requests", "Requests admitted and running, by admission gate", ("gate",)
+))
+admission_waiting = registry.register(Gauge(
+   "admission_waiting_requests", "Requests waiting in the queue of an admission gate", ("gate",)
+))
+
+
+def _address(address) -> str:
+   return f"{address[0]}:{address[1]}" if address else ""
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+   """Times every Mongo command, labelled with its collection and command name."""
+
+   def __init__(self):
+      self._pending: Dict[Tuple[int, int], str] = {}
+      self._lock = Lock()
+
+   def started(self, event: monitoring.CommandStartedEvent):
+      collection = event.command.get(event.command_name)
+      with self._lock:
+         self._pending[(event.request_id, event.operation_id)] = collection if isinstance(collection, str) else ""
+
+   def _collection(self, event) -> str:
+      with self._lock:
+         return self._pending.pop((event.request_id, event.operation_id), "")
+
+   def succeeded(self, event: monitoring.CommandSucceededEvent):
+      mongo_command_duration.observe((self._collection(event), event.command_name), event.duration_micros / 1e6)
+
+   def failed(self, event: monitoring.CommandFailedEvent):
+      labels = (self._collection(event), event.command_name)
+      mongo_command_duration.observe(labels, event.duration_micros / 1e6)
+      mongo_command_failures.inc(labels)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+   """Keeps the open / checked out connection gauges of every pool up to date."""
+
+   def pool_created(self, event):
+      pass
+
+   def pool_ready(self, event):
+      pass
+
+   def pool_cleared(self, event):
+      pass
+
+   def pool_closed(self, event):
+      mongo_pool_connections.set((_address(event.address),), 0)
+      mongo_pool_checked_out.set((_address(event.address),), 0)
+
+   def connection_created(self, event):
+      mongo_pool_connections.inc((_address(event.address),))
+
+   def connection_ready(self, event):
+      pass
+
+   def connection_closed(self, event):
+      mongo_pool_connections.dec((_address(event.address),))
+
+   def connection_check_out_started(self, event):
+      pass
+
+   def connection_check_out_failed(self, event):
+      mongo_pool_checkout_failures.inc((_address(event.address), str(event.reason)))
+
+   def connection_checked_out(self, event):
+      mongo_pool_checked_out.inc((_address(event.address),))
+
+   def connection_checked_in(self, event):
+      mongo_pool_checked_out.dec((_address(event.address),))
+
+
+def mongo_event_listeners() -> list:
+   """Listeners to pass as `event_listeners` when creating the Motor client."""
+   return [CommandMetricsListener(), PoolMetricsListener()]
@@ -0,0 +1,62 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A page is requested with `limit` and the opaque `cursor` returned by the previous page.
+The cursor encodes the sort key of the last item sent, and the next page is fetched with
+a range query on that key (`keyset_filter`), so deep pages are as cheap as the first one
+as long as the sort matches an index.
+"""
+
+import base64
+import binascii
+from typing import Any, Dict, List, Optional
+from bson import json_util
+from fastapi import HTTPException, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: List[Any]) -> str:
+   raw = json_util.dumps(values).encode()
+   return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+   """
+   Decode a cursor produced by `encode_cursor`.
+
+   Raises:
+      HTTPException: 400 if the cursor is malformed or does not match the expected sort key
+   """
+   if not cursor:
+      return None
+
+   try:
+      raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+      values = json_util.loads(raw)
+   except (binascii.Error, ValueError, TypeError):
+      values = None
+
+   if not isinstance(values, list) or len(values) != size:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+   return values
+
+
+def keyset_filter(sort_fields: List[str], values: Optional[List[Any]]) -> Dict[str, Any]:
+   """
+   Range condition selecting the documents strictly after `values` for an ascending
+   sort on `sort_fields`, e.g. (a, b) > (x, y) -> a > x OR (a == x AND b > y).
+   """
+   if values is None:
+      return {}
+
+   branches = []
+   for i, field in enumerate(sort_fields):
+      branch = {sort_fields[j]: values[j] for j in range(i)}
+      branch[field] = {"$gt": values[i]}
+      branches.append(branch)
+   return {"$or": branches}
+
+
+def next_cursor_headers(next_cursor: Optional[str]) -> Dict[str, str]:
+   return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
@@ -0,0 +1,159 @@
+"""
+Per-request Mongo query profiling, N+1 detection and slow-query log.
+
+`QueryProfilerListener` is a pymongo command listener. Every command issued while a
+`QueryProfile` is active in the current context (set by `QueryProfilerMiddleware` for
+each request, or by `profile_queries()` anywhere else) is recorded with its collection
+and filter *shape*: the filter with every value replaced by its type. Many commands of
+the same shape within one request are the signature of an N+1 loop.
+
+Motor runs pymongo in worker threads with a copy of the caller's context, so the
+listener sees the profile of the request that issued the command.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pymongo import monitoring
+import logging
+
+_current_profile: ContextVar[Optional["QueryProfile"]] = ContextVar("query_profile", default=None)
+
+
+def query_shape(value: Any) -> Any:
+   """Replace every value of a filter by its type name, keeping operators and field names."""
+   if isinstance(value, dict):
+      return {key: query_shape(item) for key, item in sorted(value.items())}
+   if isinstance(value, (list, tuple)):
+      # `$in` lists of any length have the same shape, `$or` branches are kept
+      shapes = []
+      for item in value:
+         shape = query_shape(item)
+         if shape not in shapes:
+            shapes.append(shape)
+      return shapes
+   return type(value).__name__
+
+
+def command_filter(command_name: str, command: Dict[str, Any]) -> Any:
+   """The filter (or pipeline) a command selects documents with, if any."""
+   if command_name in ("find", "count", "distinct"):
+      return command.get("filter", command.get("query"))
+   if command_name == "findAndModify":
+      return command.get("query")
+   if command_name == "aggregate":
+      return command.get("pipeline")
+   if command_name in ("update", "delete"):
+      statements = command.get("updates") or command.get("deletes") or []
+      return [statement.get("q") for statement in statements]
+   return None
+
+
+class QueryProfile:
+   """Mongo commands issued within one request (or one `profile_queries()` block)."""
+
+   def __init__(self):
+      self.commands: List[Tuple[str, str, str]] = []
+      self._lock = Lock()
+
+   def record(self, collection: str, command_name: str, shape: str):
+      with self._lock:
+         self.commands.append((collection, command_name, shape))
+
+   def merge(self, other: "QueryProfile"):
+      with self._lock:
+         self.commands.extend(other.commands)
+
+   @property
+   def total(self) -> int:
+      return len(self.commands)
+
+   def by_shape(self) -> Counter:
+      with self._lock:
+         return Counter(self.commands)
+
+   def repeated(self, threshold: int) -> List[Tuple[Tuple[str, str, str], int]]:
+      """Query shapes issued at least `threshold` times, most repeated first."""
+      return [(key, count) for key, count in self.by_shape().most_common() if count >= threshold]
+
+
+class QueryProfilerListener(monitoring.CommandListener):
+   """
+      Records commands into the active `QueryProfile` and logs the ones slower than
+      `slow_query_ms` (0 disables the slow-query log).
+   """
+
+   # Commands issued by the driver itself, not by the application
+   IGNORED_COMMANDS = {"hello", "isMaster", "ismaster", "ping", "endSessions", "getMore", "killCursors"}
+
+   def __init__(self, slow_query_ms: float = 0):
+      self.slow_query_ms = slow_query_ms
+      self._pending: Dict[Tuple[int, int], Tuple[str, Any]] = {}
+      self._lock = Lock()
+
+   def started(self, event: monitoring.CommandStartedEvent):
+      if event.command_name in self.IGNORED_COMMANDS:
+         return
+
+      collection = event.command.get(event.command_name)
+      collection = collection if isinstance(collection, str) else ""
+      query = command_filter(event.command_name, event.command)
+
+      profile = _current_profile.get()
+      if profile is not None:
+         profile.record(collection, event.command_name, repr(query_shape(query)))
+
+      if self.slow_query_ms:
+         with self._lock:
+            self._pending[(event.request_id, event.operation_id)] = (collection, query)
+
+   def _finished(self, event, outcome: str):
+      if not self.slow_query_ms:
+         return
+      with self._lock:
+         started = self._pending.pop((event.request_id, event.operation_id), None)
+      if started is None:
+         return
+
+      duration_ms = event.duration_micros / 1000
+      if duration_ms >= self.slow_query_ms:
+         collection, query = started
+         logging.warning(
+            f"Slow Mongo {event.command_name} on '{collection}' ({outcome}) took {duration_ms:.1f} ms, filter: {query}"
+         )
+
+   def succeeded(self, event: monitoring.CommandSucceededEvent):
+      self._finished(event, "ok")
+
+   def failed(self, event: monitoring.CommandFailedEvent):
+      self._finished(event, "failed")
+
+
+@contextmanager
+def profile_queries() -> Iterator[QueryProfile]:
+   """Record the Mongo commands issued inside the block (requires `QueryProfilerListener`)."""
+   profile = QueryProfile()
+   token = _current_profile.set(profile)
+   try:
+      yield profile
+   finally:
+      _current_profile.reset(token)
+
+
+@contextmanager
+def max_queries(limit: int) -> Iterator[QueryProfile]:
+   """
+      Fail if the block issues more than `limit` Mongo commands. Meant to back a test
+      fixture asserting the query budget of an endpoint, with the app called in the same
+      context (e.g. `httpx.AsyncClient(app=app)`):
+
+         with max_queries(3):
+            await client.get("/student/bookings", headers=headers)
+   """
+   with profile_queries() as profile:
+      yield profile
+   if profile.total > limit:
+      details = ", ".join(f"{count}x {command} {collection} {shape}" for (collection, command, shape), count in profile.by_shape().most_common())
+      raise AssertionError(f"Expected at most {limit} Mongo queries, got {profile.total}: {details}")
@@ -1,16 +1,86 @@
-
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 from bson import ObjectId
+import json
+
+try:
+   import orjson
+except ImportError:  # optional, falls back to the standard library
+   orjson = None
+
+
+def _encode_model(obj: BaseModel):
+   return obj.model_dump(mode="json", by_alias=True)
+
+
+_LEAF_ENCODERS = {
+   ObjectId: str,
+   datetime: datetime.isoformat,
+   date: date.isoformat,
+   time: time.isoformat,
+}
+
 
 def custom_jsonable_encoder(obj):
+   """
+      Convert `obj` into JSON-compatible types in a single pass.
+      Handles ObjectId, datetime/date/time, Enum and pydantic models natively and only
+      falls back to FastAPI's `jsonable_encoder` for anything else.
+   """
+   if obj is None or isinstance(obj, (str, int, float, bool)):
+      return obj
+   if isinstance(obj, dict):
+      return {
+         key if isinstance(key, str) else str(custom_jsonable_encoder(key)): custom_jsonable_encoder(value)
+         for key, value in obj.items()
+      }
+   if isinstance(obj, (list, tuple, set, frozenset)):
+      return [custom_jsonable_encoder(item) for item in obj]
+
+   encoder = _LEAF_ENCODERS.get(type(obj))
+   if encoder is not None:
+      return encoder(obj)
+   if isinstance(obj, Enum):
+      return custom_jsonable_encoder(obj.value)
+   if isinstance(obj, BaseModel):
+      return _encode_model(obj)
+   return jsonable_encoder(obj)
+
+
+def _default(obj: Any):
+   """`default` hook of the JSON serializer for the types it does not know natively."""
    if isinstance(obj, ObjectId):
       return str(obj)
-   if isinstance(obj, list):
-      return [custom_jsonable_encoder(item) for item in obj]
-   if isinstance(obj, tuple):
-      return (custom_jsonable_encoder(item) for item in obj)
-   if isinstance(obj, dict):
-      return {key: custom_jsonable_encoder(value) for key, value in obj.items()}
-   if isinstance(obj, set):
-      return {custom_jsonable_encoder(value) for value in obj}
-   return jsonable_encoder(obj)
\ No newline at end of file
+   if isinstance(obj, BaseModel):
+      return _encode_model(obj)
+   if isinstance(obj, (set, frozenset, tuple)):
+      return list(obj)
+   if isinstance(obj, (datetime, date, time)):
+      return obj.isoformat()
+   if isinstance(obj, Enum):
+      return obj.value
+   return jsonable_encoder(obj)
+
+
+def json_dumps(content: Any) -> bytes:
+   """Serialize straight to bytes, using orjson when it is installed."""
+   if orjson is not None:
+      return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+   return json.dumps(
+      content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+   ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+   """
+      JSON response serialized in one pass from the raw endpoint data (Mongo documents,
+      pydantic models). Return it directly from the endpoint so FastAPI skips its own
+      `jsonable_encoder` pass.
+   """
+
+   def render(self, content: Any) -> bytes:
+      return json_dumps(content)
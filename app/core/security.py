@@ -1,12 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from hashlib import blake2b
+from typing import Dict, Any, Optional
 
+import asyncio
 import jwt
+import os
 import re
+import time
 from fastapi import HTTPException, status
 from fastapi.security import HTTPBearer
 from pydantic import BaseModel
 from passlib.context import CryptContext
+from app.core.cache import TTLCache
 
 class JWTConfig(BaseModel):
    """Configuration for JWT settings."""
@@ -19,9 +25,11 @@ class JWTConfig(BaseModel):
 class JWTUtils:
    """Utility class for JWT operations."""
 
-   def __init__(self, config: JWTConfig):
+   def __init__(self, config: JWTConfig, cache: Optional[TTLCache] = None):
       self.config = config
       self.security = HTTPBearer()
+      # Verified payloads keyed by token digest, each entry lives until the token's `exp`
+      self.cache = cache
 
    @property
    def access_token_expire_minutes(self):
@@ -84,24 +92,42 @@ class JWTUtils:
       Raises:
          HTTPException: If token is invalid or expired
       """
+      key = None
+      if self.cache is not None:
+         key = blake2b(token.encode(), digest_size=16).digest()
+         payload = self.cache.get(key)
+         if payload is not None:
+            # Same clock and comparison as PyJWT, so expiry stays exact
+            if payload["exp"] <= time.time():
+               self.cache.invalidate(key)
+               raise self._expired_exception()
+            return dict(payload)
+
       try:
          payload = jwt.decode(
             token, self.config.secret_key, algorithms=[self.config.algorithm]
          )
-         return payload
       except jwt.ExpiredSignatureError:
-         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail={
-               "msg": "Token has expired",
-               "code": "expired_token",
-            },
-         )
+         raise self._expired_exception()
       except jwt.InvalidTokenError:
          raise HTTPException(
                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
          )
 
+      if key is not None and isinstance(payload.get("exp"), (int, float)):
+         self.cache.set(key, dict(payload), ttl_seconds=payload["exp"] - time.time())
+      return payload
+
+   @staticmethod
+   def _expired_exception() -> HTTPException:
+      return HTTPException(
+         status_code=status.HTTP_401_UNAUTHORIZED,
+         detail={
+            "msg": "Token has expired",
+            "code": "expired_token",
+         },
+      )
+
    def verify_refresh_token(self, token: str):
       """
       Verify refresh token.
@@ -124,8 +150,14 @@ class JWTUtils:
 class AuthorizationUtils:
    """Authorization class for Password related operations."""
 
-   def __init__(self):
+   def __init__(self, max_workers: Optional[int] = None, max_queue: int = 64):
       self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+      # bcrypt releases the GIL, so a thread pool lets hashing scale with cores
+      # without blocking the event loop.
+      self.max_workers = max_workers or os.cpu_count() or 1
+      self.max_queue = max_queue
+      self._executor: Optional[ThreadPoolExecutor] = None
+      self._pending = 0
 
    def verify_password(self, plain_password, hashed_password):
       return self.pwd_context.verify(plain_password, hashed_password)
@@ -133,6 +165,48 @@ class AuthorizationUtils:
    def get_password_hash(self, password):
       return self.pwd_context.hash(password)
 
+   async def _run_in_pool(self, func, *args):
+      """
+      Run a blocking hashing call on the worker pool.
+
+      Raises:
+         HTTPException: 503 if all workers are busy and the wait queue is full
+      """
+      if self._pending >= self.max_workers + self.max_queue:
+         raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+         )
+
+      if self._executor is None:
+         self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="password-hash"
+         )
+
+      self._pending += 1
+      try:
+         loop = asyncio.get_running_loop()
+         return await loop.run_in_executor(self._executor, func, *args)
+      finally:
+         self._pending -= 1
+
+   @property
+   def pending(self) -> int:
+      """Hashing calls currently running or waiting for a worker."""
+      return self._pending
+
+   async def verify_password_async(self, plain_password, hashed_password):
+      return await self._run_in_pool(self.verify_password, plain_password, hashed_password)
+
+   async def get_password_hash_async(self, password):
+      return await self._run_in_pool(self.get_password_hash, password)
+
+   def shutdown(self):
+      if self._executor is not None:
+         self._executor.shutdown(wait=False)
+         self._executor = None
+
    def validate_password_strength(self, password):
       """
          Validates that the password meets required complexity:
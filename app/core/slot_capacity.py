@@ -0,0 +1,219 @@
+"""
+Per-slot capacity documents used to reserve seats atomically.
+
+Each (teacher, slot start) pair owns one document in `slot_capacities` holding the
+remaining number of seats. A seat is taken with a conditional `$inc` so concurrent
+bookings can never push a slot past its maximum.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import asyncio
+
+SLOT_CAPACITIES = "slot_capacities"
+
+
+async def reserve_seat(db: AsyncIOMotorDatabase, teacher_id: str, slot_start: datetime) -> Optional[Dict[str, Any]]:
+   """
+   Atomically take one seat in a slot.
+
+   Returns:
+      The updated capacity document, or None if the slot is unknown or already full
+   """
+   return await db[SLOT_CAPACITIES].find_one_and_update(
+      {"teacher_id": teacher_id, "start_time": slot_start, "remaining": {"$gt": 0}},
+      {"$inc": {"remaining": -1}},
+      return_document=ReturnDocument.AFTER,
+   )
+
+
+async def release_seat(db: AsyncIOMotorDatabase, teacher_id: str, slot_start: datetime) -> Optional[Dict[str, Any]]:
+   """
+   Give back a seat taken by `reserve_seat`, never exceeding the slot maximum.
+
+   Returns:
+      The updated capacity document, or None if there was nothing to release
+   """
+   return await db[SLOT_CAPACITIES].find_one_and_update(
+      {
+         "teacher_id": teacher_id,
+         "start_time": slot_start,
+         "$expr": {"$lt": ["$remaining", "$max_students"]},
+      },
+      {"$inc": {"remaining": 1}},
+      return_document=ReturnDocument.AFTER,
+   )
+
+
+async def reserve_seats(
+   db: AsyncIOMotorDatabase, slots: List[Tuple[str, datetime]]
+) -> Dict[Tuple[str, datetime], Dict[str, Any]]:
+   """
+   Take one seat in each of several distinct slots.
+
+   Runs the conditional `reserve_seat` of every slot concurrently. If any of them fails,
+   the seats already taken are given back before the error is raised, so nothing stays
+   decremented without a booking.
+
+   Returns:
+      The updated capacity documents of the reserved slots, keyed by (teacher_id, start_time)
+   """
+   if not slots:
+      return {}
+
+   outcomes = await asyncio.gather(
+      *(reserve_seat(db, teacher_id, slot_start) for teacher_id, slot_start in slots),
+      return_exceptions=True,
+   )
+   reserved = {
+      slot: outcome for slot, outcome in zip(slots, outcomes)
+      if outcome is not None and not isinstance(outcome, BaseException)
+   }
+   errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+   if errors:
+      await release_seats(db, list(reserved))
+      raise errors[0]
+   return reserved
+
+
+async def release_seats(db: AsyncIOMotorDatabase, slots: List[Tuple[str, datetime]]):
+   """Bulk variant of `release_seat`, one seat per listed slot."""
+   if not slots:
+      return
+
+   await db[SLOT_CAPACITIES].bulk_write([
+      UpdateOne(
+         {
+            "teacher_id": teacher_id,
+            "start_time": slot_start,
+            "$expr": {"$lt": ["$remaining", "$max_students"]},
+         },
+         {"$inc": {"remaining": 1}},
+      )
+      for teacher_id, slot_start in slots
+   ], ordered=False)
+
+
+async def ensure_slot_capacity(
+   db: AsyncIOMotorDatabase,
+   availability: Dict[str, Any],
+   slot_start: datetime,
+   slot_end: datetime,
+):
+   """
+   Create the capacity document of a slot if it does not exist yet.
+
+   The remaining seats are derived from the bookings already stored for the slot,
+   so slots booked before capacity tracking existed stay consistent.
+   """
+   teacher_id = str(availability["teacher_id"])
+   max_students = availability.get("max_no_of_students_each_slot", 1)
+   existing = await db.class_bookings.count_documents({"teacher_id": teacher_id, "start_time": slot_start})
+
+   try:
+      await db[SLOT_CAPACITIES].update_one(
+         {"teacher_id": teacher_id, "start_time": slot_start},
+         {"$setOnInsert": {
+            "end_time": slot_end,
+            "booking_date": availability["available_date"],
+            "subject": availability["subject"],
+            "max_students": max_students,
+            "remaining": max(max_students - existing, 0),
+         }},
+         upsert=True,
+      )
+   except DuplicateKeyError:
+      # A concurrent request created it first
+      pass
+
+
+async def ensure_slot_capacities(db: AsyncIOMotorDatabase, availabilities: List[Dict[str, Any]]):
+   """
+   Bulk variant of `ensure_slot_capacity` covering every 1-hour slot of the given availabilities.
+
+   Existing bookings are counted with one aggregation and the missing documents are
+   upserted with a single unordered `bulk_write`.
+   """
+   if not availabilities:
+      return
+
+   slot_starts = [slot_start for availability in availabilities for slot_start, _ in iter_slots(availability)]
+   booked = await db.class_bookings.aggregate([
+      {"$match": {
+         "teacher_id": {"$in": list({str(a["teacher_id"]) for a in availabilities})},
+         "start_time": {"$in": list(set(slot_starts))},
+      }},
+      {"$group": {"_id": {"teacher_id": "$teacher_id", "start_time": "$start_time"}, "count": {"$sum": 1}}},
+   ]).to_list(length=None)
+   booked_counts = {(b["_id"]["teacher_id"], b["_id"]["start_time"]): b["count"] for b in booked}
+
+   operations = []
+   for availability in availabilities:
+      teacher_id = str(availability["teacher_id"])
+      max_students = availability.get("max_no_of_students_each_slot", 1)
+      for slot_start, slot_end in iter_slots(availability):
+         existing = booked_counts.get((teacher_id, slot_start), 0)
+         operations.append(UpdateOne(
+            {"teacher_id": teacher_id, "start_time": slot_start},
+            {"$setOnInsert": {
+               "end_time": slot_end,
+               "booking_date": availability["available_date"],
+               "subject": availability["subject"],
+               "max_students": max_students,
+               "remaining": max(max_students - existing, 0),
+            }},
+            upsert=True,
+         ))
+
+   try:
+      await db[SLOT_CAPACITIES].bulk_write(operations, ordered=False)
+   except BulkWriteError as e:
+      # Duplicate keys only mean a concurrent request created the document first
+      if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+         raise
+
+
+async def reconcile_slot_capacity(
+   db: AsyncIOMotorDatabase, teacher_id: str, slot_start: datetime, attempts: int = 3
+) -> Optional[Dict[str, Any]]:
+   """
+   Recompute the remaining seats of a slot from its stored bookings, after a seat could
+   not be given back and the counter may have drifted.
+
+   The new value is written with a compare-and-set on the `remaining` that was read, so a
+   concurrent reservation makes it retry instead of being overwritten. A seat reserved
+   by another writer whose booking is not inserted yet still counts as free.
+
+   Returns:
+      The reconciled capacity document, or None if the slot is unknown or kept changing
+   """
+   for _ in range(attempts):
+      capacity = await db[SLOT_CAPACITIES].find_one({"teacher_id": teacher_id, "start_time": slot_start})
+      if capacity is None:
+         return None
+
+      booked = await db.class_bookings.count_documents({"teacher_id": teacher_id, "start_time": slot_start})
+      remaining = max(capacity["max_students"] - booked, 0)
+      if remaining == capacity["remaining"]:
+         return capacity
+
+      reconciled = await db[SLOT_CAPACITIES].find_one_and_update(
+         {"_id": capacity["_id"], "remaining": capacity["remaining"]},
+         {"$set": {"remaining": remaining}},
+         return_document=ReturnDocument.AFTER,
+      )
+      if reconciled is not None:
+         return reconciled
+   return None
+
+
+def iter_slots(availability: Dict[str, Any]):
+   """Yield the (start, end) pairs of the 1-hour slots inside an availability window."""
+   slot_start = availability["start_time"]
+   while slot_start < availability["end_time"]:
+      slot_end = slot_start + timedelta(hours=1)
+      yield slot_start, slot_end
+      slot_start = slot_end
@@ -0,0 +1,88 @@
+"""
+Fan-out of slot capacity changes to the `GET /slots/stream` subscribers.
+
+Built for thousands of mostly idle connections per worker: events are encoded as SSE
+messages once, when published, and kept in a bounded backlog shared by every
+subscriber. A subscriber only holds the sequence number of the last event it sent and
+waits on a single shared `asyncio.Event`, so there is no per-subscriber queue to fill
+and a slow client can never block a publisher. A subscriber that falls further behind
+than the backlog, or connected before a `reset`, resyncs from a fresh snapshot.
+"""
+
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
+from uuid import uuid4
+from app.core.response_validation import json_dumps
+import asyncio
+
+
+def sse_message(event: str, data: Any, event_id: Optional[str] = None) -> bytes:
+   """Encode one Server-Sent Events message."""
+   head = f"id: {event_id}\n" if event_id is not None else ""
+   return f"{head}event: {event}\n".encode() + b"data: " + json_dumps(data) + b"\n\n"
+
+
+class SlotEvents:
+   def __init__(self, backlog: int = 1024):
+      # Identifies this process in event ids, so `Last-Event-ID` from another worker is ignored
+      self.epoch = uuid4().hex[:8]
+      self.seq = 0
+      self.subscribers = 0
+      self._backlog: Deque[Tuple[int, bytes]] = deque(maxlen=backlog)
+      self._changed: Optional[asyncio.Event] = None
+
+   def event_id(self, seq: int) -> str:
+      return f"{self.epoch}:{seq}"
+
+   def parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+      """Sequence number of a `Last-Event-ID` issued by this process, else None."""
+      epoch, _, seq = (event_id or "").partition(":")
+      if epoch != self.epoch or not seq.isdigit():
+         return None
+      return int(seq)
+
+   def publish(self, event: str, data: Any):
+      self.seq += 1
+      self._backlog.append((self.seq, sse_message(event, data, self.event_id(self.seq))))
+      self._wake()
+
+   def reset(self):
+      """Drop the backlog (e.g. new day), every subscriber resyncs from a snapshot."""
+      self.seq += 1
+      self._backlog.clear()
+      self._wake()
+
+   def _wake(self):
+      if self._changed is not None:
+         self._changed.set()
+         self._changed = None
+
+   def since(self, seq: int) -> Optional[List[bytes]]:
+      """Messages published after `seq`, or None if some of them already left the backlog."""
+      if seq >= self.seq:
+         return []
+      if not self._backlog or self._backlog[0][0] > seq + 1:
+         return None
+
+      messages = []
+      for event_seq, message in reversed(self._backlog):
+         if event_seq <= seq:
+            break
+         messages.append(message)
+      messages.reverse()
+      return messages
+
+   async def wait(self, seq: int, timeout: float) -> Optional[List[bytes]]:
+      """Like `since`, but waits up to `timeout` seconds for a publication when up to date."""
+      messages = self.since(seq)
+      if messages is None or messages:
+         return messages
+
+      if self._changed is None:
+         self._changed = asyncio.Event()
+      changed = self._changed
+      try:
+         await asyncio.wait_for(changed.wait(), timeout)
+      except asyncio.TimeoutError:
+         return []
+      return self.since(seq)
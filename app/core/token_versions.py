@@ -0,0 +1,71 @@
+"""
+Per-user token versions, used to revoke access tokens without a session store.
+
+Every user document carries a `token_version` (missing means 0) that is copied into the
+`ver` claim of the tokens issued to that user. Bumping it (password reset, deactivation)
+invalidates every token issued before. Role-gated endpoints check the claim against this
+cached map instead of loading the user, so they authorize without any database read once
+the version of the caller is cached. Revocations done by another process are seen at most
+`ttl_seconds` later.
+"""
+
+from typing import Any, Dict, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from app.core.cache import TTLCache
+
+# Version of users that are inactive or missing, never matches a token
+REVOKED = -1
+
+
+def user_token_version(user: Dict[str, Any]) -> int:
+   """Current token version of a user document."""
+   if not user.get("is_active", True):
+      return REVOKED
+   return user.get("token_version", 0)
+
+
+class TokenVersions:
+   """Cached `user_id -> token_version` map."""
+
+   def __init__(self, maxsize: int = 10000, ttl_seconds: float = 30):
+      self._cache = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+   def remember(self, user_id: str, version: int):
+      self._cache.set(str(user_id), version)
+
+   async def get(self, db: AsyncIOMotorDatabase, user_id: str) -> int:
+      """Token version of `user_id`, loaded on a cache miss."""
+      version = self._cache.get(user_id)
+      if version is not None:
+         return version
+
+      user = None
+      if ObjectId.is_valid(user_id):
+         user = await db.users.find_one(
+            {"_id": ObjectId(user_id)}, {"token_version": 1, "is_active": 1}
+         )
+      version = user_token_version(user) if user else REVOKED
+      self.remember(user_id, version)
+      return version
+
+   async def is_current(self, db: AsyncIOMotorDatabase, user_id: str, claimed: Optional[int]) -> bool:
+      """Whether a token carrying the `ver` claim `claimed` is still valid."""
+      version = await self.get(db, user_id)
+      return version != REVOKED and version == (claimed or 0)
+
+   async def bump(self, db: AsyncIOMotorDatabase, user_id: str) -> int:
+      """Revoke every token issued to `user_id` so far and return the new version."""
+      user = await db.users.find_one_and_update(
+         {"_id": ObjectId(user_id)},
+         {"$inc": {"token_version": 1}},
+         projection={"token_version": 1, "is_active": 1},
+         return_document=ReturnDocument.AFTER
+      )
+      version = user_token_version(user) if user else REVOKED
+      self.remember(user_id, version)
+      return version
+
+   def stats(self) -> Dict[str, Any]:
+      return self._cache.stats()
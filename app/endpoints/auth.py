@@ -4,9 +4,9 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel, EmailStr, Field
 from app.models.auth import LoginRequest, Token, RefreshToken
 from app.models.user import UserCreate, User
-from app.core.config import authorization_utils, jwt_utils
+from app.core.config import authorization_utils, jwt_utils, token_versions
 from app.middlewares.db import get_database
-from app.middlewares.auth import check_if_user_is_registered
+from app.middlewares.auth import check_if_user_is_registered, credentials_exception, revoke_user_tokens
 from bson import ObjectId
 import logging
 
@@ -55,17 +55,18 @@ async def register_user(
       authorization_utils.validate_password_strength(user.password)
 
       # Hash password and prepare user data
-      hashed_pwd = authorization_utils.get_password_hash(user.password)
+      hashed_pwd = await authorization_utils.get_password_hash_async(user.password)
       user_data = user.model_dump()
       user_data["hashed_password"] = hashed_pwd
       user_data.pop("password")
+      user_data["token_version"] = 0
       new_user = {**user_data}
 
       logging.info(f"Inserting new user into database for email: {user.email}")
       result = await db.users.insert_one(new_user)
 
       access_token = jwt_utils.create_access_token(
-         data={"email": user.email, "user_id": str(result.inserted_id), "role": user.role}
+         data={"email": user.email, "user_id": str(result.inserted_id), "role": user.role, "ver": 0}
       )
       logging.info(f"User registered successfully: {user.email} | ID: {result.inserted_id}")
 
@@ -93,11 +94,14 @@ async def login_user(
    ):
    user = await db.users.find_one({"email": data.email})
    
-   if not user or not authorization_utils.verify_password(data.password, user["hashed_password"]):
+   if not user or not await authorization_utils.verify_password_async(data.password, user["hashed_password"]):
       raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
    token = jwt_utils.create_access_token(
-      data={"email": user["email"], "user_id": str(user["_id"]), "role": user["role"]}
+      data={
+         "email": user["email"], "user_id": str(user["_id"]), "role": user["role"],
+         "ver": user.get("token_version", 0)
+      }
    )
    return {"access_token": token, "token_type": "bearer"}
 
@@ -128,13 +132,13 @@ async def reset_password(
       if req.old_password == req.new_password:
          raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="Old and New password can not be same. Choose a different password")
             
-      if not authorization_utils.verify_password(req.old_password, user.get("hashed_password", "")):
+      if not await authorization_utils.verify_password_async(req.old_password, user.get("hashed_password", "")):
          raise HTTPException(status_code=401, detail="Old password is incorrect")
 
       # Validate password strength
       authorization_utils.validate_password_strength(req.new_password)
 
-      new_hashed = authorization_utils.get_password_hash(req.new_password)
+      new_hashed = await authorization_utils.get_password_hash_async(req.new_password)
 
       result = await db.users.update_one(
          {"_id": user["_id"]},
@@ -144,6 +148,9 @@ async def reset_password(
       if result.modified_count != 1:
          raise HTTPException(status_code=500, detail="Password reset failed. Try again later.")
 
+      # Tokens issued with the old password stop working
+      await revoke_user_tokens(db, user["_id"])
+
       return {"success": True, "message": "Password reset successful."}
    
    except HTTPException as httpex:
@@ -156,20 +163,29 @@ async def reset_password(
       )
 
 @router.post("/refresh", response_model=Token)
-async def refresh_access_token(payload: RefreshToken):
+async def refresh_access_token(
+   payload: RefreshToken,
+   db: AsyncIOMotorDatabase = Depends(get_database)
+):
    try:
       decoded = jwt_utils.verify_refresh_token(payload.refresh_token)
+      if not await token_versions.is_current(db, decoded["user_id"], decoded.get("ver")):
+         raise credentials_exception
 
       new_access_token = jwt_utils.create_refresh_token(
          data={
             "email": decoded["email"],
             "user_id": decoded["user_id"],
-            "role": decoded["role"]
+            "role": decoded["role"],
+            "ver": decoded.get("ver", 0)
          }
       )
 
       return {"access_token": new_access_token, "token_type": "bearer"}
 
+   except HTTPException as httpex:
+      raise httpex
+
    except Exception as e:
       raise HTTPException(status_code=500, detail=f"Could not refresh token: {str(e)}")
 
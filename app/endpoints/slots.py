@@ -1,80 +1,122 @@
-from typing import Dict
-from fastapi import APIRouter, HTTPException, status
+from typing import Dict, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from fastapi.params import Depends
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from datetime import date, timedelta, time, datetime
 from app.middlewares.db import get_database
-from app.core.response_validation import custom_jsonable_encoder
-from bson import ObjectId
-from collections import defaultdict
+from app.middlewares.admission import slots_admission
+from app.core.config import availability_snapshot, settings
+from app.core.etag import etag_headers, make_etag, not_modified
+from app.core.pagination import decode_cursor, encode_cursor, next_cursor_headers
+from app.core.response_validation import FastJSONResponse
 import logging
 
 router = APIRouter()
 
 
-@router.get("/available", response_model=Dict)
+@router.get("/available", response_model=Dict, dependencies=slots_admission)
 async def get_available_slots(
+    request: Request,
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="`next_cursor` of the previous page"),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
    """
       Returns the list of teachers available tomorrow, 
-      with their profile info and grouped availability slots.
+      with their profile info, grouped availability slots and remaining seats per 1-hour slot.
+      Paginated by teacher: pass the returned `next_cursor` to get the next page.
    """
    try:
-      tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
-      logging.info(f"Tomorrow's date: {tomorrow}")
-      availabilities = await db.teacher_availabilities.find({"available_date": tomorrow}).to_list(100)
-      logging.info(f"Teacher availabilities: {availabilities}")
+      after = decode_cursor(cursor, 1)
+      if after and not isinstance(after[0], str):
+         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
 
-      if not availabilities:
-         return {
-            "success": False,
-            "message": "No teacher availabilities found for tomorrow.",
-            "teachers_available": []
-         }
-
-      teacher_map = defaultdict(lambda: {
-         "teacher_id": None,
-         "first_name": "",
-         "last_name": "",
-         "email": "",
-         "phone": "",
-         "subject": "",
-         "years_of_exp": 0,
-         "slots": []
-      })
+      # Served from the in-process snapshot, rebuilt from MongoDB only when stale
+      etag = make_etag(await availability_snapshot.get_etag(db), limit, cursor or "")
+      cached = not_modified(request, etag)
+      if cached:
+         return cached
 
-      for avail in availabilities:
-         teacher = await db.users.find_one({"_id": ObjectId(avail["teacher_id"]), "role": "teacher"})
-         if not teacher:
-            continue
+      teachers_available, last_teacher_id = await availability_snapshot.page(
+         db, after[0] if after else None, limit
+      )
+      next_cursor = encode_cursor([last_teacher_id]) if last_teacher_id else None
+      headers = {**etag_headers(etag), **next_cursor_headers(next_cursor)}
 
-         tid = str(teacher["_id"])
-         teacher_entry = teacher_map[tid]
-         teacher_entry.update({
-            "teacher_id": tid,
-            "first_name": teacher["first_name"],
-            "last_name": teacher["last_name"],
-            "email": teacher["email"],
-            "phone": teacher["phone"],
-            "subject": teacher.get("subject"),
-            "years_of_exp": teacher.get("years_of_exp"),
-         })
-         teacher_entry["slots"].append({
-            "available_date": avail["available_date"],
-            "start_time": avail["start_time"],
-            "end_time": avail["end_time"],
-            "max_no_of_students_each_slot": avail.get("max_no_of_students_each_slot", 1)
-         })
+      if not teachers_available:
+         return FastJSONResponse({
+            "success": False,
+            "message": "No teacher availabilities found for tomorrow.",
+            "teachers_available": [],
+            "next_cursor": None
+         }, headers=headers)
 
-      return {
+      return FastJSONResponse({
          "success": True,
          "message": "Grouped teacher availability fetched successfully",
-         "teachers_available": custom_jsonable_encoder(list(teacher_map.values()))
-      }
+         "teachers_available": teachers_available,
+         "next_cursor": next_cursor
+      }, headers=headers)
+
+   except HTTPException:
+      raise
 
    except Exception as e:
       raise HTTPException(
          status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
          detail=f"Error occurred in getting available slots: {str(e)}"
       )
+
+
+@router.get("/stream")
+async def stream_slots(
+   request: Request,
+   db: AsyncIOMotorDatabase = Depends(get_database)
+):
+   """
+      Server-Sent Events stream of the remaining seats of tomorrow's slots.
+      Starts with a `snapshot` event holding every slot, then sends one `slot` event
+      (`teacher_id`, `slot`, `remaining`) per change. A reconnecting client sending
+      `Last-Event-ID` only gets the events it missed, when this worker still has them;
+      otherwise, and when the day rolls over, it gets a new `snapshot`.
+   """
+   events = availability_snapshot.events
+   if events.subscribers >= settings.SLOTS_STREAM_MAX_SUBSCRIBERS:
+      raise HTTPException(
+         status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+         detail="Too many live subscribers, poll /slots/available instead",
+         headers={"Retry-After": str(int(settings.SLOTS_STREAM_HEARTBEAT_SECONDS))}
+      )
+
+   last_seq = events.parse_event_id(request.headers.get("last-event-id"))
+
+   async def stream():
+      events.subscribers += 1
+      try:
+         yield b"retry: 3000\n\n"
+         seq = last_seq
+         messages = events.since(seq) if seq is not None else None
+         while True:
+            if messages is None:
+               seq, snapshot = await availability_snapshot.stream_snapshot(db)
+               yield snapshot
+            elif messages:
+               # `since` and `wait` return everything up to the current sequence number
+               seq = events.seq
+               yield b"".join(messages)
+            else:
+               yield b": keepalive\n\n"
+               try:
+                  # Rebuilds the snapshot when stale, publishing the changes of other workers
+                  await availability_snapshot.get(db)
+               except Exception:
+                  logging.exception("Could not refresh the availability snapshot for /slots/stream")
+            messages = await events.wait(seq, settings.SLOTS_STREAM_HEARTBEAT_SECONDS)
+      finally:
+         events.subscribers -= 1
+
+   return StreamingResponse(
+      stream(),
+      media_type="text/event-stream",
+      headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+   )
@@ -1,13 +1,30 @@
 from app.models.bookings import Booking
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query, Path
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel, Field
 from datetime import timedelta, time, datetime
+from typing import List, Literal, Optional
 from app.models.bookings import Booking
 from app.models.user import User, UserUpdate
+from app.models.auth import Principal
 from app.middlewares.db import get_database
-from app.middlewares.auth import get_current_student
+from app.middlewares.auth import invalidate_cached_user, get_current_student, get_current_student_claims
+from app.middlewares.admission import booking_admission
+from app.core.config import availability_snapshot, booking_engine, settings
+from app.core.etag import (
+   AUTO_ASSIGN_VERSION, bump_profile_dependents, student_bookings_key, teacher_bookings_key,
+   bump_versions, compute_etag, etag_headers, not_modified
+)
+from app.core.intervals import AvailabilityIndex
+from app.core.pagination import decode_cursor, encode_cursor, keyset_filter, next_cursor_headers
+from app.core.response_validation import FastJSONResponse
+from app.core.slot_capacity import (
+   SLOT_CAPACITIES, reserve_seat, release_seat, reserve_seats, release_seats,
+   ensure_slot_capacity
+)
 from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import asyncio
 import logging
 
 router = APIRouter()
@@ -36,27 +53,68 @@ async def update_student_profile(
          raise HTTPException(status_code=403, detail="Only students can update school/standard info.")
 
    await db.users.update_one({"_id": ObjectId(student.id)}, {"$set": update_fields})
+   invalidate_cached_user(student.id)
+   await bump_profile_dependents(db, str(student.id), "student")
    updated = await db.users.find_one({"_id": ObjectId(student.id)})
    updated["_id"] = str(updated["_id"])
    return User(**updated)
 
 
+# Matches the student_date_start index, so every page is an index range scan
+BOOKINGS_SORT = ["booking_date", "start_time", "_id"]
+
+
 @router.get("/bookings")
 async def get_student_bookings(
+   request: Request,
+   limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+   cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
    db: AsyncIOMotorDatabase = Depends(get_database),
-   student: User = Depends(get_current_student)
+   student: Principal = Depends(get_current_student_claims)
 ):
+   """
+      Returns the upcoming bookings of the logged-in student, oldest first.
+      Paginated: the `X-Next-Cursor` response header holds the cursor of the next page.
+   """
    try:
       today = datetime.now()
-      bookings_cursor = db.class_bookings.find({
-         "student_id": str(student.id),
-         "booking_date": {"$gte": today}
-      })
+      after = decode_cursor(cursor, len(BOOKINGS_SORT))
 
-      bookings = []
-      async for booking in bookings_cursor:
-         teacher = await db.users.find_one({"_id": ObjectId(booking["teacher_id"])})
-         bookings.append({
+      # Bookings only drop out of this list when the day changes
+      etag = await compute_etag(
+         db,
+         student_bookings_key(str(student.id)), AUTO_ASSIGN_VERSION,
+         extra=f"{today.date().isoformat()}|{limit}|{cursor or ''}"
+      )
+      cached = not_modified(request, etag)
+      if cached:
+         return cached
+
+      query = {"student_id": str(student.id), "booking_date": {"$gte": today}}
+      if after:
+         query = {"$and": [query, keyset_filter(BOOKINGS_SORT, after)]}
+      bookings = await db.class_bookings.find(query).sort(
+         [(field, 1) for field in BOOKINGS_SORT]
+      ).limit(limit + 1).to_list(length=None)
+
+      next_cursor = None
+      if len(bookings) > limit:
+         bookings = bookings[:limit]
+         next_cursor = encode_cursor([bookings[-1][field] for field in BOOKINGS_SORT])
+      headers = {**etag_headers(etag), **next_cursor_headers(next_cursor)}
+
+      if not bookings:
+         return FastJSONResponse([], headers=headers)
+
+      # Resolve all teachers of these bookings in one query
+      teacher_ids = list({ObjectId(b["teacher_id"]) for b in bookings if ObjectId.is_valid(b["teacher_id"])})
+      teachers_cursor = db.users.find({"_id": {"$in": teacher_ids}})
+      teacher_map = {str(t["_id"]): t async for t in teachers_cursor}
+
+      result = []
+      for booking in bookings:
+         teacher = teacher_map.get(booking["teacher_id"], {})
+         result.append({
             "booking_id": str(booking["_id"]),
             "booking_date": str(booking["booking_date"]),
             "start_time": booking["start_time"].strftime("%H:%M"),
@@ -70,7 +128,10 @@ async def get_student_bookings(
             }
          })
 
-      return bookings
+      return FastJSONResponse(result, headers=headers)
+
+   except HTTPException:
+      raise
 
    except Exception as e:
       raise HTTPException(status_code=500, detail=f"Error fetching bookings: {str(e)}")
@@ -79,18 +140,18 @@ class BookSlotRequest(BaseModel):
    teacher_id: str = Field(..., example="60f7f72b9e1d8e6b2c5d6e3d")
    slot_start: str = Field(..., example="10:00") # Format: 'HH:MM'
 
-@router.post("/book", response_model=BookingResponse)
+@router.post("/book", response_model=BookingResponse, dependencies=booking_admission)
 async def book_slot(
    request: BookSlotRequest,
    db: AsyncIOMotorDatabase = Depends(get_database),
-   student: User = Depends(get_current_student)
+   student: Principal = Depends(get_current_student_claims)
 ):
    """
       Book a class slot for a student.
       Validations:
       - Slot must be available within teacher's availability.
-      - Max number of students per slot not exceeded.
-      - Student must not have already booked this same slot.
+      - Max number of students per slot not exceeded (atomic seat reservation).
+      - Student must not have already booked this same slot (unique index).
    """
    try:
       logging.info(f"Booking request received: {request.dict()} by student: {student.id}")
@@ -111,68 +172,71 @@ async def book_slot(
 
       logging.info(f"Attempting to book for teacher {teacher_id} on {booking_date_dt} from {slot_start_dt} to {slot_end_dt}")
 
-      availabilities = await db.teacher_availabilities.find({
-         "teacher_id": teacher_id,
-         "available_date": booking_date_dt
-      }).to_list(length=10)
+      if settings.BOOKING_ENGINE_ENABLED:
+         # Serialized with the other requests of this slot and committed in batches
+         booking_doc, booking_id = await booking_engine.book(db, teacher_id, slot_start_dt, str(student.id))
+         logging.info(f"Booking successful: {booking_id}")
+         return {
+            "success": True,
+            "message": "Slot Booked successfully",
+            **Booking(**booking_doc).model_dump(),
+            "booking_id": booking_id
+         }
 
-      if not availabilities:
-         logging.warning(f"No availability found for teacher {teacher_id} on {booking_date_dt}")
-         raise HTTPException(status_code=404, detail="No availability found for this teacher.")
+      # Fast path: the slot's capacity document already exists, one round trip takes a seat
+      seat = await reserve_seat(db, teacher_id, slot_start_dt)
 
-      matched_availability = None
-      for availability in availabilities:
-         if availability["start_time"] <= slot_start_dt < availability["end_time"]:
-            matched_availability = availability
-            break
+      if seat is None:
+         day_index = await AvailabilityIndex.load(db, teacher_id, [booking_date_dt])
 
-      if not matched_availability:
-         logging.warning(f"Slot time {slot_start_dt} not within any availability for teacher {teacher_id}")
-         raise HTTPException(status_code=400, detail="Time not within any of the teacher's available slots")
+         if not len(day_index.day(teacher_id, booking_date_dt)):
+            logging.warning(f"No availability found for teacher {teacher_id} on {booking_date_dt}")
+            raise HTTPException(status_code=404, detail="No availability found for this teacher.")
 
-      logging.info(f"Matched availability found: {matched_availability}")
+         matched_availability = day_index.find(teacher_id, booking_date_dt, slot_start_dt)
 
-      existing_bookings = await db.class_bookings.find({
-         "teacher_id": teacher_id,
-         "booking_date": booking_date_dt,
-         "start_time": slot_start_dt,
-         "end_time": slot_end_dt,
-         "subject": matched_availability["subject"]
-      }).to_list(length=100)
+         if not matched_availability:
+            logging.warning(f"Slot time {slot_start_dt} not within any availability for teacher {teacher_id}")
+            raise HTTPException(status_code=400, detail="Time not within any of the teacher's available slots")
 
-      max_allowed = matched_availability.get("max_no_of_students_each_slot", 1)
-      logging.debug(f"Existing bookings: {len(existing_bookings)} / {max_allowed}")
+         logging.info(f"Matched availability found: {matched_availability}")
 
-      if len(existing_bookings) >= max_allowed:
-         logging.warning("Booking failed: slot already full.")
-         raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=f"Slot already full. Max {max_allowed} students allowed."
-         )
+         await ensure_slot_capacity(db, matched_availability, slot_start_dt, slot_end_dt)
+         seat = await reserve_seat(db, teacher_id, slot_start_dt)
 
-      duplicate_booking = await db.class_bookings.find_one({
-         "student_id": str(student.id),
-         "teacher_id": teacher_id,
-         "booking_date": booking_date_dt,
-         "start_time": slot_start_dt
-      })
-      if duplicate_booking:
-         logging.warning(f"Duplicate booking attempt by student {student.id} for slot {slot_start_dt}")
-         raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="You have already booked this slot."
-         )
+         if seat is None:
+            max_allowed = matched_availability.get("max_no_of_students_each_slot", 1)
+            logging.warning("Booking failed: slot already full.")
+            raise HTTPException(
+               status_code=status.HTTP_409_CONFLICT,
+               detail=f"Slot already full. Max {max_allowed} students allowed."
+            )
+
+      logging.debug(f"Seat reserved, remaining: {seat['remaining']} / {seat['max_students']}")
 
       booking = Booking(
          student_id=str(student.id),
          teacher_id=teacher_id,
-         subject=availability["subject"],
+         subject=seat["subject"],
          booking_date=booking_date_dt,
          start_time=slot_start_dt,
          end_time=slot_end_dt
       )
-      result = await db.class_bookings.insert_one(booking.model_dump())
+      try:
+         result = await db.class_bookings.insert_one(booking.model_dump())
+      except DuplicateKeyError:
+         availability_snapshot.update_remaining(await release_seat(db, teacher_id, slot_start_dt))
+         logging.warning(f"Duplicate booking attempt by student {student.id} for slot {slot_start_dt}")
+         raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="You have already booked this slot."
+         )
+      except Exception:
+         availability_snapshot.update_remaining(await release_seat(db, teacher_id, slot_start_dt))
+         raise
       logging.info(f"Booking successful: {str(result.inserted_id)}")
+      availability_snapshot.update_remaining(seat)
+      await bump_versions(db, teacher_bookings_key(teacher_id), student_bookings_key(str(student.id)))
       
       return {
          "success": True,
@@ -191,6 +255,225 @@ async def book_slot(
          status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
          detail=f"Error booking this slot: {str(e)}"
       )
+class BatchBookRequest(BaseModel):
+   slots: List[BookSlotRequest] = Field(..., min_length=1)
+   # all_or_nothing: book every slot or none of them, best_effort: book what can be booked
+   mode: Literal["all_or_nothing", "best_effort"] = Field(default="best_effort", example="best_effort")
+
+
+@router.post("/book/batch", status_code=200, dependencies=booking_admission)
+async def book_slots_batch(
+   request: BatchBookRequest,
+   db: AsyncIOMotorDatabase = Depends(get_database),
+   student: Principal = Depends(get_current_student_claims)
+):
+   """
+      Book several class slots of tomorrow in one request.
+      Every slot goes through the same validations as `POST /book`, but all of them are
+      checked and reserved with a constant number of queries and the bookings are written
+      with one `insert_many`. `results` reports the status of each slot, in request order.
+      In `all_or_nothing` mode, any failure books nothing and answers 409.
+   """
+   try:
+      if len(request.slots) > settings.BATCH_BOOKING_MAX_SLOTS:
+         raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BATCH_BOOKING_MAX_SLOTS} slots per request"
+         )
+
+      student_id = str(student.id)
+      tomorrow_date = datetime.now().date() + timedelta(days=1)
+      booking_date_dt = datetime.combine(tomorrow_date, time.min)
+      results = [{"index": i, "teacher_id": item.teacher_id, "slot_start": item.slot_start} for i, item in enumerate(request.slots)]
+
+      def fail(i, status_name, detail):
+         results[i].update(status=status_name, detail=detail)
+
+      # Step 1: parse the slot times
+      pending, listed = {}, set()
+      for i, item in enumerate(request.slots):
+         try:
+            hour, minute = map(int, item.slot_start.split(":"))
+            slot_start_dt = datetime.combine(tomorrow_date, time(hour, minute))
+         except ValueError:
+            fail(i, "invalid", "Invalid time format. Use HH:MM")
+            continue
+         if (item.teacher_id, slot_start_dt) in listed:
+            fail(i, "duplicate", "Slot listed more than once")
+            continue
+         listed.add((item.teacher_id, slot_start_dt))
+         pending[i] = (item.teacher_id, slot_start_dt)
+
+      # Step 2: availability windows of every teacher involved, one query
+      teacher_ids = list({teacher_id for teacher_id, _ in pending.values()})
+      availability_index = AvailabilityIndex.from_availabilities(
+         await db.teacher_availabilities.find(
+            {"teacher_id": {"$in": teacher_ids}, "available_date": booking_date_dt}
+         ).sort("start_time", 1).to_list(length=None)
+      )
+      windows = {}
+      for i, (teacher_id, slot_start_dt) in list(pending.items()):
+         window = availability_index.find(teacher_id, booking_date_dt, slot_start_dt)
+         if window is None:
+            fail(i, "not_available", "Time not within any of the teacher's available slots")
+            del pending[i]
+         else:
+            windows[(teacher_id, slot_start_dt)] = window
+
+      # Step 3: capacities (created for the requested slots that have none yet) and existing bookings
+      slot_keys = list(pending.values())
+      slot_filter = {
+         "teacher_id": {"$in": teacher_ids},
+         "start_time": {"$in": list({slot_start for _, slot_start in slot_keys})}
+      }
+      capacities = {
+         (c["teacher_id"], c["start_time"]): c
+         for c in await db[SLOT_CAPACITIES].find(slot_filter).to_list(length=None)
+      }
+      missing = [key for key in slot_keys if key not in capacities]
+      if missing:
+         # Per requested slot like `book_slot`, so slots off the window's hourly grid work too
+         await asyncio.gather(*(
+            ensure_slot_capacity(db, windows[key], key[1], key[1] + timedelta(hours=1)) for key in missing
+         ))
+         capacities = {
+            (c["teacher_id"], c["start_time"]): c
+            for c in await db[SLOT_CAPACITIES].find(slot_filter).to_list(length=None)
+         }
+
+      already_booked = set()
+      if slot_keys:
+         already_booked = {
+            (b["teacher_id"], b["start_time"])
+            async for b in db.class_bookings.find(
+               {"student_id": student_id, **slot_filter}, projection={"teacher_id": 1, "start_time": 1}
+            )
+         }
+
+      for i, key in list(pending.items()):
+         if key in already_booked:
+            fail(i, "already_booked", "You have already booked this slot.")
+            del pending[i]
+         elif capacities.get(key, {}).get("remaining", 0) <= 0:
+            max_allowed = capacities.get(key, {}).get("max_students", 1)
+            fail(i, "full", f"Slot already full. Max {max_allowed} students allowed.")
+            del pending[i]
+
+      all_or_nothing = request.mode == "all_or_nothing"
+      if all_or_nothing and len(pending) < len(request.slots):
+         return _batch_rejected(results)
+
+      # Step 4: reserve the seats, then write every booking at once
+      reserved = await reserve_seats(db, list(pending.values()))
+      for i, key in list(pending.items()):
+         if key not in reserved:
+            fail(i, "full", "Slot already full.")
+            del pending[i]
+
+      if all_or_nothing and len(pending) < len(request.slots):
+         await release_seats(db, list(reserved))
+         await _refresh_snapshot_capacities(db, slot_filter)
+         return _batch_rejected(results)
+
+      bookings = {
+         i: Booking(
+            student_id=student_id,
+            teacher_id=teacher_id,
+            subject=reserved[(teacher_id, slot_start_dt)]["subject"],
+            booking_date=booking_date_dt,
+            start_time=slot_start_dt,
+            end_time=slot_start_dt + timedelta(hours=1)
+         ).model_dump()
+         for i, (teacher_id, slot_start_dt) in pending.items()
+      }
+      order = list(bookings)
+      # index -> (status, detail) of the bookings that were not written
+      failed = {}
+      if order:
+         try:
+            await db.class_bookings.insert_many([bookings[i] for i in order], ordered=False)
+         except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+               i = order[error["index"]]
+               if error["code"] == 11000:
+                  failed[i] = ("already_booked", "You have already booked this slot.")
+               else:
+                  logging.error(f"Batch booking of slot {pending[i]} by student {student_id} failed: {error.get('errmsg')}")
+                  failed[i] = ("error", f"Error booking this slot: {error.get('errmsg')}")
+            undone = list(failed)
+            if all_or_nothing:
+               # No transactions here: undo the bookings that did get written
+               written = [bookings[i]["_id"] for i in order if i not in failed and "_id" in bookings[i]]
+               await db.class_bookings.delete_many({"_id": {"$in": written}})
+               undone = order
+            await release_seats(db, [pending[i] for i in undone])
+         except Exception:
+            # Nothing was confirmed written, give every reserved seat back
+            await release_seats(db, [pending[i] for i in order])
+            raise
+
+      for i in order:
+         if i in failed:
+            fail(i, *failed[i])
+         else:
+            results[i].update(status="booked", booking_id=str(bookings[i]["_id"]), **{
+               k: bookings[i][k] for k in ("subject", "booking_date", "start_time", "end_time")
+            })
+
+      booked = [i for i in order if i not in failed]
+      if failed:
+         await _refresh_snapshot_capacities(db, slot_filter)
+      else:
+         for i in booked:
+            availability_snapshot.update_remaining(reserved[pending[i]])
+
+      if all_or_nothing and failed:
+         return _batch_rejected(results)
+
+      if booked:
+         await bump_versions(
+            db, student_bookings_key(student_id), *(teacher_bookings_key(pending[i][0]) for i in booked)
+         )
+      logging.info(f"Batch booking by student {student_id}: {len(booked)}/{len(results)} slots booked")
+
+      return FastJSONResponse({
+         "success": bool(booked),
+         "message": f"{len(booked)} of {len(results)} slots booked",
+         "booked": len(booked),
+         "results": results
+      })
+
+   except HTTPException as httpex:
+      logging.error(f"HTTPException during batch booking: {httpex.detail}")
+      raise httpex
+
+   except Exception as e:
+      logging.exception("Unhandled exception occurred while batch booking.")
+      raise HTTPException(
+         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+         detail=f"Error booking these slots: {str(e)}"
+      )
+
+
+def _batch_rejected(results):
+   for result in results:
+      if "status" not in result or result["status"] == "booked":
+         result.update(status="skipped", detail="Not booked because another slot of the batch failed")
+         for key in ("booking_id", "subject", "booking_date", "start_time", "end_time"):
+            result.pop(key, None)
+   return FastJSONResponse({
+      "success": False,
+      "message": "No slot booked, at least one slot of the batch cannot be booked",
+      "booked": 0,
+      "results": results
+   }, status_code=status.HTTP_409_CONFLICT)
+
+
+async def _refresh_snapshot_capacities(db: AsyncIOMotorDatabase, slot_filter):
+   async for capacity in db[SLOT_CAPACITIES].find(slot_filter):
+      availability_snapshot.update_remaining(capacity)
+
+
 @router.post("/slot/pay", status_code=200)
 async def mark_slot_booking_paid(
    booking_id: str = Query(..., example="60f7f72b9e1d8e6b2c5d6e3d"),
@@ -224,6 +507,7 @@ async def mark_slot_booking_paid(
             }
          }
       )
+      await bump_versions(db, teacher_bookings_key(booking["teacher_id"]))
 
       return {"success": True, "message": "Booking marked as paid."}
 
@@ -241,21 +525,26 @@ async def mark_slot_booking_paid(
 async def cancel_booking(
    booking_id: str = Path(..., example="60f7f72b9e1d8e6b2c5d6e3d"),
    db: AsyncIOMotorDatabase = Depends(get_database),
-   student = Depends(get_current_student)
+   student: Principal = Depends(get_current_student_claims)
 ):
    try:
       if not ObjectId.is_valid(booking_id):
          raise HTTPException(status_code=400, detail="Invalid booking ID")
 
-      booking = await db.class_bookings.find_one({"_id": ObjectId(booking_id)})
+      booking = await db.class_bookings.find_one_and_delete({
+         "_id": ObjectId(booking_id),
+         "student_id": str(student.id)
+      })
 
       if not booking:
+         if await db.class_bookings.count_documents({"_id": ObjectId(booking_id)}, limit=1):
+            raise HTTPException(status_code=403, detail="Not allowed to cancel others' bookings")
          raise HTTPException(status_code=404, detail="Booking not found")
 
-      if booking["student_id"] != str(student.id):
-         raise HTTPException(status_code=403, detail="Not allowed to cancel others' bookings")
-
-      await db.class_bookings.delete_one({"_id": ObjectId(booking_id)})
+      availability_snapshot.update_remaining(
+         await release_seat(db, booking["teacher_id"], booking["start_time"])
+      )
+      await bump_versions(db, teacher_bookings_key(booking["teacher_id"]), student_bookings_key(str(student.id)))
       return {"success": True, "message": "Booking deleted successfully"}
 
    except HTTPException as httpex:
@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Dict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from typing import Dict, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.models.teacher import TeacherAvailability
+from app.models.teacher import TeacherAvailability, AvailabilityWindow, BulkTeacherAvailability
 from app.middlewares.db import get_database
-from app.middlewares.auth import get_current_teacher
+from app.middlewares.auth import invalidate_cached_user, get_current_teacher, get_current_teacher_claims
 from app.models.user import User, UserUpdate
-from app.core.response_validation import custom_jsonable_encoder
+from app.models.auth import Principal
+from app.core.response_validation import FastJSONResponse
+from app.core.config import availability_snapshot, settings
+from app.core.intervals import AvailabilityIndex
+from app.core.slot_capacity import ensure_slot_capacities
+from app.core.pagination import decode_cursor, encode_cursor, keyset_filter, next_cursor_headers
+from app.core.etag import (
+   AUTO_ASSIGN_VERSION, bump_profile_dependents, teacher_availability_key, teacher_bookings_key,
+   bump_versions, compute_etag, etag_headers, not_modified
+)
 from bson import ObjectId
 from datetime import timedelta, datetime, time
 from collections import defaultdict
@@ -40,6 +49,9 @@ async def update_teacher_profile(
          raise HTTPException(status_code=403, detail="Only teachers can update subject or experience.")
 
    await db.users.update_one({"_id": ObjectId(teacher.id)}, {"$set": update_fields})
+   invalidate_cached_user(teacher.id)
+   await bump_profile_dependents(db, str(teacher.id), "teacher")
+   await availability_snapshot.refresh_teacher(db, str(teacher.id))
    updated = await db.users.find_one({"_id": ObjectId(teacher.id)})
    updated["_id"] = str(updated["_id"])
    return User(**updated)
@@ -48,7 +60,7 @@ async def update_teacher_profile(
 async def set_availability(
    data: TeacherAvailability,
    db: AsyncIOMotorDatabase = Depends(get_database),
-   teacher: User = Depends(get_current_teacher)
+   teacher: Principal = Depends(get_current_teacher_claims)
 ):
    try:
       logging.info(f"Received availability set request from teacher {teacher.id}: {data.dict()}")
@@ -62,17 +74,9 @@ async def set_availability(
       availability_date = datetime.combine(data.available_date.date(), time.min)
       logging.info(f"Normalized availability date: {availability_date}")
 
-      # Check for overlap with existing slots
-      overlap_exists = await db.teacher_availabilities.find_one({
-         "teacher_id": data.teacher_id,
-         "available_date": availability_date,
-         "$or": [
-            {
-               "start_time": {"$lt": data.end_time},
-               "end_time": {"$gt": data.start_time}
-            }
-         ]
-      })
+      # Check for overlap with the existing windows of that day
+      day_index = await AvailabilityIndex.load(db, data.teacher_id, [availability_date])
+      overlap_exists = day_index.overlaps(data.teacher_id, availability_date, data.start_time, data.end_time)
 
       if overlap_exists:
          logging.warning(f"Overlapping availability detected for teacher {data.teacher_id} on {availability_date}")
@@ -88,13 +92,17 @@ async def set_availability(
       }
 
       result = await db.teacher_availabilities.insert_one(availability_doc)
+      # Capacity documents are created with the window, readers never write them
+      await ensure_slot_capacities(db, [availability_doc])
       logging.info(f"Availability set successfully with ID: {str(result.inserted_id)} for teacher {data.teacher_id}")
+      await bump_versions(db, teacher_availability_key(data.teacher_id))
+      await availability_snapshot.refresh_teacher(db, data.teacher_id)
 
       return {
+         **availability_doc,
          "id": str(result.inserted_id),
          "success": True,
-         "message": "Availability set successfully",
-         "data": data.dict()
+         "message": "Availability set successfully"
       }
 
    except HTTPException as httpex:
@@ -108,33 +116,137 @@ async def set_availability(
          detail=f"Error setting availability: {str(e)}"
       )
 
+def _window_error(window: AvailabilityWindow, first_day: datetime, last_day: datetime) -> Optional[str]:
+   available_date = datetime.combine(window.available_date.date(), time.min)
+   if not first_day <= available_date <= last_day:
+      return f"Availability can only be set from {first_day.date()} to {last_day.date()}."
+   if window.start_time >= window.end_time:
+      return "Start time must be before end time."
+   if window.start_time.date() != available_date.date() or window.end_time > available_date + timedelta(days=1):
+      return "Start and end time must fall on the available date."
+   if window.max_no_of_students_each_slot < 1:
+      return "Max number of students per slot must be at least 1."
+   return None
+
+
+@router.post("/availability/bulk", response_model=Dict)
+async def set_availability_bulk(
+   data: BulkTeacherAvailability,
+   db: AsyncIOMotorDatabase = Depends(get_database),
+   teacher: Principal = Depends(get_current_teacher_claims)
+):
+   """
+      Publish many availability windows, possibly over several days, in one request.
+      Every window is validated on its own (date range, overlap with the existing windows
+      and with the previous windows of the request); the valid ones are written together
+      and `results` reports the outcome of each window, in request order.
+   """
+   try:
+      if str(teacher.id) != data.teacher_id:
+         logging.warning(f"Unauthorized teacher ID used. Authenticated: {teacher.id}, Provided: {data.teacher_id}")
+         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized teacher ID")
+
+      if len(data.windows) > settings.BULK_AVAILABILITY_MAX_WINDOWS:
+         raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BULK_AVAILABILITY_MAX_WINDOWS} windows per request"
+         )
+
+      first_day = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
+      last_day = first_day + timedelta(days=settings.AVAILABILITY_MAX_DAYS_AHEAD - 1)
+
+      results = [None] * len(data.windows)
+      candidates = []
+      for i, window in enumerate(data.windows):
+         error = _window_error(window, first_day, last_day)
+         if error:
+            results[i] = {"index": i, "status": "invalid", "detail": error}
+         else:
+            candidates.append(i)
+
+      # One query for the existing windows of every day touched by the request
+      days = {datetime.combine(data.windows[i].available_date.date(), time.min) for i in candidates}
+      index = await AvailabilityIndex.load(db, data.teacher_id, days)
+
+      docs, doc_indexes = [], []
+      for i in candidates:
+         window = data.windows[i]
+         doc = {
+            "teacher_id": data.teacher_id,
+            "subject": data.subject,
+            **window.dict(),
+            "available_date": datetime.combine(window.available_date.date(), time.min),
+         }
+         # Also rejects overlaps with the previous windows of this request
+         if not index.add(doc):
+            results[i] = {"index": i, "status": "overlap", "detail": "Availability overlaps with an existing slot"}
+            continue
+
+         docs.append(doc)
+         doc_indexes.append(i)
+
+      if docs:
+         inserted = await db.teacher_availabilities.insert_many(docs)
+         for i, inserted_id in zip(doc_indexes, inserted.inserted_ids):
+            results[i] = {"index": i, "status": "created", "id": str(inserted_id)}
+         await ensure_slot_capacities(db, docs)
+
+         await bump_versions(db, teacher_availability_key(data.teacher_id))
+         if first_day in days:
+            await availability_snapshot.refresh_teacher(db, data.teacher_id)
+
+      logging.info(f"Bulk availability for teacher {data.teacher_id}: {len(docs)}/{len(results)} windows created")
+      return {
+         "success": bool(docs),
+         "message": f"{len(docs)} of {len(results)} availability windows created",
+         "created": len(docs),
+         "results": results
+      }
+
+   except HTTPException as httpex:
+      logging.error(f"HTTPException during bulk availability set: {httpex.detail}")
+      raise httpex
+
+   except Exception as e:
+      logging.exception("Unhandled error while setting bulk availability.")
+      raise HTTPException(
+         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+         detail=f"Error setting availability: {str(e)}"
+      )
+
 @router.get("/available_slots", response_model=Dict)
 async def get_my_available_slots(
+   request: Request,
    db: AsyncIOMotorDatabase = Depends(get_database),
-   teacher: User = Depends(get_current_teacher)
+   teacher: Principal = Depends(get_current_teacher_claims)
 ):
    try:
       # Get tomorrow's date as datetime object at 00:00
       tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
 
+      etag = await compute_etag(db, teacher_availability_key(str(teacher.id)), extra=tomorrow.isoformat())
+      cached = not_modified(request, etag)
+      if cached:
+         return cached
+
       # Query availability of current teacher for tomorrow
-      availabilities = db.teacher_availabilities.find({
+      availabilities = await db.teacher_availabilities.find({
          "teacher_id": str(teacher.id),
          "available_date": tomorrow
-      })
+      }).to_list(length=None)
 
       if availabilities:
-         return {
+         return FastJSONResponse({
             "success": True,
             "message": "Availability found for the logged-in teacher.",
-            "available_slots": [custom_jsonable_encoder(availability) async for availability in availabilities]
-         }
+            "available_slots": availabilities
+         }, headers=etag_headers(etag))
       else:
-         return {
+         return FastJSONResponse({
             "success": False,
             "message": "No availability found for the logged-in teacher.",
             "available_slots": {}
-         }
+         }, headers=etag_headers(etag))
 
    except Exception as e:
       raise HTTPException(
@@ -143,24 +255,50 @@ async def get_my_available_slots(
       )
 
 
+# Matches the teacher_date_start index, so every page is an index range scan
+REGISTRATIONS_SORT = ["start_time", "_id"]
+
+
 @router.get("/bookings", response_model=list)
 async def view_my_student_registeration(
+   request: Request,
+   limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+   cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
    db: AsyncIOMotorDatabase = Depends(get_database),
    teacher: User = Depends(get_current_teacher)
 ):
    """
       Returns all class bookings for tomorrow for the logged-in teacher, grouped by their time slots.
+      Paginated by booking (`limit` bookings per page, next page cursor in the `X-Next-Cursor`
+      header), so the students of one slot may continue on the next page.
    """
    try:
       tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
+      after = decode_cursor(cursor, len(REGISTRATIONS_SORT))
+
+      etag = await compute_etag(
+         db,
+         teacher_bookings_key(str(teacher.id)), AUTO_ASSIGN_VERSION,
+         extra=f"{tomorrow.isoformat()}|{limit}|{cursor or ''}"
+      )
+      cached = not_modified(request, etag)
+      if cached:
+         return cached
 
       bookings = await db.class_bookings.find({
          "teacher_id": str(teacher.id),
-         "booking_date": tomorrow
-      }).to_list(100)
+         "booking_date": tomorrow,
+         **keyset_filter(REGISTRATIONS_SORT, after)
+      }).sort([(field, 1) for field in REGISTRATIONS_SORT]).limit(limit + 1).to_list(length=None)
+
+      next_cursor = None
+      if len(bookings) > limit:
+         bookings = bookings[:limit]
+         next_cursor = encode_cursor([bookings[-1][field] for field in REGISTRATIONS_SORT])
+      headers = {**etag_headers(etag), **next_cursor_headers(next_cursor)}
 
       if not bookings:
-         return []
+         return FastJSONResponse([], headers=headers)
 
       # Fetch all student IDs involved in the bookings
       student_ids = list({ObjectId(b["student_id"]) for b in bookings})
@@ -208,7 +346,10 @@ async def view_my_student_registeration(
             "students": students
          })
 
-      return result
+      return FastJSONResponse(result, headers=headers)
+
+   except HTTPException:
+      raise
 
    except Exception as e:
       raise HTTPException(
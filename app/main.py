@@ -1,23 +1,62 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from motor.motor_asyncio import AsyncIOMotorClient
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.config import settings, cors_origins
-from contextlib import asynccontextmanager
-from tasks.auto_assign import auto_assign_unbooked_students
+from app.core.config import (
+   settings, cors_origins, authorization_utils, availability_snapshot, user_cache, token_cache,
+   booking_gate, slots_gate, booking_engine
+)
+from app.core import metrics
+from app.core.query_profiler import QueryProfilerListener
+from app.middlewares.metrics import MetricsMiddleware
+from app.middlewares.query_profiler import QueryProfilerMiddleware
+from contextlib import asynccontextmanager, suppress
+from tasks.auto_assign import run_scheduled_auto_assignment
+from app.core.indexes import ensure_indexes, verify_query_plans
 from app.endpoints import auth, teachers, students, slots
-from fastapi_utils.tasks import repeat_every
 from fastapi.openapi.utils import get_openapi
+import asyncio
+import logging
 
-@repeat_every(seconds=5 * 60 * 60)  # every 5 hours
-async def schedule_auto_assignment():
-   await auto_assign_unbooked_students()
+async def schedule_auto_assignment(interval_seconds: float):
+   # Reuse the application's connection pool instead of opening a new client per run.
+   # Every worker ticks, the leader lock lets a single one run per interval. Waits first,
+   # so starting or restarting workers does not trigger a run.
+   while True:
+      await asyncio.sleep(interval_seconds)
+      try:
+         await run_scheduled_auto_assignment(app.mongodb, interval_seconds)
+      except Exception:
+         logging.exception("Scheduled auto-assignment failed")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-   app.mongodb_client = AsyncIOMotorClient(settings.MONGO_URI)
+   event_listeners = metrics.mongo_event_listeners() if settings.METRICS_ENABLED else []
+   if settings.QUERY_PROFILER_ENABLED or settings.SLOW_QUERY_MS:
+      event_listeners.append(QueryProfilerListener(slow_query_ms=settings.SLOW_QUERY_MS))
+   app.mongodb_client = AsyncIOMotorClient(settings.MONGO_URI, event_listeners=event_listeners)
    app.mongodb = app.mongodb_client[settings.DB_NAME]
+
+   if settings.ENSURE_INDEXES_ON_STARTUP:
+      await ensure_indexes(app.mongodb)
+   if settings.VERIFY_QUERY_PLANS_ON_STARTUP:
+      offenders = await verify_query_plans(app.mongodb)
+      if offenders:
+         raise RuntimeError(f"Hot queries without index support: {offenders}")
+
+   await availability_snapshot.rebuild(app.mongodb)
+
+   auto_assign_task = None
+   if settings.AUTO_ASSIGN_ENABLED:
+      auto_assign_task = asyncio.create_task(schedule_auto_assignment(settings.AUTO_ASSIGN_INTERVAL_SECONDS))
+
    yield
+   if auto_assign_task is not None:
+      auto_assign_task.cancel()
+      with suppress(asyncio.CancelledError):
+         await auto_assign_task
+   await booking_engine.shutdown()
    app.mongodb_client.close()
+   authorization_utils.shutdown()
 
 app = FastAPI(lifespan=lifespan, title="Online Class Booking API")
 
@@ -28,6 +67,10 @@ app.add_middleware(
    allow_methods=["*"],
    allow_headers=["*"],
 )
+if settings.QUERY_PROFILER_ENABLED:
+   app.add_middleware(QueryProfilerMiddleware, n_plus_one_threshold=settings.N_PLUS_ONE_THRESHOLD)
+if settings.METRICS_ENABLED:
+   app.add_middleware(MetricsMiddleware)
 
 # Routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
@@ -44,6 +87,25 @@ async def root():
 async def root():
    return {"message": "Application status healthy"}
 
+if settings.METRICS_ENABLED:
+   @app.get("/metrics", include_in_schema=False)
+   async def get_metrics():
+      """Prometheus text exposition of the in-process metrics."""
+      cache_stats = user_cache.stats()
+      metrics.user_cache_entries.set((), cache_stats["size"])
+      metrics.user_cache_hit_rate.set((), cache_stats["hit_rate"])
+      token_stats = token_cache.stats()
+      metrics.token_cache_entries.set((), token_stats["size"])
+      metrics.token_cache_hit_rate.set((), token_stats["hit_rate"])
+      metrics.password_hash_pending.set((), authorization_utils.pending)
+      metrics.booking_engine_slots.set((), booking_engine.active_slots)
+      metrics.slots_stream_subscribers.set((), availability_snapshot.events.subscribers)
+      for gate in (booking_gate, slots_gate):
+         gate_stats = gate.stats()
+         metrics.admission_active.set((gate.name,), gate_stats["active"])
+         metrics.admission_waiting.set((gate.name,), gate_stats["waiting"])
+      return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 def custom_openapi():
    # if app.openapi_schema:
@@ -0,0 +1,25 @@
+from fastapi.params import Depends
+from app.core.admission import AdmissionGate
+from app.core.config import settings, booking_gate, slots_gate, booking_rate_limiter
+from app.middlewares.auth import get_current_student_claims
+from app.models.auth import Principal
+
+
+def admission(gate: AdmissionGate):
+   """Dependency holding a slot of `gate` for the whole request (503 when overloaded)."""
+   async def dependency():
+      if not settings.ADMISSION_CONTROL_ENABLED:
+         yield
+         return
+      async with gate.admit():
+         yield
+   return dependency
+
+async def limit_booking_rate(student: Principal = Depends(get_current_student_claims)):
+   """Per-student token bucket of the booking endpoints (429 when exhausted)."""
+   if settings.ADMISSION_CONTROL_ENABLED and booking_rate_limiter is not None:
+      booking_rate_limiter.check(student.id)
+
+# Rate limit first, so a student retrying in a loop never takes a slot of the gate
+booking_admission = [Depends(limit_booking_rate), Depends(admission(booking_gate))]
+slots_admission = [Depends(admission(slots_gate))]
@@ -3,10 +3,11 @@ from fastapi.params import Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.security import OAuth2PasswordBearer
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.models.auth import TokenData
+from app.models.auth import Principal, TokenData
 from app.middlewares.db import get_database
 from app.models.user import User
-from app.core.config import jwt_utils, settings
+from app.core.config import jwt_utils, settings, user_cache, token_versions
+from app.core.token_versions import user_token_version
 import jwt
 from bson import ObjectId
 
@@ -46,26 +47,67 @@ async def check_if_user_is_registered(
 
    return False
 
+def _verified_claims(credentials: HTTPAuthorizationCredentials) -> dict:
+   try:
+      payload = jwt_utils.decode_token(credentials.credentials)
+      if payload.get("user_id") is None:
+         raise credentials_exception
+   except jwt.PyJWTError:
+      raise credentials_exception
+   return payload
+
 async def get_current_user(
    credentials: HTTPAuthorizationCredentials = Depends(security),
    db: AsyncIOMotorDatabase = Depends(get_database),
 ) -> User:
-   token = credentials.credentials
-   try:
-      payload = jwt_utils.decode_token(token)
-      user_id = payload.get("user_id")
+   payload = _verified_claims(credentials)
+   user_id = payload["user_id"]
 
-      if user_id is None:
+   user = user_cache.get(user_id)
+   if user is None:
+      user_data = await db.users.find_one({"_id": ObjectId(user_id)}) if ObjectId.is_valid(user_id) else None
+      if not user_data:
          raise credentials_exception
-      
-   except jwt.PyJWTError:
+      token_versions.remember(user_id, user_token_version(user_data))
+      user_data["_id"] = str(user_data["_id"])
+      user = User(**user_data)
+      user_cache.set(user_id, user)
+
+   if not await token_versions.is_current(db, user_id, payload.get("ver")):
       raise credentials_exception
+   return user
 
-   user_data = await db.users.find_one({"_id": ObjectId(user_id)})
-   if not user_data:
+async def get_current_claims(
+   credentials: HTTPAuthorizationCredentials = Depends(security),
+   db: AsyncIOMotorDatabase = Depends(get_database),
+) -> Principal:
+   """
+      Authenticate from the verified token claims alone, for endpoints that only need the
+      id and role of the caller. Revocation is checked against the cached token version of
+      the user, so this does no database read once that version is cached.
+   """
+   if not settings.CLAIMS_AUTH_ENABLED:
+      user = await get_current_user(credentials, db)
+      return Principal(id=user.id, email=user.email, role=user.role)
+
+   payload = _verified_claims(credentials)
+   if payload.get("role") is None:
+      raise credentials_exception
+   if not await token_versions.is_current(db, payload["user_id"], payload.get("ver")):
       raise credentials_exception
-   user_data["_id"] = str(user_data["_id"])
-   return User(**user_data)
+   return Principal(id=payload["user_id"], email=payload.get("email"), role=payload["role"])
+
+def invalidate_cached_user(user_id: str):
+   """Drop a cached principal so the next request reloads it from the database."""
+   user_cache.invalidate(str(user_id))
+
+async def revoke_user_tokens(db: AsyncIOMotorDatabase, user_id: str) -> int:
+   """
+      Invalidate every token issued to a user so far (password reset, deactivation).
+      Returns the new token version, to be put in the tokens issued from now on.
+   """
+   invalidate_cached_user(user_id)
+   return await token_versions.bump(db, str(user_id))
 
 async def get_current_teacher(user: User = Depends(get_current_user)) -> User:
    if user.role != "teacher":
@@ -76,3 +118,13 @@ async def get_current_student(user: User = Depends(get_current_user)) -> User:
    if user.role != "student":
       raise HTTPException(status_code=403, detail="Only students allowed")
    return user
+
+async def get_current_teacher_claims(principal: Principal = Depends(get_current_claims)) -> Principal:
+   if principal.role != "teacher":
+      raise HTTPException(status_code=403, detail="Only teachers allowed")
+   return principal
+
+async def get_current_student_claims(principal: Principal = Depends(get_current_claims)) -> Principal:
+   if principal.role != "student":
+      raise HTTPException(status_code=403, detail="Only students allowed")
+   return principal
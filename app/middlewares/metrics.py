@@ -0,0 +1,52 @@
+from time import perf_counter
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import http_request_duration, http_requests, http_requests_in_flight
+
+
+def route_template(scope: Scope) -> str:
+   """
+      Path template of the route the request will be dispatched to. Middlewares run
+      before routing sets `scope["route"]`, so the in-flight gauge matches it up front.
+   """
+   for route in getattr(scope.get("app"), "routes", ()):
+      match, _ = route.matches(scope)
+      if match == Match.FULL:
+         return getattr(route, "path", None) or "unmatched"
+   return "unmatched"
+
+
+class MetricsMiddleware:
+   """
+      Records the count, latency and in-flight number of HTTP requests.
+      Requests are labelled with the route template (e.g. `/student/booking/{booking_id}`)
+      rather than the raw path, to keep the number of series bounded.
+   """
+
+   def __init__(self, app: ASGIApp):
+      self.app = app
+
+   async def __call__(self, scope: Scope, receive: Receive, send: Send):
+      if scope["type"] != "http":
+         await self.app(scope, receive, send)
+         return
+
+      method = scope["method"]
+      status_code = 500
+
+      async def send_wrapper(message: Message):
+         nonlocal status_code
+         if message["type"] == "http.response.start":
+            status_code = message["status"]
+         await send(message)
+
+      route = route_template(scope)
+      http_requests_in_flight.inc((method, route))
+      started = perf_counter()
+      try:
+         await self.app(scope, receive, send_wrapper)
+      finally:
+         elapsed = perf_counter() - started
+         http_requests_in_flight.dec((method, route))
+         http_requests.inc((method, route, str(status_code)))
+         http_request_duration.observe((method, route), elapsed)
@@ -0,0 +1,45 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.query_profiler import QueryProfile, _current_profile
+import logging
+
+
+class QueryProfilerMiddleware:
+   """
+      Debug/profiling middleware counting the Mongo commands of every request.
+      Adds an `X-Query-Count` response header and logs a warning for every query shape
+      repeated at least `n_plus_one_threshold` times in the same request (N+1 pattern).
+   """
+
+   def __init__(self, app: ASGIApp, n_plus_one_threshold: int = 5):
+      self.app = app
+      self.n_plus_one_threshold = n_plus_one_threshold
+
+   async def __call__(self, scope: Scope, receive: Receive, send: Send):
+      if scope["type"] != "http":
+         await self.app(scope, receive, send)
+         return
+
+      parent = _current_profile.get()
+      profile = QueryProfile()
+      token = _current_profile.set(profile)
+
+      async def send_wrapper(message: Message):
+         if message["type"] == "http.response.start":
+            headers = list(message.get("headers", []))
+            headers.append((b"x-query-count", str(profile.total).encode()))
+            message = {**message, "headers": headers}
+         await send(message)
+
+      try:
+         await self.app(scope, receive, send_wrapper)
+      finally:
+         _current_profile.reset(token)
+         if parent is not None:
+            parent.merge(profile)
+
+         route = getattr(scope.get("route"), "path", scope["path"])
+         for (collection, command, shape), count in profile.repeated(self.n_plus_one_threshold):
+            logging.warning(
+               f"Possible N+1 in {scope['method']} {route}: {count}x {command} on '{collection}' with filter shape {shape}"
+            )
+         logging.debug(f"{scope['method']} {route} issued {profile.total} Mongo commands")
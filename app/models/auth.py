@@ -10,6 +10,12 @@ class TokenData(BaseModel):
    user_id: Optional[str] = "665e3dcf6dd8e693cefa77c2"
    role: Optional[str] = "student"
 
+class Principal(BaseModel):
+   """Authenticated caller as described by the verified claims of its access token."""
+   id: str = "665e3dcf6dd8e693cefa77c2"
+   email: Optional[str] = "krishna.kanjani@example.com"
+   role: str = "student"
+
 class LoginRequest(BaseModel):
    email: EmailStr = "krishna.kanjani@example.com"
    password: str = "StrongPass@123"
@@ -1,4 +1,5 @@
 from pydantic import EmailStr, BaseModel, Field, model_validator
+from typing import List
 from datetime import datetime, timedelta
 
 class TeacherAvailability(BaseModel):
@@ -24,6 +25,23 @@ class TeacherAvailability(BaseModel):
       return values
 
 
+class AvailabilityWindow(BaseModel):
+   available_date: datetime = Field(..., example="2025-06-21T00:00:00")
+   start_time: datetime = Field(..., example="2025-06-21T10:00:00")
+   end_time: datetime = Field(..., example="2025-06-21T12:00:00")
+   max_no_of_students_each_slot: int = Field(default=1, example=2)
+
+
+class BulkTeacherAvailability(BaseModel):
+   """
+      Many availability windows over a date range, validated per window by
+      `POST /teacher/availability/bulk` so one bad window does not reject the others.
+   """
+   teacher_id: str = Field(..., description="MongoDB ObjectID of the teacher", example="665e3dcf6dd8e693cefa77c2")
+   subject: str = Field(..., example="Mathematics")
+   windows: List[AvailabilityWindow] = Field(..., min_length=1)
+
+
 class TeacherInfo(BaseModel):
    id: str = Field(alias="_id", example="665e3dcf6dd8e693cefa77c2")
    first_name: str = Field(..., example="John")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from datetime import datetime, timezone
 from bson import ObjectId
 from enum import Enum
@@ -35,6 +35,7 @@ class UserCreate(UserBase):
    school_name: Optional[str] = Field(None, example="Sunshine Public School")   # Only for students
    standard: Optional[str] = Field(None, example="10th")   # Only for students
    previuos_standard_result: Optional[float] = Field(None, example=88.6)   # Only for students
+   preferred_subjects: Optional[List[str]] = Field(None, example=["Mathematics", "Chemistry"])   # Only for students, used by auto-assignment
 
 
 class UserUpdate(BaseModel):
@@ -50,6 +51,7 @@ class UserUpdate(BaseModel):
    school_name: Optional[str] = Field(None, example="St. Xavier's High School")
    standard: Optional[str] = Field(None, example="9th")
    previuos_standard_result: Optional[float] = Field(None, example=91.5)
+   preferred_subjects: Optional[List[str]] = Field(None, example=["Mathematics"])
 
    class Config:
       json_schema_extra = {
@@ -65,7 +67,8 @@ class UserUpdate(BaseModel):
             # For student
             "school_name": "Bluebell High",
             "standard": "12th",
-            "previuos_standard_result": 91.2
+            "previuos_standard_result": 91.2,
+            "preferred_subjects": ["Mathematics", "Chemistry"]
 
          }
       }
@@ -73,6 +76,7 @@ class UserUpdate(BaseModel):
 class User(UserBase):
    id: str = Field(alias="_id", example="665e3dcf6dd8e693cefa77c2")
    subject: Optional[str] = Field(None, example="Physics")
+   preferred_subjects: Optional[List[str]] = Field(None, example=["Mathematics"])
    created_at: datetime = Field(default_factory=lambda: datetime.now(tz=timezone.utc), example=datetime.now(tz=timezone.utc))
    updated_at: datetime = Field(default_factory=lambda: datetime.now(tz=timezone.utc), example=datetime.now(tz=timezone.utc))
 
@@ -0,0 +1,92 @@
+"""
+In-memory benchmark of the auto-assignment strategies (no database needed).
+
+   python -m scripts.benchmark_assignment --students 10000 100000
+"""
+
+import argparse
+import copy
+import random
+import statistics
+from collections import Counter
+from datetime import datetime, timedelta
+from time import perf_counter
+from bson import ObjectId
+from tasks.assignment import ASSIGNMENT_STRATEGIES
+
+SUBJECTS = ["Mathematics", "Chemistry", "English", "Physics", "Biology", "History"]
+
+
+def build_slots(teachers: int, hours: int, seats: int, rng: random.Random):
+   day = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+   slots = []
+   for _ in range(teachers):
+      teacher_id = str(ObjectId())
+      subject = rng.choice(SUBJECTS)
+      for hour in range(hours):
+         slots.append({
+            "_id": ObjectId(),
+            "teacher_id": teacher_id,
+            "subject": subject,
+            "start_time": day + timedelta(hours=9 + hour),
+            "max_students": seats,
+            "remaining": seats,
+         })
+   return slots
+
+
+def build_students(count: int, rng: random.Random):
+   return [
+      {"_id": ObjectId(), "preferred_subjects": rng.sample(SUBJECTS, rng.randint(0, 2))}
+      for _ in range(count)
+   ]
+
+
+def run(strategy_name: str, students, slots):
+   slots = copy.deepcopy(slots)
+   assign = ASSIGNMENT_STRATEGIES[strategy_name]
+
+   started = perf_counter()
+   plan = assign(students, slots)
+   elapsed = perf_counter() - started
+
+   preferences = {str(s["_id"]): set(s["preferred_subjects"]) for s in students}
+   teacher_load = Counter()
+   assigned = satisfied = 0
+   for index, student_ids in plan.items():
+      teacher_load[slots[index]["teacher_id"]] += len(student_ids)
+      assigned += len(student_ids)
+      satisfied += sum(
+         1 for student_id in student_ids
+         if not preferences[student_id] or slots[index]["subject"] in preferences[student_id]
+      )
+
+   loads = [teacher_load.get(teacher_id, 0) for teacher_id in {slot["teacher_id"] for slot in slots}]
+   return {
+      "strategy": strategy_name,
+      "seconds": round(elapsed, 3),
+      "assigned": assigned,
+      "preference_hit_rate": round(satisfied / assigned, 3) if assigned else 0.0,
+      "teacher_load_min": min(loads),
+      "teacher_load_max": max(loads),
+      "teacher_load_stdev": round(statistics.pstdev(loads), 1),
+   }
+
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Compare the auto-assignment strategies.")
+   parser.add_argument("--students", type=int, nargs="+", default=[10_000, 100_000])
+   parser.add_argument("--teachers", type=int, default=500)
+   parser.add_argument("--hours", type=int, default=8)
+   parser.add_argument("--seats", type=int, default=30)
+   parser.add_argument("--seed", type=int, default=42)
+   args = parser.parse_args()
+
+   for count in args.students:
+      rng = random.Random(args.seed)
+      slots = build_slots(args.teachers, args.hours, args.seats, rng)
+      students = build_students(count, rng)
+      capacity = sum(slot["remaining"] for slot in slots)
+      print(f"\n{count} students, {len(slots)} slots, {capacity} seats")
+      for name in ASSIGNMENT_STRATEGIES:
+         print(run(name, students, slots))
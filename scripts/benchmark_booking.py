@@ -0,0 +1,143 @@
+"""
+Throughput of bookings on one contended slot, plain `book_slot` path vs the booking engine.
+
+Needs a running MongoDB (`MONGO_URI`). Every run works in a scratch database next to
+`DB_NAME` (`<DB_NAME>_benchmark_booking`), dropped at the end:
+
+   python -m scripts.benchmark_booking --students 2000 --seats 30 --concurrency 200 500
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from datetime import datetime, time, timedelta
+from time import perf_counter
+from bson import ObjectId
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+from pymongo.errors import DuplicateKeyError
+from app.core.booking_engine import BookingEngine
+from app.core.config import settings
+from app.core.etag import bump_versions, student_bookings_key, teacher_bookings_key
+from app.core.indexes import ensure_indexes
+from app.core.slot_capacity import SLOT_CAPACITIES, ensure_slot_capacities, release_seat, reserve_seat
+from app.models.bookings import Booking
+
+SUBJECT = "Mathematics"
+
+
+class CommandCounter(monitoring.CommandListener):
+   def __init__(self):
+      self.commands = Counter()
+
+   def started(self, event):
+      self.commands[event.command_name] += 1
+
+   def succeeded(self, event):
+      pass
+
+   def failed(self, event):
+      pass
+
+
+async def plain_book(db: AsyncIOMotorDatabase, teacher_id: str, slot_start: datetime, student_id: str):
+   """The fast path of `POST /student/book`, once the slot's capacity document exists."""
+   seat = await reserve_seat(db, teacher_id, slot_start)
+   if seat is None:
+      raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Slot already full.")
+
+   booking = Booking(
+      student_id=student_id,
+      teacher_id=teacher_id,
+      subject=seat["subject"],
+      booking_date=datetime.combine(slot_start.date(), time.min),
+      start_time=slot_start,
+      end_time=slot_start + timedelta(hours=1),
+   )
+   try:
+      await db.class_bookings.insert_one(booking.model_dump())
+   except DuplicateKeyError:
+      await release_seat(db, teacher_id, slot_start)
+      raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="You have already booked this slot.")
+   await bump_versions(db, teacher_bookings_key(teacher_id), student_bookings_key(student_id))
+
+
+async def prepare(db: AsyncIOMotorDatabase, seats: int):
+   await db.client.drop_database(db.name)
+   await ensure_indexes(db)
+
+   day = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
+   availability = {
+      "teacher_id": str(ObjectId()),
+      "subject": SUBJECT,
+      "available_date": day,
+      "start_time": day + timedelta(hours=10),
+      "end_time": day + timedelta(hours=11),
+      "max_no_of_students_each_slot": seats,
+   }
+   await db.teacher_availabilities.insert_one(availability)
+   await ensure_slot_capacities(db, [availability])
+   return availability["teacher_id"], availability["start_time"]
+
+
+async def run(mode: str, db: AsyncIOMotorDatabase, counter: CommandCounter, students: int, seats: int, concurrency: int):
+   teacher_id, slot_start = await prepare(db, seats)
+   engine = BookingEngine()
+   book = engine.book if mode == "engine" else plain_book
+   # A few students retry, so duplicates are part of the mix
+   student_ids = [str(ObjectId()) for _ in range(students)]
+   student_ids += student_ids[:students // 20]
+
+   limit = asyncio.Semaphore(concurrency)
+   outcomes = Counter()
+
+   async def attempt(student_id: str):
+      async with limit:
+         try:
+            await book(db, teacher_id, slot_start, student_id)
+            outcomes["201"] += 1
+         except HTTPException as e:
+            outcomes[str(e.status_code)] += 1
+
+   counter.commands.clear()
+   started = perf_counter()
+   await asyncio.gather(*(attempt(student_id) for student_id in student_ids))
+   elapsed = perf_counter() - started
+   await engine.shutdown()
+
+   commands = dict(counter.commands)
+   booked = await db.class_bookings.count_documents({"teacher_id": teacher_id, "start_time": slot_start})
+   capacity = await db[SLOT_CAPACITIES].find_one({"teacher_id": teacher_id, "start_time": slot_start})
+   return {
+      "mode": mode,
+      "concurrency": concurrency,
+      "seconds": round(elapsed, 3),
+      "requests_per_second": round(len(student_ids) / elapsed, 1),
+      "outcomes": dict(outcomes),
+      "mongo_commands": sum(commands.values()),
+      "by_command": commands,
+      "consistent": booked == seats - capacity["remaining"] and booked <= seats,
+   }
+
+
+async def main(args):
+   counter = CommandCounter()
+   client = AsyncIOMotorClient(settings.MONGO_URI, event_listeners=[counter])
+   db = client[f"{settings.DB_NAME}_benchmark_booking"]
+   try:
+      for concurrency in args.concurrency:
+         print(f"\n{args.students} students, {args.seats} seats, {concurrency} concurrent requests")
+         for mode in ("plain", "engine"):
+            print(await run(mode, db, counter, args.students, args.seats, concurrency))
+   finally:
+      await client.drop_database(db.name)
+      client.close()
+
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Compare booking paths on one contended slot.")
+   parser.add_argument("--students", type=int, default=2000)
+   parser.add_argument("--seats", type=int, default=30)
+   parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 500])
+   asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+"""
+Microbenchmark of the response serialization cost for a `/slots/available` payload.
+
+Compares the previous path (the original recursive `custom_jsonable_encoder`, copied
+below, -> FastAPI jsonable_encoder -> JSONResponse) with `FastJSONResponse`.
+
+   python -m scripts.benchmark_serialization --slots 1000
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from timeit import repeat
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.core.response_validation import FastJSONResponse
+
+
+def build_payload(slot_count: int, slots_per_teacher: int = 8):
+   day = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+   teachers = []
+   for t in range(0, slot_count, slots_per_teacher):
+      teachers.append({
+         "teacher_id": ObjectId(),
+         "first_name": f"Teacher{t}",
+         "last_name": "Test",
+         "email": f"teacher{t}@school.com",
+         "phone": "+911111111111",
+         "subject": "Mathematics",
+         "years_of_exp": 4,
+         "slots": [
+            {
+               "available_date": day,
+               "start_time": day + timedelta(hours=9 + h),
+               "end_time": day + timedelta(hours=10 + h),
+               "max_no_of_students_each_slot": 5,
+               "capacity": [{"start_time": day + timedelta(hours=9 + h), "end_time": day + timedelta(hours=10 + h), "remaining": 3}],
+            }
+            for h in range(min(slots_per_teacher, slot_count - t))
+         ],
+      })
+   return {"success": True, "message": "Grouped teacher availability fetched successfully", "teachers_available": teachers}
+
+
+def baseline_jsonable_encoder(obj):
+   """`custom_jsonable_encoder` as it was before `FastJSONResponse`, kept as the reference."""
+   if isinstance(obj, ObjectId):
+      return str(obj)
+   if isinstance(obj, list):
+      return [baseline_jsonable_encoder(item) for item in obj]
+   if isinstance(obj, tuple):
+      return (baseline_jsonable_encoder(item) for item in obj)
+   if isinstance(obj, dict):
+      return {key: baseline_jsonable_encoder(value) for key, value in obj.items()}
+   if isinstance(obj, set):
+      return {baseline_jsonable_encoder(value) for value in obj}
+   return jsonable_encoder(obj)
+
+
+def previous_path(payload):
+   content = {**payload, "teachers_available": baseline_jsonable_encoder(payload["teachers_available"])}
+   return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_path(payload):
+   return FastJSONResponse(payload).body
+
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Measure response serialization per payload.")
+   parser.add_argument("--slots", type=int, default=1000)
+   parser.add_argument("--number", type=int, default=50)
+   args = parser.parse_args()
+
+   payload = build_payload(args.slots)
+   for name, func in (("baseline encoder + jsonable_encoder", previous_path), ("FastJSONResponse", fast_path)):
+      best = min(repeat(lambda: func(payload), number=args.number, repeat=5)) / args.number
+      print(f"{name:<45} {best * 1000:8.3f} ms per {args.slots}-slot payload ({len(func(payload))} bytes)")
@@ -0,0 +1,48 @@
+import argparse
+import asyncio
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+from app.core.indexes import ensure_indexes, find_duplicates, verify_query_plans
+
+async def main(apply: bool, verify: bool, duplicates: bool = False) -> int:
+   client = AsyncIOMotorClient(settings.MONGO_URI)
+   db = client[settings.DB_NAME]
+   try:
+      if duplicates:
+         report = await find_duplicates(db)
+         for index, found in report.items():
+            print(f"❌ {index}: {found['groups']} duplicated keys, e.g.")
+            for example in found["examples"]:
+               print(f"   {example['key']} -> {example['ids']}")
+         if report:
+            return 1
+         print("✅ No duplicates for the unique indexes.")
+         return 0
+
+      if apply:
+         await ensure_indexes(db)
+         print("✅ Indexes ensured.")
+
+      if verify:
+         offenders = await verify_query_plans(db)
+         if offenders:
+            for name in offenders:
+               print(f"❌ COLLSCAN: {name}")
+            return 1
+         print("✅ All hot queries are index-backed.")
+
+      return 0
+   finally:
+      client.close()
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Apply and verify the MongoDB indexes of the application.")
+   parser.add_argument("--verify", action="store_true", help="Explain the hot queries and fail on any COLLSCAN")
+   parser.add_argument("--verify-only", action="store_true", help="Only run the verification, do not create indexes")
+   parser.add_argument("--find-duplicates", action="store_true", help="Only list the documents blocking a unique index")
+   args = parser.parse_args()
+
+   sys.exit(asyncio.run(main(
+      apply=not args.verify_only, verify=args.verify or args.verify_only, duplicates=args.find_duplicates
+   )))
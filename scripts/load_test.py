@@ -0,0 +1,296 @@
+"""
+End-to-end load test replaying booking-day traffic against a running API.
+
+Start the API and a local mongod first (the script seeds through `MONGO_URI` / `DB_NAME`,
+which must be the database the API uses):
+
+   uvicorn app.main:app --workers 4
+   python -m scripts.load_test --teachers 50 --students 2000 --users 200 --duration 60 --auto-assign
+
+Only the accounts it creates (`*@loadtest.example.com`) and their data are reset between runs.
+Traffic mix per virtual user (each logged in as its own student, all logging in at once):
+`/slots/available` polling with `If-None-Match`, bookings concentrated on a few popular
+slots, booking listings and cancellations, plus teachers listing their registrations and
+optionally `auto_assign` running in the middle of the run. `auto_assign` books every
+active student of the database, so `--auto-assign` refuses to run when the database
+holds any other account.
+
+Virtual users book far faster than the per-student rate limit (`BOOKING_RATE_PER_SECOND`,
+`BOOKING_RATE_BURST`), so with the defaults most bookings are answered 429. They are
+reported apart as `rate_limited`; start the API with `BOOKING_RATE_PER_SECOND=0` to
+measure the booking path itself.
+
+Prints a JSON report: throughput, per-route p50/p95/p99 latency and error rate, and the
+overbooking / double-booking violations found in the database afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from app.core.config import settings, authorization_utils
+from app.core.slot_capacity import SLOT_CAPACITIES
+from tasks.auto_assign import auto_assign_unbooked_students
+
+EMAIL_DOMAIN = "loadtest.example.com"
+PASSWORD = "Load@test123"
+SUBJECTS = ["Mathematics", "Chemistry", "English", "Physics", "Biology", "History"]
+FIRST_HOUR, LAST_HOUR = 9, 17
+
+
+class Recorder:
+   """Latency samples and outcomes per route template."""
+
+   def __init__(self):
+      self.latencies: Dict[str, List[float]] = defaultdict(list)
+      self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+   async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+      started = perf_counter()
+      try:
+         response = await client.request(method, url, **kwargs)
+         outcome = str(response.status_code)
+      except httpx.HTTPError as e:
+         response, outcome = None, type(e).__name__
+      self.latencies[route].append(perf_counter() - started)
+      self.statuses[route][outcome] += 1
+      return response
+
+   def report(self, elapsed: float) -> Dict[str, Any]:
+      routes = {}
+      for route, samples in sorted(self.latencies.items()):
+         samples = sorted(samples)
+         # 4xx are expected outcomes here (full slot, already booked), 5xx and transport errors are not
+         errors = sum(count for outcome, count in self.statuses[route].items() if not outcome.isdigit() or outcome[0] == "5")
+         routes[route] = {
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            "error_rate": round(errors / len(samples), 4),
+            "rate_limited": self.statuses[route].get("429", 0),
+            "statuses": dict(self.statuses[route]),
+         }
+      total = sum(len(samples) for samples in self.latencies.values())
+      return {
+         "requests": total,
+         "throughput_rps": round(total / elapsed, 1),
+         "rate_limited": sum(route["rate_limited"] for route in routes.values()),
+         "routes": routes,
+      }
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+   if not sorted_samples:
+      return 0.0
+   rank = max(int(round(pct / 100 * len(sorted_samples))) - 1, 0)
+   return sorted_samples[min(rank, len(sorted_samples) - 1)]
+
+
+async def seed(db: AsyncIOMotorDatabase, teachers: int, students: int, seats: int, rng: random.Random):
+   """Reset the load-test accounts and give every teacher a full day of slots tomorrow."""
+   previous = [str(u["_id"]) async for u in db.users.find({"email": {"$regex": f"@{EMAIL_DOMAIN}$"}}, projection={"_id": 1})]
+   if previous:
+      await db.class_bookings.delete_many({"$or": [{"student_id": {"$in": previous}}, {"teacher_id": {"$in": previous}}]})
+      await db.teacher_availabilities.delete_many({"teacher_id": {"$in": previous}})
+      await db[SLOT_CAPACITIES].delete_many({"teacher_id": {"$in": previous}})
+      await db.users.delete_many({"email": {"$regex": f"@{EMAIL_DOMAIN}$"}})
+
+   hashed_password = authorization_utils.get_password_hash(PASSWORD)
+   now = datetime.now()
+   base = {"last_name": "Load", "phone": "+911234567890", "age": 30, "is_active": True,
+           "hashed_password": hashed_password, "created_at": now, "updated_at": now}
+
+   teacher_docs = [
+      {**base, "first_name": f"Teacher{i}", "email": f"teacher{i}@{EMAIL_DOMAIN}", "role": "teacher",
+       "subject": rng.choice(SUBJECTS), "years_of_exp": rng.randint(1, 20)}
+      for i in range(teachers)
+   ]
+   student_docs = [
+      {**base, "first_name": f"Student{i}", "email": f"student{i}@{EMAIL_DOMAIN}", "role": "student",
+       "school_name": "Load School", "standard": "10th", "previuos_standard_result": 80,
+       "preferred_subjects": rng.sample(SUBJECTS, rng.randint(0, 2))}
+      for i in range(students)
+   ]
+   teacher_ids = [str(_id) for _id in (await db.users.insert_many(teacher_docs)).inserted_ids]
+   await db.users.insert_many(student_docs)
+
+   tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
+   await db.teacher_availabilities.insert_many([
+      {
+         "teacher_id": teacher_id,
+         "subject": doc["subject"],
+         "available_date": tomorrow,
+         "start_time": tomorrow.replace(hour=FIRST_HOUR),
+         "end_time": tomorrow.replace(hour=LAST_HOUR),
+         "max_no_of_students_each_slot": seats,
+      }
+      for teacher_id, doc in zip(teacher_ids, teacher_docs)
+   ])
+   return teacher_ids
+
+
+async def login(recorder: Recorder, client: httpx.AsyncClient, email: str) -> Optional[str]:
+   response = await recorder.request(
+      client, "POST /auth/login", "POST", "/auth/login", json={"email": email, "password": PASSWORD}
+   )
+   if response is None or response.status_code != 200:
+      return None
+   return response.json()["access_token"]
+
+
+async def virtual_user(
+   recorder: Recorder, client: httpx.AsyncClient, token: str, teacher_ids: List[str],
+   popular: List[tuple], popular_share: float, deadline: float, rng: random.Random
+):
+   headers = {"Authorization": f"Bearer {token}"}
+   etag = None
+   booking_ids: List[str] = []
+
+   while perf_counter() < deadline:
+      action = rng.random()
+      if action < 0.5:
+         response = await recorder.request(
+            client, "GET /slots/available", "GET", "/slots/available",
+            headers={"If-None-Match": etag} if etag else {}
+         )
+         if response is not None and response.status_code == 200:
+            etag = response.headers.get("etag")
+      elif action < 0.75:
+         if rng.random() < popular_share:
+            teacher_id, hour = rng.choice(popular)
+         else:
+            teacher_id, hour = rng.choice(teacher_ids), rng.randrange(FIRST_HOUR, LAST_HOUR)
+         response = await recorder.request(
+            client, "POST /student/book", "POST", "/student/book", headers=headers,
+            json={"teacher_id": teacher_id, "slot_start": f"{hour:02d}:00"}
+         )
+         if response is not None and response.status_code == 200:
+            booking_ids.append(response.json()["booking_id"])
+      elif action < 0.9:
+         await recorder.request(client, "GET /student/bookings", "GET", "/student/bookings", headers=headers)
+      elif booking_ids:
+         booking_id = booking_ids.pop(rng.randrange(len(booking_ids)))
+         await recorder.request(
+            client, "DELETE /student/booking/{booking_id}", "DELETE", f"/student/booking/{booking_id}", headers=headers
+         )
+
+
+async def teacher_user(recorder: Recorder, client: httpx.AsyncClient, token: str, deadline: float, rng: random.Random):
+   headers = {"Authorization": f"Bearer {token}"}
+   while perf_counter() < deadline:
+      await recorder.request(client, "GET /teacher/bookings", "GET", "/teacher/bookings", headers=headers)
+      await asyncio.sleep(rng.uniform(0.5, 2))
+
+
+async def find_violations(db: AsyncIOMotorDatabase, teacher_ids: List[str]) -> Dict[str, int]:
+   """Slots holding more bookings than seats, and students booked twice on the same slot."""
+   tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
+   seats = {
+      a["teacher_id"]: a["max_no_of_students_each_slot"]
+      async for a in db.teacher_availabilities.find({"teacher_id": {"$in": teacher_ids}, "available_date": tomorrow})
+   }
+   per_slot = await db.class_bookings.aggregate([
+      {"$match": {"teacher_id": {"$in": teacher_ids}, "booking_date": tomorrow}},
+      {"$group": {"_id": {"teacher_id": "$teacher_id", "start_time": "$start_time"}, "count": {"$sum": 1}}},
+   ]).to_list(length=None)
+   doubles = await db.class_bookings.aggregate([
+      {"$match": {"teacher_id": {"$in": teacher_ids}, "booking_date": tomorrow}},
+      {"$group": {"_id": {"student_id": "$student_id", "teacher_id": "$teacher_id", "start_time": "$start_time"}, "count": {"$sum": 1}}},
+      {"$match": {"count": {"$gt": 1}}},
+   ]).to_list(length=None)
+   return {
+      "overbooked_slots": sum(1 for slot in per_slot if slot["count"] > seats.get(slot["_id"]["teacher_id"], 0)),
+      "double_bookings": len(doubles),
+      "bookings": sum(slot["count"] for slot in per_slot),
+   }
+
+
+async def main(args):
+   rng = random.Random(args.seed)
+   mongodb_client = AsyncIOMotorClient(settings.MONGO_URI)
+   db = mongodb_client[settings.DB_NAME]
+
+   if args.auto_assign:
+      others = await db.users.count_documents({"email": {"$not": {"$regex": f"@{EMAIL_DOMAIN}$"}}})
+      if others:
+         mongodb_client.close()
+         raise SystemExit(
+            f"--auto-assign would book the {others} other accounts of '{settings.DB_NAME}' too, "
+            "run it against a dedicated database"
+         )
+
+   print(f"Seeding {args.teachers} teachers and {args.students} students...", flush=True)
+   teacher_ids = await seed(db, args.teachers, args.students, args.seats, rng)
+   popular = [(rng.choice(teacher_ids), rng.randrange(FIRST_HOUR, LAST_HOUR)) for _ in range(args.popular_slots)]
+
+   recorder = Recorder()
+   limits = httpx.Limits(max_connections=args.users + 10, max_keepalive_connections=args.users + 10)
+   async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+      # Login storm: every virtual user at once
+      started = perf_counter()
+      users = min(args.users, args.students)
+      student_tokens = await asyncio.gather(*(login(recorder, client, f"student{i}@{EMAIL_DOMAIN}") for i in range(users)))
+      teacher_tokens = await asyncio.gather(*(login(recorder, client, f"teacher{i}@{EMAIL_DOMAIN}") for i in range(min(args.teachers, 10))))
+      login_seconds = perf_counter() - started
+
+      deadline = perf_counter() + args.duration
+      tasks = [
+         virtual_user(recorder, client, token, teacher_ids, popular, args.popular_share, deadline, random.Random(rng.random()))
+         for token in student_tokens if token
+      ] + [
+         teacher_user(recorder, client, token, deadline, random.Random(rng.random())) for token in teacher_tokens if token
+      ]
+
+      auto_assign_summary = None
+      if args.auto_assign:
+         async def run_auto_assign():
+            await asyncio.sleep(args.duration / 2)
+            return await auto_assign_unbooked_students(db)
+         auto_assign_task = asyncio.ensure_future(run_auto_assign())
+
+      traffic_started = perf_counter()
+      await asyncio.gather(*tasks)
+      elapsed = perf_counter() - traffic_started
+      if args.auto_assign:
+         auto_assign_summary = await auto_assign_task
+
+   report = {
+      "config": vars(args),
+      "login_storm_seconds": round(login_seconds, 3),
+      "duration_seconds": round(elapsed, 3),
+      **recorder.report(elapsed),
+      "violations": await find_violations(db, teacher_ids),
+      "auto_assign": auto_assign_summary,
+   }
+   mongodb_client.close()
+
+   output = json.dumps(report, indent=2, default=str)
+   if args.output:
+      with open(args.output, "w") as f:
+         f.write(output)
+   print(output)
+
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Replay booking-day traffic against a running API.")
+   parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+   parser.add_argument("--teachers", type=int, default=20)
+   parser.add_argument("--students", type=int, default=500)
+   parser.add_argument("--users", type=int, default=100, help="concurrent virtual students")
+   parser.add_argument("--seats", type=int, default=5, help="seats per slot")
+   parser.add_argument("--duration", type=float, default=30, help="seconds of mixed traffic after the login storm")
+   parser.add_argument("--popular-slots", type=int, default=3)
+   parser.add_argument("--popular-share", type=float, default=0.7, help="share of bookings aimed at the popular slots")
+   parser.add_argument("--auto-assign", action="store_true", help="run auto_assign halfway through the run (dedicated database only)")
+   parser.add_argument("--timeout", type=float, default=30)
+   parser.add_argument("--seed", type=int, default=42)
+   parser.add_argument("--output", help="also write the JSON report to this file")
+   asyncio.run(main(parser.parse_args()))
@@ -1,157 +1,336 @@
+"""
+Seed the database with demo or large synthetic data.
+
+Without arguments it creates the demo dataset described in the README (3 teachers,
+15 students, availability for tomorrow and a few bookings). Everything is parameterized and
+deterministic for a given `--seed`, user ids included (only the timestamps vary):
+
+   python -m scripts.seed_data --teachers 20000 --students 1000000 --days 5 \\
+      --windows-per-day 2 --window-hours 4 --fill 0.9
+
+Documents are generated lazily and written with batched, concurrent unordered
+`insert_many`; the indexes are (re)built once at the end. Passwords are shared per role
+and hashed once by default; `--unique-passwords` hashes one password per user on a
+process pool (lower `--bcrypt-rounds` for large runs) and `--password-hash` writes a
+precomputed hash as-is. With `--append`, the new users are numbered after the users of
+the same role already in the database, so their emails and ids do not collide.
+"""
+
+import argparse
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
+import random
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+from datetime import datetime, timedelta, time, timezone
+from itertools import islice
+from time import perf_counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
 from app.core.config import settings
 from app.core.config import authorization_utils
-from datetime import datetime, timedelta, time
-import random
+from app.core.etag import RESOURCE_VERSIONS
+from app.core.indexes import ensure_indexes
+from app.core.slot_capacity import SLOT_CAPACITIES
 
-client = AsyncIOMotorClient(settings.MONGO_URI)
-db = client[settings.DB_NAME]
-
-async def seed():
-   # CLEAR PREVIOUS DATA FOR FRESH TESTING (ONLY FOR DEVELOPMENT)
-   await db.users.delete_many({})
-   await db.teacher_availabilities.delete_many({})
-   await db.class_bookings.delete_many({})
-
-   print("✅ Cleared previous data.")
-
-   # Hash the default password
-   hashed_teacher_pwd = authorization_utils.get_password_hash("education@123")
-
-   # 1. Add Teachers
-   teachers = [
-      {
-         "first_name": "Alice",
-         "last_name": "Matheson",
-         "email": "alice@school.com",
-         "phone": "+911111111111",
-         "age": 35,
-         "role": "teacher",
-         "subject": "Mathematics",
-         "years_of_exp": 1,
-         "is_active": True,
-         "hashed_password": hashed_teacher_pwd,
-         "created_at": datetime.now(),
-         "updated_at": datetime.now()
-      },
-      {
-         "first_name": "Bob",
-         "last_name": "Physico",
-         "email": "bob@school.com",
-         "phone": "+922222222222",
-         "age": 40,
-         "role": "teacher",
-         "subject": "English",
-         "years_of_exp": 4,
-         "is_active": True,
-         "hashed_password": hashed_teacher_pwd,
-         "created_at": datetime.now(),
-         "updated_at": datetime.now()
-      },
-      {
-         "first_name": "Charlie",
-         "last_name": "Chemlord",
-         "email": "charlie@school.com",
-         "phone": "+933333333333",
-         "age": 42,
-         "role": "teacher",
-         "subject": "Chemistry",
-         "years_of_exp": 2.5,
-         "is_active": True,
-         "hashed_password": hashed_teacher_pwd,
-         "created_at": datetime.now(),
-         "updated_at": datetime.now()
-      }
-   ]
+TEACHER_PASSWORD = "education@123"
+STUDENT_PASSWORD = "school@123"
+SUBJECTS = ["Mathematics", "English", "Chemistry", "Physics", "Biology", "History", "Geography", "Computer Science"]
+SCHOOLS = ["ABC", "XYZ", "PQR", "KLM", "DEF", "OPQ", "WXY"]
+STANDARDS = ["4rd", "5th", "6th", "7th", "8th"]
+FIRST_HOUR = 8
 
-   teacher_result = await db.users.insert_many(teachers)
-   teacher_ids = teacher_result.inserted_ids
-
-   print(f"✅ Inserted {len(teacher_ids)} teachers.")
-
-   # 2. Add Students
-   hashed_student_pwd = authorization_utils.get_password_hash("school@123")
-
-   students = []
-   for i in range(15):
-      students.append({
-         "first_name": f"Student{i+1}",
-         "last_name": "Test",
-         "email": f"student{i+1}@school.com",
-         "phone": f"+9199000000{i+1:02}",
-         "age": 18 + i % 5,
-         "role": "student",
-         "school_name": f"""School {random.choice(["ABC", "XYZ", "PQR", "KLM", "DEF", "OPQ", "WXY"])}""",
-         "standard": random.choice(["4rd", "5th", "6th", "7th", "8th"]),
-         "previuos_standard_result": random.randint(70, 97),
-         "is_active": True,
-         "hashed_password": hashed_student_pwd,
-         "created_at": datetime.now(),
-         "updated_at": datetime.now()
-      })
-
-   student_result = await db.users.insert_many(students)
-   print(f"✅ Inserted {len(student_result.inserted_ids)} students.")
-
-   # 3. Add Availability for Teachers (for tomorrow)
-   tomorrow = datetime.now().date() + timedelta(days=1)
-   availabilities = []
-
-   for i, teacher_id in enumerate(teacher_ids):
-      start_time = time(10 + i, 0)  # 10:00 AM, 11:00 AM, 12:00 PM
-      end_time = time(12 + i, 0)        # Till 6:00 PM
-      availabilities.append({
-         "teacher_id": str(teacher_id),
-         "subject": teachers[i]["subject"],
-         "available_date": tomorrow,
-         "start_time": start_time,
-         "end_time": end_time,
-         "max_no_of_students_each_slot": random.randint(2, 5)
-      })
-
-   availabilities = [
-      {
-         **doc,
-         "available_date": datetime.combine(doc["available_date"], time.min),
-         "start_time": datetime.combine(doc["available_date"], doc["start_time"]),
-         "end_time": datetime.combine(doc["available_date"], doc["end_time"]),
-      }
-      for doc in availabilities
-   ]
+# The first teachers keep the well-known demo accounts
+DEMO_TEACHERS = [
+   {"first_name": "Alice", "last_name": "Matheson", "email": "alice@school.com", "phone": "+911111111111", "age": 35, "subject": "Mathematics", "years_of_exp": 1},
+   {"first_name": "Bob", "last_name": "Physico", "email": "bob@school.com", "phone": "+922222222222", "age": 40, "subject": "English", "years_of_exp": 4},
+   {"first_name": "Charlie", "last_name": "Chemlord", "email": "charlie@school.com", "phone": "+933333333333", "age": 42, "subject": "Chemistry", "years_of_exp": 2.5},
+]
+
+
+def _hash_chunk(passwords: List[str], rounds: Optional[int]) -> List[str]:
+   # Runs in worker processes, only depends on passlib
+   from passlib.hash import bcrypt
+   handler = bcrypt.using(rounds=rounds) if rounds else bcrypt
+   return [handler.hash(password) for password in passwords]
+
+
+def hash_passwords(passwords: List[str], rounds: Optional[int], workers: Optional[int]) -> List[str]:
+   """bcrypt every password on a process pool, preserving the order."""
+   chunk_size = 256
+   chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+   with ProcessPoolExecutor(max_workers=workers) as pool:
+      hashed = pool.map(_hash_chunk, chunks, [rounds] * len(chunks))
+      return [h for chunk in hashed for h in chunk]
+
+
+def user_id(role: str, i: int, seed: int) -> ObjectId:
+   """Same id for the same user number and seed, unlike `ObjectId()`."""
+   return ObjectId(blake2b(f"{seed}-{role}-{i}".encode(), digest_size=12).digest())
+
+
+def user_email(role: str, i: int) -> str:
+   if role == "teacher" and i < len(DEMO_TEACHERS):
+      return DEMO_TEACHERS[i]["email"]
+   return f"{role}{i + 1}@school.com"
+
+
+def user_password(role: str, i: int, unique: bool) -> str:
+   if unique:
+      return f"{user_email(role, i).split('@')[0]}@123"
+   return TEACHER_PASSWORD if role == "teacher" else STUDENT_PASSWORD
+
+
+def teacher_doc(i: int, _id: ObjectId, hashed_password: str, now: datetime, seed: int) -> Dict[str, Any]:
+   rng = random.Random(f"{seed}-teacher-{i}")
+   profile = DEMO_TEACHERS[i] if i < len(DEMO_TEACHERS) else {
+      "first_name": f"Teacher{i + 1}",
+      "last_name": "Test",
+      "email": user_email("teacher", i),
+      "phone": f"+91{8000000000 + i}",
+      "age": rng.randint(25, 65),
+      "subject": rng.choice(SUBJECTS),
+      "years_of_exp": rng.randint(1, 30),
+   }
+   return {
+      "_id": _id,
+      **profile,
+      "role": "teacher",
+      "is_active": True,
+      "hashed_password": hashed_password,
+      "created_at": now,
+      "updated_at": now,
+   }
+
+
+def student_doc(i: int, _id: ObjectId, hashed_password: str, now: datetime, seed: int) -> Dict[str, Any]:
+   rng = random.Random(f"{seed}-student-{i}")
+   return {
+      "_id": _id,
+      "first_name": f"Student{i + 1}",
+      "last_name": "Test",
+      "email": user_email("student", i),
+      "phone": f"+91{9000000000 + i}",
+      "age": 18 + i % 5,
+      "role": "student",
+      "school_name": f"School {rng.choice(SCHOOLS)}",
+      "standard": rng.choice(STANDARDS),
+      "previuos_standard_result": rng.randint(70, 97),
+      "preferred_subjects": rng.sample(SUBJECTS, rng.randint(0, 2)),
+      "is_active": True,
+      "hashed_password": hashed_password,
+      "created_at": now,
+      "updated_at": now,
+   }
+
+
+def iter_schedule(args, teacher_ids: List[ObjectId], teacher_subjects: List[str], student_ids: List[ObjectId], rng: random.Random):
+   """
+   Yield ("availability" | "capacity" | "booking", document) for every teacher and day.
+   Each 1-hour slot gets `fill` of its seats booked by distinct students.
+   """
+   first_day = datetime.combine(datetime.now().date() + timedelta(days=args.start_day), time.min)
+   booked_at = datetime.now(tz=timezone.utc)
 
-   await db.teacher_availabilities.insert_many(availabilities)
-   print("✅ Inserted availability slots for all teachers.")
-
-   # 4. (Optional) Add 3 bookings manually
-   bookings = []
-   for i in range(3):
-      bookings.append({
-         "student_id": str(student_result.inserted_ids[i]),
-         "teacher_id": str(teacher_ids[i]),
-         "subject": teachers[i]["subject"],
-         "booking_date": tomorrow,
-         "start_time": time(10, 0),
-         "end_time": time(11, 0),
-         "booked_at": datetime.now(),
-         "fees_paid": random.choice([True, False])
-      })
-
-   bookings = [
-      {
-         **doc,
-         "payment_timestamp": datetime.now() if doc["fees_paid"] is True else None,
-         "booking_date": datetime.combine(doc["booking_date"], time.min),
-         "start_time": datetime.combine(doc["booking_date"], doc["start_time"]),
-         "end_time": datetime.combine(doc["booking_date"], doc["end_time"]),
+   for day_offset in range(args.days):
+      day = first_day + timedelta(days=day_offset)
+      for teacher_id, subject in zip(teacher_ids, teacher_subjects):
+         teacher_id = str(teacher_id)
+         for window in range(args.windows_per_day):
+            # One free hour between consecutive windows
+            start = day + timedelta(hours=FIRST_HOUR + window * (args.window_hours + 1))
+            end = start + timedelta(hours=args.window_hours)
+            seats = rng.randint(args.min_seats, args.max_seats)
+            yield "availability", {
+               "teacher_id": teacher_id,
+               "subject": subject,
+               "available_date": day,
+               "start_time": start,
+               "end_time": end,
+               "max_no_of_students_each_slot": seats,
+            }
+
+            for hour in range(args.window_hours):
+               slot_start = start + timedelta(hours=hour)
+               booked = min(sum(1 for _ in range(seats) if rng.random() < args.fill), len(student_ids))
+               yield "capacity", {
+                  "teacher_id": teacher_id,
+                  "start_time": slot_start,
+                  "end_time": slot_start + timedelta(hours=1),
+                  "booking_date": day,
+                  "subject": subject,
+                  "max_students": seats,
+                  "remaining": seats - booked,
+               }
+               for student_index in rng.sample(range(len(student_ids)), booked):
+                  fees_paid = rng.random() < 0.5
+                  yield "booking", {
+                     "student_id": str(student_ids[student_index]),
+                     "teacher_id": teacher_id,
+                     "subject": subject,
+                     "booking_date": day,
+                     "start_time": slot_start,
+                     "end_time": slot_start + timedelta(hours=1),
+                     "booked_at": booked_at,
+                     "fees_paid": fees_paid,
+                     "payment_timestamp": booked_at if fees_paid else None,
+                  }
+
+
+class BatchWriter:
+   """Buffers documents per collection and flushes them with concurrent unordered `insert_many`."""
+
+   def __init__(self, batch_size: int, concurrency: int):
+      self.batch_size = batch_size
+      self._semaphore = asyncio.Semaphore(concurrency)
+      self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+      self._collections: Dict[str, AsyncIOMotorCollection] = {}
+      self._tasks: set = set()
+      self._errors: List[BaseException] = []
+      self.counts: Dict[str, int] = {}
+
+   async def add(self, collection: AsyncIOMotorCollection, doc: Dict[str, Any]):
+      buffer = self._buffers.setdefault(collection.name, [])
+      self._collections[collection.name] = collection
+      buffer.append(doc)
+      if len(buffer) >= self.batch_size:
+         await self._flush(collection.name)
+
+   async def add_many(self, collection: AsyncIOMotorCollection, docs: Iterable[Dict[str, Any]]):
+      for doc in docs:
+         await self.add(collection, doc)
+
+   async def _flush(self, name: str):
+      docs = self._buffers.get(name)
+      if not docs:
+         return
+      self._buffers[name] = []
+      # Bounded number of batches in flight
+      await self._semaphore.acquire()
+      task = asyncio.ensure_future(self._insert(name, docs))
+      self._tasks.add(task)
+      task.add_done_callback(self._done)
+
+   def _done(self, task: asyncio.Task):
+      self._tasks.discard(task)
+      if not task.cancelled() and task.exception() is not None:
+         self._errors.append(task.exception())
+
+   async def _insert(self, name: str, docs: List[Dict[str, Any]]):
+      try:
+         await self._collections[name].insert_many(docs, ordered=False)
+         self.counts[name] = self.counts.get(name, 0) + len(docs)
+      finally:
+         self._semaphore.release()
+
+   async def close(self):
+      for name in list(self._buffers):
+         await self._flush(name)
+      if self._tasks:
+         await asyncio.gather(*self._tasks, return_exceptions=True)
+      if self._errors:
+         # A partial dataset must not look like a successful run
+         raise RuntimeError(f"{len(self._errors)} insert_many batches failed") from self._errors[0]
+
+
+def _chunks(iterable: Iterable, size: int) -> Iterator[list]:
+   iterator = iter(iterable)
+   while chunk := list(islice(iterator, size)):
+      yield chunk
+
+
+async def seed(args):
+   started = perf_counter()
+   rng = random.Random(args.seed)
+   client = AsyncIOMotorClient(settings.MONGO_URI)
+   db = client[settings.DB_NAME]
+
+   if not args.append:
+      # CLEAR PREVIOUS DATA FOR FRESH TESTING (ONLY FOR DEVELOPMENT)
+      for name in ("users", "teacher_availabilities", "class_bookings", SLOT_CAPACITIES, RESOURCE_VERSIONS):
+         await db.drop_collection(name)
+      print("✅ Cleared previous data.")
+
+   # User numbers, continuing after the existing users when appending
+   numbers = {}
+   for role, count in (("teacher", args.teachers), ("student", args.students)):
+      offset = await db.users.count_documents({"role": role}) if args.append else 0
+      numbers[role] = range(offset, offset + count)
+
+   # Hash the passwords
+   if args.password_hash:
+      hashes = {role: [args.password_hash] * len(indices) for role, indices in numbers.items()}
+   elif args.unique_passwords:
+      hashes = {
+         role: hash_passwords([user_password(role, i, True) for i in indices], args.bcrypt_rounds, args.workers)
+         for role, indices in numbers.items()
+      }
+   else:
+      hashes = {
+         role: [authorization_utils.get_password_hash(user_password(role, 0, False))] * len(indices)
+         for role, indices in numbers.items()
       }
-      for doc in bookings
+   print(f"✅ Password hashes ready ({perf_counter() - started:.1f}s).")
+
+   # 1. Teachers and students
+   now = datetime.now()
+   teacher_ids = [user_id("teacher", i, args.seed) for i in numbers["teacher"]]
+   student_ids = [user_id("student", i, args.seed) for i in numbers["student"]]
+   writer = BatchWriter(args.batch_size, args.concurrency)
+
+   teacher_docs = [
+      teacher_doc(i, _id, password_hash, now, args.seed)
+      for i, _id, password_hash in zip(numbers["teacher"], teacher_ids, hashes["teacher"])
    ]
+   await writer.add_many(db.users, teacher_docs)
+   students = zip(numbers["student"], student_ids, hashes["student"])
+   for chunk in _chunks(students, args.batch_size):
+      await writer.add_many(db.users, (student_doc(i, _id, password_hash, now, args.seed) for i, _id, password_hash in chunk))
+   print(f"✅ Queued {len(teacher_ids)} teachers and {len(student_ids)} students.")
+
+   # 2. Availability, slot capacities and bookings
+   collections = {"availability": db.teacher_availabilities, "capacity": db[SLOT_CAPACITIES], "booking": db.class_bookings}
+   subjects = [doc["subject"] for doc in teacher_docs]
+   for kind, doc in iter_schedule(args, teacher_ids, subjects, student_ids, rng):
+      await writer.add(collections[kind], doc)
+   await writer.close()
+
+   for name, count in sorted(writer.counts.items()):
+      print(f"✅ Inserted {count} documents into {name}.")
+
+   await ensure_indexes(db)
+   print(f"🎉 Seeding complete in {perf_counter() - started:.1f}s!")
+   client.close()
+
+
+def parse_args(argv=None):
+   parser = argparse.ArgumentParser(description="Seed demo or large synthetic data.")
+   parser.add_argument("--teachers", type=int, default=3)
+   parser.add_argument("--students", type=int, default=15)
+   parser.add_argument("--days", type=int, default=1, help="number of days with availability")
+   parser.add_argument("--start-day", type=int, default=1, help="offset of the first day from today (negative for history)")
+   parser.add_argument("--windows-per-day", type=int, default=1, help="availability windows per teacher and day")
+   parser.add_argument("--window-hours", type=int, default=2, help="1-hour slots per window")
+   parser.add_argument("--min-seats", type=int, default=2)
+   parser.add_argument("--max-seats", type=int, default=5)
+   parser.add_argument("--fill", type=float, default=0.2, help="probability for each seat to be booked")
+   parser.add_argument("--seed", type=int, default=42, help="random seed, the same seed gives the same data")
+   parser.add_argument("--batch-size", type=int, default=10000)
+   parser.add_argument("--concurrency", type=int, default=4, help="insert_many batches in flight")
+   parser.add_argument("--append", action="store_true", help="keep the existing data, new users are numbered after the existing ones")
+   parser.add_argument("--unique-passwords", action="store_true", help="one password per user: <email local part>@123")
+   parser.add_argument("--bcrypt-rounds", type=int, help="bcrypt cost for --unique-passwords")
+   parser.add_argument("--workers", type=int, help="hashing processes for --unique-passwords")
+   parser.add_argument("--password-hash", help="precomputed hash stored for every user")
+   args = parser.parse_args(argv)
 
-   await db.class_bookings.insert_many(bookings)
-   print("✅ Added 3 initial bookings (1 per teacher).")
+   last_hour = FIRST_HOUR + args.windows_per_day * (args.window_hours + 1) - 1
+   if last_hour > 24:
+      parser.error(f"{args.windows_per_day} windows of {args.window_hours}h do not fit in a day starting at {FIRST_HOUR}:00")
+   if not 1 <= args.min_seats <= args.max_seats:
+      parser.error("--min-seats must be between 1 and --max-seats")
+   return args
 
-   print("🎉 Seeding complete!")
 
 if __name__ == "__main__":
-   asyncio.run(seed())
+   asyncio.run(seed(parse_args()))
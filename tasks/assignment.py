@@ -0,0 +1,196 @@
+"""
+Assignment strategies used by the auto-assignment job.
+
+A strategy receives a batch of students and the list of slots (capacity documents with a
+`remaining` count) and returns a mapping of slot index -> assigned student ids. It must
+decrement `remaining` on every slot it fills so the next batch sees the updated load.
+
+- first_fit: fills the slots in order (previous behaviour), O(students + slots).
+- least_loaded: always picks the least loaded teacher, then its least loaded slot, using
+  heaps, O(students * log(slots)). Spreads students evenly.
+- min_cost_flow: honours the students' `preferred_subjects`. Students are grouped by
+  preference profile and a min-cost flow is solved between profiles and subjects (a
+  graph whose size does not depend on the number of students), then each subject's
+  share is spread over its slots with `least_loaded`. Students without preference
+  fill the remaining seats with `least_loaded`.
+"""
+
+import heapq
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, List
+
+Plan = Dict[int, List[str]]
+AssignmentStrategy = Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], Plan]
+
+
+def first_fit(students: List[Dict[str, Any]], slots: List[Dict[str, Any]]) -> Plan:
+   plan = defaultdict(list)
+   slot_index = 0
+   for student in students:
+      while slot_index < len(slots) and slots[slot_index]["remaining"] <= 0:
+         slot_index += 1
+      if slot_index == len(slots):
+         break
+      plan[slot_index].append(str(student["_id"]))
+      slots[slot_index]["remaining"] -= 1
+   return plan
+
+
+def least_loaded(students: List[Dict[str, Any]], slots: List[Dict[str, Any]], slot_indexes: List[int] = None) -> Plan:
+   """
+   Two-level heap: teachers ordered by their booked seats, and per teacher the slots
+   ordered by their booked seats. Ties keep the original slot order.
+   """
+   plan = defaultdict(list)
+   if slot_indexes is None:
+      slot_indexes = range(len(slots))
+
+   teacher_slots = defaultdict(list)
+   teacher_load = defaultdict(int)
+   for index in slot_indexes:
+      slot = slots[index]
+      booked = slot["max_students"] - slot["remaining"]
+      teacher_load[slot["teacher_id"]] += booked
+      if slot["remaining"] > 0:
+         teacher_slots[slot["teacher_id"]].append((booked, index))
+
+   for heap in teacher_slots.values():
+      heapq.heapify(heap)
+   teachers = [(teacher_load[teacher_id], order, teacher_id) for order, teacher_id in enumerate(teacher_slots)]
+   heapq.heapify(teachers)
+
+   for student in students:
+      if not teachers:
+         break
+      load, order, teacher_id = heapq.heappop(teachers)
+      booked, index = heapq.heappop(teacher_slots[teacher_id])
+
+      plan[index].append(str(student["_id"]))
+      slots[index]["remaining"] -= 1
+
+      if slots[index]["remaining"] > 0:
+         heapq.heappush(teacher_slots[teacher_id], (booked + 1, index))
+      if teacher_slots[teacher_id]:
+         heapq.heappush(teachers, (load + 1, order, teacher_id))
+
+   return plan
+
+
+def _min_cost_flow(graph: List[List[list]], source: int, sink: int) -> None:
+   """
+   Successive shortest paths (SPFA) on a residual graph.
+   Edges are [to, capacity, cost, reverse_edge_index] and are updated in place.
+   """
+   node_count = len(graph)
+   while True:
+      distance = [float("inf")] * node_count
+      in_queue = [False] * node_count
+      previous = [None] * node_count
+      distance[source] = 0
+      queue = deque([source])
+      while queue:
+         node = queue.popleft()
+         in_queue[node] = False
+         for edge_index, (to, capacity, cost, _) in enumerate(graph[node]):
+            if capacity > 0 and distance[node] + cost < distance[to]:
+               distance[to] = distance[node] + cost
+               previous[to] = (node, edge_index)
+               if not in_queue[to]:
+                  in_queue[to] = True
+                  queue.append(to)
+
+      if distance[sink] == float("inf"):
+         return
+
+      # Bottleneck along the path, then push it
+      push = float("inf")
+      node = sink
+      while node != source:
+         parent, edge_index = previous[node]
+         push = min(push, graph[parent][edge_index][1])
+         node = parent
+
+      node = sink
+      while node != source:
+         parent, edge_index = previous[node]
+         edge = graph[parent][edge_index]
+         edge[1] -= push
+         graph[node][edge[3]][1] += push
+         node = parent
+
+
+def _add_edge(graph: List[List[list]], source: int, target: int, capacity: int, cost: int):
+   graph[source].append([target, capacity, cost, len(graph[target])])
+   graph[target].append([source, 0, -cost, len(graph[source]) - 1])
+
+
+def min_cost_flow(students: List[Dict[str, Any]], slots: List[Dict[str, Any]]) -> Plan:
+   """
+   Prefer a slot whose subject is in the student's `preferred_subjects` (cost 0) over any
+   other slot (cost 1), while assigning as many students as capacity allows.
+   """
+   subject_slots = defaultdict(list)
+   for index, slot in enumerate(slots):
+      if slot["remaining"] > 0:
+         subject_slots[slot["subject"]].append(index)
+   subjects = list(subject_slots)
+
+   groups = defaultdict(list)
+   indifferent = []
+   for student in students:
+      preferred = frozenset(student.get("preferred_subjects") or ())
+      if preferred:
+         groups[preferred].append(student)
+      else:
+         indifferent.append(student)
+   profiles = list(groups)
+
+   # Nodes: source, one per preference profile, one per subject, sink
+   source, sink = 0, 1 + len(profiles) + len(subjects)
+   graph = [[] for _ in range(sink + 1)]
+   for p, profile in enumerate(profiles):
+      _add_edge(graph, source, 1 + p, len(groups[profile]), 0)
+      for s, subject in enumerate(subjects):
+         cost = 0 if subject in profile else 1
+         _add_edge(graph, 1 + p, 1 + len(profiles) + s, len(groups[profile]), cost)
+   for s, subject in enumerate(subjects):
+      capacity = sum(slots[index]["remaining"] for index in subject_slots[subject])
+      _add_edge(graph, 1 + len(profiles) + s, sink, capacity, 0)
+
+   _min_cost_flow(graph, source, sink)
+
+   # Flow on profile -> subject edges is the residual capacity of their reverse edges
+   subject_students = defaultdict(list)
+   for p, profile in enumerate(profiles):
+      members = iter(groups[profile])
+      for to, _, cost, reverse in graph[1 + p]:
+         if to == source:
+            continue
+         flow = graph[to][reverse][1]
+         subject = subjects[to - 1 - len(profiles)]
+         for _ in range(flow):
+            subject_students[subject].append(next(members))
+
+   plan = defaultdict(list)
+   for subject, assigned in subject_students.items():
+      for index, student_ids in least_loaded(assigned, slots, subject_slots[subject]).items():
+         plan[index].extend(student_ids)
+
+   # Students without preference only fill what is left, on the least loaded slots
+   for index, student_ids in least_loaded(indifferent, slots).items():
+      plan[index].extend(student_ids)
+   return plan
+
+
+ASSIGNMENT_STRATEGIES: Dict[str, AssignmentStrategy] = {
+   "first_fit": first_fit,
+   "least_loaded": least_loaded,
+   "min_cost_flow": min_cost_flow,
+}
+
+
+def get_assignment_strategy(name: str) -> AssignmentStrategy:
+   try:
+      return ASSIGNMENT_STRATEGIES[name]
+   except KeyError:
+      raise ValueError(f"Unknown assignment strategy '{name}'. Choose one of {list(ASSIGNMENT_STRATEGIES)}")
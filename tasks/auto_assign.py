@@ -6,106 +6,261 @@ ASSUMPTIONS:
 - Each teacher slot is 1 hour long.
 - Students who haven't booked a slot by themselves will be auto-assigned.
 
+IMPLEMENTATION:
+- Students are streamed from a cursor in batches of `AUTO_ASSIGN_BATCH_SIZE`, so memory
+stays bounded whatever the number of students.
+- Students are matched to slots by a pluggable strategy (`AUTO_ASSIGN_STRATEGY`, see
+`tasks/assignment.py`), by default the least loaded teacher/slot first.
+- Seats are reserved per slot with one conditional `$inc` on `slot_capacities` and the
+bookings of a batch are written with a single unordered `insert_many`.
+
+SCHEDULING:
+- Every worker runs `run_scheduled_auto_assignment` every `AUTO_ASSIGN_INTERVAL_SECONDS`, but
+a leader lease (`app/core/leases.py`) and a unique run record per interval ("tick") in
+`auto_assign_runs` make a single process run it per tick. The run records also keep the
+history: owner, status, duration, students processed and assignments made.
+
 SUGGESTION:
 - Though this is implemented as a FastAPI background task (runs every 5 hours),
 we can use a CRON JOB that run at a particular time period, in production (e.g., run every night at 11:00 PM).
 """
 
-from datetime import timedelta, datetime, time
-from motor.motor_asyncio import AsyncIOMotorClient
+from collections import defaultdict
+from datetime import timedelta, datetime, time, timezone
+from time import perf_counter, time as now_ts
+from typing import Any, Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from app.models.bookings import Booking
-from app.core.config import settings
+from app.core.config import settings, availability_snapshot
+from app.core.etag import AUTO_ASSIGN_VERSION, bump_versions
+from app.core.intervals import AvailabilityIndex
+from app.core.leases import LeaseLock
+from app.core.slot_capacity import SLOT_CAPACITIES, ensure_slot_capacities
+from tasks.assignment import AssignmentStrategy, get_assignment_strategy
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import asyncio
-# from fastapi_utils.tasks import repeat_every  # requires `fastapi-utils`
 
-async def auto_assign_unbooked_students():
-   mongodb_client = AsyncIOMotorClient(settings.MONGO_URI)
-   db = mongodb_client[settings.DB_NAME]
+AUTO_ASSIGN_LEASE = "auto_assign"
+AUTO_ASSIGN_RUNS = "auto_assign_runs"
+
+async def auto_assign_unbooked_students(
+   db: Optional[AsyncIOMotorDatabase] = None,
+   batch_size: Optional[int] = None,
+   strategy: Optional[str] = None
+) -> Dict[str, Any]:
+   """
+   Assign every active student without a booking for tomorrow to a free slot.
+
+   Args:
+      db: Database of the running application. A dedicated client is opened when omitted
+      batch_size: Number of students handled per cursor batch / bulk write
+      strategy: Name of the assignment strategy, see `tasks.assignment`
+
+   Returns:
+      Run summary with the number of students processed, assignments made and throughput
+   """
+   mongodb_client = None
+   if db is None:
+      mongodb_client = AsyncIOMotorClient(settings.MONGO_URI)
+      db = mongodb_client[settings.DB_NAME]
+
+   batch_size = batch_size or settings.AUTO_ASSIGN_BATCH_SIZE
+   assign = get_assignment_strategy(strategy or settings.AUTO_ASSIGN_STRATEGY)
+   summary = {"students_processed": 0, "assigned": 0, "duration_seconds": 0.0, "students_per_second": 0.0}
+   started = perf_counter()
    try:
       # The class slots will be assigned for tomorrow
       tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
 
-      # Step 1: Fetch all student accounts
-      all_students = await db.users.find({"role": "student", "is_active": True}).to_list(length=1000)
-
-      # Step 2: Fetch students who already booked a slot
-      booked = await db.class_bookings.find({"booking_date": tomorrow}).to_list(length=1000)
-      booked_student_ids = {booking["student_id"] for booking in booked}
-
-      # Step 3: Filter students who haven’t booked yet
-      unassigned_students = [student for student in all_students if str(student["_id"]) not in booked_student_ids]
-
-      if not unassigned_students:
-         print("✅ All students have already booked.")
-         return
-
-      # Step 4: Get teacher availability for tomorrow
-      teacher_availabilities = await db.teacher_availabilities.find({"available_date": tomorrow}).to_list(length=100)
-
-      # Step 5: Build a mapping of teacher -> available 1-hour slots
-      teacher_slots = {}
-
-      for availability in teacher_availabilities:
-         teacher_id = str(availability["teacher_id"])         
-         start_time = availability["start_time"]
-         max_allowed = availability.get("max_no_of_students_each_slot", 1)
-         end_time = availability["end_time"]
-         
-         slots = {}
-         while start_time < end_time:
-            slot_end = start_time + timedelta(hours=1)
-            slots[start_time] = {
-               "end_time": slot_end,
-               "count": 0,
-               "max": max_allowed
-            }
-            start_time = slot_end
-
-         teacher_slots[teacher_id] = {
-            "subject": availability["subject"],
-            "slots": slots,
-         }
-
-      # Step 6: Mark already booked time slots for each teacher
-      for booking in booked:
-         teacher_id = booking["teacher_id"]
-         start_time = booking["start_time"]
-         if teacher_id in teacher_slots and start_time in teacher_slots[teacher_id]["slots"]:
-               teacher_slots[teacher_id]["slots"][start_time]["count"] += 1
-
-      # Step 7: Auto-assign each unassigned student to an available slot
-      assigned_count = 0
-
-      for student in unassigned_students:
-         assigned = False
-         for teacher_id, info in teacher_slots.items():
-            for start_time, slot_info in info["slots"].items():
-               if slot_info["count"] < slot_info["max"]:
-                  # Create booking record
-                  new_booking = Booking(
-                     student_id=str(student["_id"]),
-                     teacher_id=teacher_id,
-                     subject=info["subject"],
-                     booking_date=tomorrow,
-                     start_time=start_time,
-                     end_time=slot_info["end_time"]
-                  )
-                  await db.class_bookings.insert_one(new_booking.dict())
-
-                  slot_info["count"] += 1
-                  assigned_count += 1
-                  assigned = True
-                  break
-            if assigned:
+      # Step 1: Make sure every slot of tomorrow has a capacity document.
+      # Windows overlapping another one of the same teacher would offer the same hour twice.
+      availability_index = AvailabilityIndex.from_availabilities(
+         await db.teacher_availabilities.find({"available_date": tomorrow}).sort("start_time", 1).to_list(length=None)
+      )
+      for conflict in availability_index.conflicts:
+         print(f"⚠️ Skipping overlapping availability {conflict['_id']} of teacher {conflict['teacher_id']}")
+      await ensure_slot_capacities(db, availability_index.windows())
+
+      # Step 2: Load the slots that still have free seats (teachers x hours, small)
+      slots = await db[SLOT_CAPACITIES].find(
+         {"booking_date": tomorrow, "remaining": {"$gt": 0}}
+      ).sort([("teacher_id", 1), ("start_time", 1)]).to_list(length=None)
+
+      if not slots:
+         print("✅ No free slots left for tomorrow.")
+         return summary
+
+      # Step 3: Stream active students and assign them batch by batch
+      students_cursor = db.users.find(
+         {"role": "student", "is_active": True},
+         projection={"_id": 1, "preferred_subjects": 1}
+      ).batch_size(batch_size)
+
+      batch = []
+      async for student in students_cursor:
+         batch.append(student)
+         if len(batch) >= batch_size:
+            await _assign_batch(db, batch, slots, tomorrow, summary, assign)
+            batch = []
+            if not any(slot["remaining"] > 0 for slot in slots):
                break
 
-      print(f"Auto-assigned {assigned_count} students to free class slots.")
+      if batch:
+         await _assign_batch(db, batch, slots, tomorrow, summary, assign)
 
    except Exception as e:
+      summary["error"] = str(e)
       print(f"Error during auto-assignment: {str(e)}")
 
    finally:
-      mongodb_client.close()
+      summary["duration_seconds"] = round(perf_counter() - started, 3)
+      if summary["duration_seconds"] > 0:
+         summary["students_per_second"] = round(summary["students_processed"] / summary["duration_seconds"], 1)
+      print(
+         f"Auto-assigned {summary['assigned']} of {summary['students_processed']} students "
+         f"in {summary['duration_seconds']}s ({summary['students_per_second']} students/s)."
+      )
+      if summary["assigned"]:
+         availability_snapshot.invalidate()
+         try:
+            await bump_versions(db, AUTO_ASSIGN_VERSION)
+         except Exception as e:
+            print(f"Could not bump booking versions after auto-assignment: {str(e)}")
+      if mongodb_client is not None:
+         mongodb_client.close()
+
+   return summary
+
+
+async def run_scheduled_auto_assignment(
+   db: AsyncIOMotorDatabase,
+   interval_seconds: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+   """
+   Run `auto_assign_unbooked_students` unless another process holds the leader lease or
+   already ran it during the current interval, and record the run in `auto_assign_runs`.
+
+   Returns:
+      The run summary, or None when this process did not run it
+   """
+   interval_seconds = interval_seconds or settings.AUTO_ASSIGN_INTERVAL_SECONDS
+   tick = int(now_ts() // interval_seconds)
+   lock = LeaseLock(db, AUTO_ASSIGN_LEASE, ttl_seconds=settings.AUTO_ASSIGN_LEASE_SECONDS)
+
+   async with lock.hold() as acquired:
+      if not acquired:
+         print("⏭️ Auto-assignment is running in another process.")
+         return None
+
+      try:
+         run = await db[AUTO_ASSIGN_RUNS].insert_one({
+            "tick": tick,
+            "owner": lock.owner,
+            "status": "running",
+            "started_at": datetime.now(tz=timezone.utc),
+         })
+      except DuplicateKeyError:
+         print("⏭️ Auto-assignment already ran for this interval.")
+         return None
+
+      summary = await auto_assign_unbooked_students(db)
+
+      if "error" in summary:
+         status = "failed"
+      elif not lock.held:
+         # Still complete, but another process may have taken over meanwhile
+         status = "lease_lost"
+      else:
+         status = "ok"
+      await db[AUTO_ASSIGN_RUNS].update_one(
+         {"_id": run.inserted_id},
+         {"$set": {**summary, "status": status, "finished_at": datetime.now(tz=timezone.utc)}}
+      )
+      return summary
+
+
+async def _assign_batch(
+   db: AsyncIOMotorDatabase,
+   students: List[Dict[str, Any]],
+   slots: List[Dict[str, Any]],
+   booking_date: datetime,
+   summary: Dict[str, Any],
+   assign: AssignmentStrategy
+):
+   summary["students_processed"] += len(students)
+   student_ids = [str(student["_id"]) for student in students]
+
+   # Skip students of this batch who already booked a slot by themselves
+   already_booked = set(await db.class_bookings.distinct(
+      "student_id", {"booking_date": booking_date, "student_id": {"$in": student_ids}}
+   ))
+   pending = [student for student in students if str(student["_id"]) not in already_booked]
+   students_by_id = {str(student["_id"]): student for student in pending}
+
+   while pending:
+      plan = assign(pending, slots)
+      if not plan:
+         break
+
+      pending = []
+      bookings = []
+      for slot_index, assigned_ids in plan.items():
+         slot = slots[slot_index]
+         # Reserve all the seats of this slot at once, it fails if concurrent bookings took some
+         reserved = await db[SLOT_CAPACITIES].find_one_and_update(
+            {"_id": slot["_id"], "remaining": {"$gte": len(assigned_ids)}},
+            {"$inc": {"remaining": -len(assigned_ids)}},
+            return_document=ReturnDocument.AFTER,
+         )
+         if reserved is None:
+            fresh = await db[SLOT_CAPACITIES].find_one({"_id": slot["_id"]})
+            slot["remaining"] = fresh["remaining"] if fresh else 0
+            pending.extend(students_by_id[student_id] for student_id in assigned_ids)
+            continue
+
+         slot["remaining"] = reserved["remaining"]
+         bookings.extend(
+            Booking(
+               student_id=student_id,
+               teacher_id=slot["teacher_id"],
+               subject=slot["subject"],
+               booking_date=booking_date,
+               start_time=slot["start_time"],
+               end_time=slot["end_time"]
+            ).model_dump()
+            for student_id in assigned_ids
+         )
+
+      summary["assigned"] += await _insert_bookings(db, bookings)
+
+
+async def _insert_bookings(db: AsyncIOMotorDatabase, bookings: List[Dict[str, Any]]) -> int:
+   """
+   Write bookings with one unordered `insert_many` and give back the seats of
+   the ones rejected (e.g. the student booked the same slot meanwhile).
+   """
+   if not bookings:
+      return 0
+
+   try:
+      result = await db.class_bookings.insert_many(bookings, ordered=False)
+      return len(result.inserted_ids)
+   except BulkWriteError as e:
+      write_errors = e.details.get("writeErrors", [])
+      released = defaultdict(int)
+      for error in write_errors:
+         booking = bookings[error["index"]]
+         released[(booking["teacher_id"], booking["start_time"])] += 1
+
+      await db[SLOT_CAPACITIES].bulk_write([
+         UpdateOne({"teacher_id": teacher_id, "start_time": start_time}, {"$inc": {"remaining": count}})
+         for (teacher_id, start_time), count in released.items()
+      ], ordered=False)
+
+      if any(error["code"] != 11000 for error in write_errors):
+         raise
+      return e.details.get("nInserted", 0)
 
 if __name__ == "__main__":
    asyncio.run(auto_assign_unbooked_students())
@@ -0,0 +1,40 @@
+import os
+
+# Settings are read at import time, the tests never reach a real server
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "class_booking_test")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import pytest
+
+
+@pytest.fixture
+def db():
+   """In-memory Motor database (requires `mongomock-motor`) with the application indexes."""
+   mongomock_motor = pytest.importorskip("mongomock_motor")
+   import asyncio
+   from app.core.indexes import ensure_indexes
+
+   database = mongomock_motor.AsyncMongoMockClient()["class_booking_test"]
+   asyncio.run(ensure_indexes(database))
+   return database
+
+
+@pytest.fixture
+def query_profile():
+   """
+   `profile_queries()` around the whole test: the Mongo commands seen by a
+   `QueryProfilerListener` of the client (mongomock emits none) are recorded in it.
+   """
+   from app.core.query_profiler import profile_queries
+
+   with profile_queries() as profile:
+      yield profile
+
+
+@pytest.fixture
+def query_budget():
+   """`max_queries`: `with query_budget(3): ...` fails the test past 3 Mongo commands."""
+   from app.core.query_profiler import max_queries
+
+   return max_queries
@@ -0,0 +1,87 @@
+from datetime import datetime, time, timedelta
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+from app.core.slot_capacity import SLOT_CAPACITIES
+from app.endpoints.students import BatchBookRequest, BookSlotRequest, book_slot, book_slots_batch
+from app.models.auth import Principal
+import asyncio
+import json
+
+TEACHER_ID = "60f7f72b9e1d8e6b2c5d6e3d"
+
+
+def student(n: int) -> Principal:
+   return Principal(id=f"{n:024x}", email=f"student{n}@example.com", role="student")
+
+
+async def publish_window(db, max_students: int):
+   tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
+   await db.teacher_availabilities.insert_one({
+      "teacher_id": TEACHER_ID,
+      "subject": "Mathematics",
+      "available_date": tomorrow,
+      "start_time": tomorrow.replace(hour=10),
+      "end_time": tomorrow.replace(hour=12),
+      "max_no_of_students_each_slot": max_students,
+   })
+
+
+def test_batch_and_single_booking_agree_on_slot_off_the_hourly_grid(db):
+   async def scenario():
+      await publish_window(db, max_students=2)
+      slot = BookSlotRequest(teacher_id=TEACHER_ID, slot_start="10:30")
+
+      # The batch goes first, so it has to create the slot's capacity document itself
+      batch = json.loads((await book_slots_batch(BatchBookRequest(slots=[slot]), db, student(1))).body)
+      single = await book_slot(slot, db, student(2))
+
+      try:
+         await book_slot(slot, db, student(3))
+         third_single = "booked"
+      except HTTPException as e:
+         third_single = e.status_code
+      third_batch = json.loads((await book_slots_batch(BatchBookRequest(slots=[slot]), db, student(4))).body)
+      return batch, single, third_single, third_batch
+
+   batch, single, third_single, third_batch = asyncio.run(scenario())
+
+   assert batch["results"][0]["status"] == "booked"
+   assert single["success"]
+   # Both paths share the capacity document of the 10:30 slot, now full
+   assert third_single == 409
+   assert third_batch["results"][0]["status"] == "full"
+
+
+def test_best_effort_batch_reports_write_errors_per_slot(db, monkeypatch):
+   """A non-duplicate write error fails its slot only, the written bookings stay reported and counted."""
+   collection_type = type(db.class_bookings)
+   insert_many = collection_type.insert_many
+
+   async def failing_insert_many(self, documents, *args, **kwargs):
+      if self.name != "class_bookings":
+         return await insert_many(self, documents, *args, **kwargs)
+      rejected = [i for i, doc in enumerate(documents) if doc["start_time"].hour == 11]
+      await insert_many(self, [doc for i, doc in enumerate(documents) if i not in rejected], *args, **kwargs)
+      raise BulkWriteError({"writeErrors": [
+         {"index": i, "code": 121, "errmsg": "Document failed validation"} for i in rejected
+      ]})
+
+   async def scenario():
+      await publish_window(db, max_students=2)
+      slots = [BookSlotRequest(teacher_id=TEACHER_ID, slot_start=start) for start in ("10:00", "11:00")]
+      monkeypatch.setattr(collection_type, "insert_many", failing_insert_many)
+      response = await book_slots_batch(BatchBookRequest(slots=slots), db, student(1))
+      monkeypatch.setattr(collection_type, "insert_many", insert_many)
+      capacities = {
+         c["start_time"].hour: c["remaining"]
+         async for c in db[SLOT_CAPACITIES].find({"teacher_id": TEACHER_ID})
+      }
+      return response.status_code, json.loads(response.body), capacities
+
+   status_code, body, capacities = asyncio.run(scenario())
+
+   assert status_code == 200
+   assert [result["status"] for result in body["results"]] == ["booked", "error"]
+   assert body["booked"] == 1
+   # The seat of the failed slot was given back
+   assert capacities == {10: 1, 11: 2}
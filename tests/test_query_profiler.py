@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+from bson import ObjectId
+from app.core.query_profiler import QueryProfilerListener
+import itertools
+import pytest
+
+_request_ids = itertools.count(1)
+
+
+def issue(listener: QueryProfilerListener, collection: str, command_name: str = "find", **command):
+   """Feed the listener the event pymongo would publish for a command."""
+   listener.started(SimpleNamespace(
+      command_name=command_name,
+      command={command_name: collection, **command},
+      request_id=next(_request_ids),
+      operation_id=0,
+   ))
+
+
+def test_per_item_lookups_share_one_shape(query_profile):
+   listener = QueryProfilerListener()
+   issue(listener, "class_bookings", filter={"student_id": "s1"})
+   for _ in range(5):
+      issue(listener, "users", filter={"_id": ObjectId()})
+   issue(listener, "users", filter={"_id": {"$in": [ObjectId(), ObjectId()]}})
+   issue(listener, "users", command_name="ping")
+
+   assert query_profile.total == 7
+   assert query_profile.repeated(5) == [(("users", "find", repr({"_id": "ObjectId"})), 5)]
+
+
+def test_query_budget_fails_past_the_limit(query_budget):
+   listener = QueryProfilerListener()
+   with query_budget(3):
+      issue(listener, "users", filter={"_id": ObjectId()})
+
+   with pytest.raises(AssertionError, match=r"at most 3 Mongo queries, got 4: 4x find users"):
+      with query_budget(3):
+         for _ in range(4):
+            issue(listener, "users", filter={"_id": ObjectId()})